@@ -0,0 +1,256 @@
+﻿"""Archive of the edit history on disk, kept across sessions"""
+
+from .      import meta
+from .files import write_atomic
+from .files import same_status
+
+from textual.document._edit     import Edit
+from textual.document._document import EditResult
+from textual.widgets.text_area  import Selection
+
+import platformdirs
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+from threading import Lock
+from pathlib   import Path
+
+
+folder: Path = platformdirs.user_cache_path() / meta.name / 'history'
+"""folder with the archived edit histories of files"""
+
+page_batches = 100
+"""number of batches of edits stored per page of an archive"""
+
+magic = b'KEDH\x01'
+"""bytes an archive file starts with, the last one being the format version"""
+
+header = struct.Struct('<qq32sI')
+"""size, modification time, and digest of the file, and number of pages"""
+
+no_digest = bytes(32)
+"""digest stored in place of that of files too large to be digested"""
+
+page_length = struct.Struct('<I')
+"""size in bytes of a compressed page"""
+
+Batch = list[Edit]
+"""edits that are undone and redone together"""
+
+
+class Archive:
+    """
+    Edit history of a file, stored on disk across sessions
+
+    When the file is saved, the batches of edits on the undo stack are
+    written to the archive, see `store()`. The archive is a compressed
+    sidecar file in the user cache folder, named after the path of the file.
+    It records the size, modification time, and SHA-256 digest of the file
+    as saved, i.e. the content that undoing the archived edits starts from.
+    Files larger than the given `limit` are not digested, as that would mean
+    reading them in full on every save.
+
+    When the file is loaded again, the archive is not even read, until the
+    user undoes all edits made since. Only then is it opened, and checked
+    to still apply to the file, see `open()`. The batches are stored in
+    pages, compressed separately, and `pop()` reads and decompresses one
+    page at a time, the latest first, whenever undoing reaches back that
+    far. Loading a file thus takes no longer than without an archive, unless
+    the archived history is actually used.
+    """
+
+    def __init__(
+        self,
+        file:   Path,
+        status: os.stat_result | None,
+        limit:  int | None = None,
+    ):
+        self.file = file
+        """file whose edit history is archived"""
+        self.limit = limit
+        """size in bytes above which the file is not digested, if any"""
+        self.path = archive_path(file)
+        """location of the archive file"""
+        self.status = status
+        """status of the file as loaded, `None` if there is no history yet"""
+        self.lengths: list[int] | None = None
+        """sizes of the pages not yet popped, oldest first, once opened"""
+        self.offset = 0
+        """where in the archive file the first page starts"""
+        self.lock = Lock()
+        """lock that keeps saving and undoing from interfering"""
+
+    def open(self):
+        """
+        Reads the index of pages, if the archive applies to the loaded file.
+
+        Does nothing if the archive is open already. Must be called before
+        the file is saved, as it may have to check the file as loaded.
+        """
+        with self.lock:
+            if self.lengths is not None:
+                return
+            self.lengths = []
+            if self.status is None:
+                return
+            try:
+                with self.path.open('rb') as stream:
+                    head = stream.read(len(magic) + header.size)
+                    if not head.startswith(magic):
+                        return
+                    (size, mtime, digest, count) = header.unpack_from(
+                        head, len(magic)
+                    )
+                    if not self.applies(size, mtime, digest):
+                        return
+                    index = stream.read(count * page_length.size)
+            except (OSError, struct.error):
+                return
+            try:
+                self.lengths = [
+                    length for (length,) in page_length.iter_unpack(index)
+                ]
+            except struct.error:
+                return
+            self.offset = len(head) + len(index)
+
+    def applies(self, size: int, mtime: int, digest: bytes) -> bool:
+        """
+        Checks if the archived history ends with the file as it was loaded.
+
+        That is the case if the file had the archived size and modification
+        time. Otherwise, provided the file was not changed since it was
+        loaded, its digest must match the archived one, as is the case when
+        the file was only touched or copied. Unless the file is too large to
+        be digested.
+        """
+        status = self.status
+        if (size, mtime) == (status.st_size, status.st_mtime_ns):
+            return True
+        if digest == no_digest or not self.digests(status.st_size):
+            return False
+        try:
+            current = self.file.stat()
+        except OSError:
+            return False
+        if not same_status(current, status):
+            return False
+        return (file_digest(self.file) == digest)
+
+    def pop(self) -> list[Batch]:
+        """Returns the latest batches not yet popped, oldest first."""
+        self.open()
+        with self.lock:
+            if not self.lengths:
+                return []
+            length = self.lengths.pop()
+            offset = self.offset + sum(self.lengths)
+            try:
+                with self.path.open('rb') as stream:
+                    stream.seek(offset)
+                    return decode_page(stream.read(length))
+            except (OSError, ValueError, zlib.error):
+                # Older pages are of no use without this one.
+                self.lengths.clear()
+                return []
+
+    def store(
+        self,
+        status:   os.stat_result,
+        batches:  list[Batch],
+        complete: bool,
+    ):
+        """
+        Writes the `batches` of edits to the archive, as the file was saved.
+
+        The file now has the given `status`. If the batches are `complete`,
+        i.e. undoing them all leads back to the file as it was loaded, the
+        pages not yet popped are kept in front of them. Otherwise those are
+        dropped.
+        """
+        self.open()
+        with self.lock:
+            if not complete:
+                self.lengths.clear()
+            kept = b''
+            if self.lengths:
+                try:
+                    with self.path.open('rb') as stream:
+                        stream.seek(self.offset)
+                        kept = stream.read(sum(self.lengths))
+                except OSError:
+                    self.lengths.clear()
+            pages = [
+                encode_page(batches[start:start + page_batches])
+                for start in range(0, len(batches), page_batches)
+            ]
+            lengths = self.lengths + [len(page) for page in pages]
+            if not lengths:
+                self.path.unlink(missing_ok=True)
+                return
+            if self.digests(status.st_size):
+                digest = file_digest(self.file)
+            else:
+                digest = no_digest
+            head = magic + header.pack(
+                status.st_size, status.st_mtime_ns, digest, len(lengths),
+            )
+            index = b''.join(page_length.pack(length) for length in lengths)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.path, [head, index, kept, *pages])
+            self.offset = len(head) + len(index)
+
+    def digests(self, size: int) -> bool:
+        """Tells if the file is digested when it has the given `size`."""
+        return (self.limit is None or size <= self.limit)
+
+
+def archive_path(file: Path) -> Path:
+    """Returns where the edit history of the given `file` is archived."""
+    name = str(file.resolve()).encode('utf-8', errors='surrogatepass')
+    return folder / f'{hashlib.sha256(name).hexdigest()[:32]}.history'
+
+
+def file_digest(file: Path) -> bytes:
+    """Returns the SHA-256 digest of the content of the `file`."""
+    with file.open('rb') as stream:
+        return hashlib.file_digest(stream, 'sha256').digest()
+
+
+def encode_page(batches: list[Batch]) -> bytes:
+    """Serializes and compresses the `batches` of edits."""
+    data = [[encode_edit(edit) for edit in batch] for batch in batches]
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(text.encode('utf-8', errors='surrogatepass'), 9)
+
+
+def decode_page(data: bytes) -> list[Batch]:
+    """Decompresses and deserializes batches of edits."""
+    text = zlib.decompress(data).decode('utf-8', errors='surrogatepass')
+    data = json.loads(text)
+    return [[decode_edit(edit) for edit in batch] for batch in data]
+
+
+def encode_edit(edit: Edit) -> list[object]:
+    """Returns what is needed to undo and redo an `edit`, as a list."""
+    result    = edit._edit_result
+    selection = edit._original_selection
+    return [
+        edit.text, edit.from_location, edit.to_location,
+        edit.maintain_selection_offset,
+        result.end_location, result.replaced_text,
+        [selection.start, selection.end] if selection else None,
+    ]
+
+
+def decode_edit(fields: list[object]) -> Edit:
+    """Recreates an edit from the list returned by `encode_edit()`."""
+    (text, start, end, maintain, end_location, replaced, selection) = fields
+    edit = Edit(text, tuple(start), tuple(end), maintain)
+    edit._edit_result = EditResult(tuple(end_location), replaced)
+    if selection:
+        edit._original_selection = Selection(*map(tuple, selection))
+    return edit
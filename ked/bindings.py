@@ -117,6 +117,40 @@ editor = [
         id          = 'change_newline',
     ),
 
+    # Search
+    Binding(
+        key         = '<ignore>',
+        action      = 'find',
+        description = 'Find',
+        tooltip     = 'Search for a regular expression.',
+        show        = False,
+        id          = 'find',
+    ),
+    Binding(
+        key         = '<ignore>',
+        action      = 'find_next',
+        description = 'Find next',
+        tooltip     = 'Select the next match of the search.',
+        show        = False,
+        id          = 'find_next',
+    ),
+    Binding(
+        key         = '<ignore>',
+        action      = 'find_previous',
+        description = 'Find previous',
+        tooltip     = 'Select the previous match of the search.',
+        show        = False,
+        id          = 'find_previous',
+    ),
+    Binding(
+        key         = '<ignore>',
+        action      = 'replace_all',
+        description = 'Replace all',
+        tooltip     = 'Replace all matches of a regular expression.',
+        show        = False,
+        id          = 'replace_all',
+    ),
+
     # Clipboard interaction
     Binding(
         key         = '<ignore>',
@@ -258,6 +292,14 @@ editor = [
         show        = False,
         id          = 'cursor_file_end',
     ),
+    Binding(
+        key         = '<ignore>',
+        action      = 'goto_line',
+        description = 'Go to line',
+        tooltip     = 'Move the cursor to the line with a given number.',
+        show        = False,
+        id          = 'goto_line',
+    ),
 
     # Text deletion
     Binding(
@@ -1,8 +1,8 @@
 ﻿"""Command-line interface of the application"""
 
-from .    import meta
-from .    import config
-from .tui import TUI
+from . import profiling
+from . import meta
+from . import config
 
 from cyclopts import App, Parameter, Group
 
@@ -39,11 +39,36 @@ cli['--version'].group = 'Options'
 
 cli.command(config.cli)
 
+Profile = Annotated[bool, Parameter(
+    help     = 'Print how long each phase of starting the editor took.',
+    negative = (),
+)]
+
+Trace = Annotated[Path, Parameter(
+    help = 'Also save the start-up phases to this file, as a Chrome trace.',
+)]
+
+
+Hex = Annotated[bool, Parameter(
+    help     = 'Show the file as a hex dump, even if it contains text.',
+    negative = (),
+)]
+
+
+Follow = Annotated[bool, Parameter(
+    help     = 'Keep showing text appended to the file, like "tail -f".',
+    negative = (),
+)]
+
 
 @cli.default()
 def default(
     file: Annotated[Path, Parameter(name=['FILE'])] = None,
     /,              # Make this a positional argument only, no "--file" option.
+    *,
+    hex:             Hex     = False,
+    profile_startup: Profile = False,
+    startup_trace:   Trace   = None,
 ) -> int:
     """
     The default command that runs if no other command matched.
@@ -54,23 +79,44 @@ def default(
     if file is None:
         cli.help_print()
         return 0
-    return edit(file)
+    return edit(
+        file,
+        hex             = hex,
+        profile_startup = profile_startup,
+        startup_trace   = startup_trace,
+    )
 
 
 @cli.command(sort_key=1, help_epilogue='')
-def edit(file: Path) -> int:
+def edit(
+    file: Path,
+    *,
+    hex:             Hex     = False,
+    profile_startup: Profile = False,
+    startup_trace:   Trace   = None,
+) -> int:
     """Edit an existing file. (default)"""
-    if not file.exists():
-        error(f'File "{file}" does not exist.')
-        print('To create a file and then edit it, use the "create" command.')
-        return 1
-    if file.is_dir():
-        error(f'"{file}" is a directory.')
-        return 2
-    return start(file)
+    if exit_code := check_exists(file):
+        return exit_code
+    if profile_startup or startup_trace:
+        profiling.start()
+    exit_code = start(file, hex_view=hex)
+    if profile_startup:
+        print(profiling.report())
+    if startup_trace:
+        profiling.save_trace(startup_trace)
+    return exit_code
 
 
 @cli.command(sort_key=2, help_epilogue='')
+def view(file: Path, *, follow: Follow = False) -> int:
+    """View an existing file, without editing it."""
+    if exit_code := check_exists(file):
+        return exit_code
+    return start(file, view_only=True, follow=follow)
+
+
+@cli.command(sort_key=3, help_epilogue='')
 def create(file: Path) -> int:
     """Create a new file and edit it."""
     if file.exists():
@@ -81,6 +127,18 @@ def create(file: Path) -> int:
     return start(file)
 
 
+def check_exists(file: Path) -> int:
+    """Reports an error and returns its exit code if `file` can't be opened."""
+    if not file.exists():
+        error(f'File "{file}" does not exist.')
+        print('To create a file and then edit it, use the "create" command.')
+        return 1
+    if file.is_dir():
+        error(f'"{file}" is a directory.')
+        return 2
+    return 0
+
+
 def print(message: str):
     """Displays a `message` in the terminal."""
     cli.console.print(message)
@@ -91,9 +149,21 @@ def error(message: str):
     cli.error_console.print(f'[bold red]Error:[/bold red] {message}')
 
 
-def start(file: Path) -> int:
+def start(
+    file:      Path,
+    hex_view:  bool = False,
+    view_only: bool = False,
+    follow:    bool = False,
+) -> int:
     """Starts the text-based user interface with the given `file` loaded."""
+    # Import here, not at the top: Textual takes a while to import, which
+    # commands that don't start the user interface need not wait for.
+    with profiling.phase('import user interface'):
+        from .tui import TUI
     tui = TUI()
+    tui.hex_view = hex_view
+    tui.view_only = view_only
+    tui.follow = follow
     tui.file = file
     error_message = tui.run()
     if error_message:
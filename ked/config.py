@@ -1,17 +1,23 @@
 ﻿"""Persistent storage of configuration settings"""
 
-from . import meta
+from .      import meta
+from .      import profiling
+from .files import write_atomic
 
 import cyclopts
 import platformdirs
 import yaml
 
-from functools import cache
-from pathlib   import Path
-from typing    import TypeAlias
-from types     import NoneType
-from typing    import Literal
-from typing    import Union
+import copy
+import operator
+
+from pathlib         import Path
+from typing          import TypeAlias
+from types           import NoneType
+from types           import MappingProxyType
+from typing          import Literal
+from typing          import Union
+from collections.abc import Mapping
 
 
 user_dir: Path = platformdirs.user_config_path() / meta.name
@@ -27,6 +33,12 @@ Setting:  TypeAlias = tuple[str, ...]
 Value:    TypeAlias = str | float | int | bool
 Settings: TypeAlias = dict[str, Union[Value, 'Settings']]
 
+loaded: dict[str, tuple[tuple[int, int, int] | None, Settings]] = {}
+"""settings cached per source, along with the status of the file"""
+
+snapshots: dict[str, tuple[tuple[Settings, ...], Mapping[Setting, Value]]] = {}
+"""merged snapshots per source, along with the settings they were made of"""
+
 cli = cyclopts.App(
     name          = 'config',
     sort_key      = 3,
@@ -65,21 +77,21 @@ def query(
     setting: Setting,
     source:  Literal['user', 'site', 'default', 'all'] = 'all',
 ) -> Value:
-    """Queries the value of a `setting` from configuration `source` file(s)."""
+    """
+    Queries the value of a `setting` from configuration `source` file(s).
+
+    If the setting is a section, such as `('keys',)`, the settings in it
+    are returned as a nested dictionary.
+    """
     if not isinstance(setting, tuple):
         raise TypeError('Argument `setting` must be a tuple of strings.')
     if setting == ():
         raise ValueError('Argument `setting` cannot be an empty tuple.')
-    match source:
-        case 'user' | 'site' | 'default':
-            sources = (source,)
-        case 'all':
-            sources = ('user', 'site', 'default')
-    for source in sources:
-        value = query_value(setting, load(source))
-        if value is not None:
-            break
-    else:
+    settings = snapshot(source)
+    value = settings.get(setting)
+    if value is None:
+        value = section(setting, settings) or None
+    if value is None:
         raise KeyError(f'Setting "{setting}" not found in configuration.')
     return value
 
@@ -90,31 +102,36 @@ def store(
     target:  Literal['user', 'site'] = 'user',
 ):
     """Stores the `value` of a `setting` in `target` configuration."""
-    match target:
-        case 'user':
-            folder = user_dir
-        case 'site':
-            folder = site_dir
+    store_many({setting: value}, target)
 
-    file = folder/file_name
-    if not file.exists():
-        file.parent.mkdir(parents=True, exist_ok=True)
-        file.write_text('', encoding='UTF-8-sig')
 
-    settings = load(target)
-    store_value(setting, value, settings)
-    load.cache_clear()
+def store_many(
+    values: Mapping[Setting, Value],
+    target: Literal['user', 'site'] = 'user',
+):
+    """
+    Stores several settings, mapped to their `values`, in one go.
+
+    The `target` configuration file is read, changed, and written only once,
+    and is replaced atomically, so another process reading it never sees it
+    half-written. Only the cache of that one file is invalidated.
+    """
+    settings = copy.deepcopy(load(target))
+    for (setting, value) in values.items():
+        store_value(setting, value, settings)
     save(settings, target)
+    loaded.pop(target, None)
 
 
-@cache
 def load(source: Literal['user', 'site', 'default']) -> Settings:
     """
     Loads settings from requested configuration `source`.
 
-    This function is cached, i.e. the file corresponding to the given source
-    will only be read from disk once. If the file ever changes, call
-    `load.clear_cache()` to invalidate the cache.
+    The settings are cached, along with the modification time, size, and
+    inode number of the file they were read from. The file is only read
+    again if any of those changed, which takes just one `stat` call to find
+    out. So changes made by another process, such as a second instance of
+    the app, are picked up on the next call.
     """
     match source:
         case 'user':
@@ -124,14 +141,63 @@ def load(source: Literal['user', 'site', 'default']) -> Settings:
         case 'default':
             here = Path(__file__).parent
             file = here / file_name
-    if not file.exists():
-        return {}
-    settings = yaml.safe_load(file.read_text(encoding='UTF-8-sig'))
-    if isinstance(settings, (NoneType, str)):
-        return {}
+    status = file_status(file)
+    if (cached := loaded.get(source)) and cached[0] == status:
+        return cached[1]
+    if status is None:
+        settings = {}
+    else:
+        with profiling.phase(f'load {source} config'):
+            settings = yaml.safe_load(file.read_text(encoding='UTF-8-sig'))
+        if isinstance(settings, (NoneType, str)):
+            settings = {}
+    loaded[source] = (status, settings)
     return settings
 
 
+def file_status(file: Path) -> tuple[int, int, int] | None:
+    """Returns modification time, size, and inode of `file`, if it exists."""
+    try:
+        status = file.stat()
+    except FileNotFoundError:
+        return None
+    return (status.st_mtime_ns, status.st_size, status.st_ino)
+
+
+def snapshot(
+    source: Literal['user', 'site', 'default', 'all'] = 'all',
+) -> Mapping[Setting, Value]:
+    """
+    Returns the settings from configuration `source` file(s) as flat mapping.
+
+    The keys are the settings, i.e. tuples of strings, that lead to values
+    in the nested dictionaries of the configuration files. Source `'all'`
+    merges all files, where user settings take precedence over site
+    settings, which take precedence over the defaults.
+
+    The snapshot is cached, and only merged again if `load()` returned new
+    settings for any of the sources, i.e. if a file changed. So callers can
+    tell that the configuration changed by comparing snapshots by identity.
+    The returned mapping is read-only, so that the cached snapshot cannot be
+    altered by accident.
+    """
+    match source:
+        case 'user' | 'site' | 'default':
+            sources = (source,)
+        case 'all':
+            sources = ('default', 'site', 'user')
+    layers = tuple(load(name) for name in sources)
+    if cached := snapshots.get(source):
+        (previous, settings) = cached
+        if all(map(operator.is_, layers, previous)):
+            return settings
+    merged = {}
+    for layer in layers:
+        merged.update(flatten(layer))
+    snapshots[source] = (layers, MappingProxyType(merged))
+    return snapshots[source][1]
+
+
 def save(settings: Settings, target: Literal['user', 'site', 'default']):
     """Saves settings in `target` configuration."""
     match target:
@@ -142,10 +208,9 @@ def save(settings: Settings, target: Literal['user', 'site', 'default']):
         case 'default':
             here = Path(__file__).parent
             file = here / file_name
-    file.write_text(
-        yaml.dump(settings, indent=4, allow_unicode=True),
-        encoding='UTF-8-sig',
-    )
+    file.parent.mkdir(parents=True, exist_ok=True)
+    text = yaml.dump(settings, indent=4, allow_unicode=True)
+    write_atomic(file, [text.encode('UTF-8-sig')])
 
 
 def query_value(setting: Setting, settings: Settings) -> Value | None:
@@ -163,6 +228,41 @@ def query_value(setting: Setting, settings: Settings) -> Value | None:
     return query_value(setting[1:], settings[key])
 
 
+def flatten(settings: Settings, prefix: Setting = ()) -> dict[Setting, Value]:
+    """
+    Flattens the nested `settings` dictionary.
+
+    Returns a dictionary that maps each setting, with the given `prefix`
+    prepended, to its value. Settings that have no value are left out.
+    """
+    flat = {}
+    for (key, value) in settings.items():
+        setting = (*prefix, key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, setting))
+        elif value is not None:
+            flat[setting] = value
+    return flat
+
+
+def section(
+    setting:  Setting,
+    settings: Mapping[Setting, Value],
+) -> Settings:
+    """
+    Collects the settings nested under `setting` from flattened `settings`.
+
+    Returns them as a nested dictionary, the reverse of `flatten()`, which
+    is empty if there are none.
+    """
+    length = len(setting)
+    nested: Settings = {}
+    for (key, value) in settings.items():
+        if len(key) > length and key[:length] == setting:
+            store_value(key[length:], value, nested)
+    return nested
+
+
 def store_value(setting: Setting, value: Value, settings: Settings):
     """
     Stores the `value` of the `setting` in the `settings` dictionary.
@@ -0,0 +1,104 @@
+﻿"""Detection of the text encoding of files"""
+
+import re
+import codecs
+
+
+sample_size = 1 << 16
+"""number of bytes at the start of a file to base the detection on"""
+
+boms = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8,     'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+"""byte-order marks and the encodings they indicate, longest first"""
+
+cookie = re.compile(rb'^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)', re.ASCII)
+"""Python-style encoding declaration, see PEP 263"""
+
+cp1252_undefined = frozenset(b'\x81\x8d\x8f\x90\x9d')
+"""bytes that have no character assigned in Windows code page 1252"""
+
+not_c1 = bytes(range(0x80)) + bytes(range(0xA0, 0x100))
+"""all bytes except those of the C1 control codes, 0x80 to 0x9F"""
+
+
+def detect_encoding(data: bytes, final: bool = True) -> str:
+    """
+    Detects the text encoding of the given `data`.
+
+    The `data` is usually the start of a file, up to `sample_size` bytes.
+    Pass `final=False` if the file is longer than that, so that a character
+    cut off at the end of the sample is not mistaken for invalid UTF-8.
+
+    Recognizes byte-order marks of the Unicode encodings and the coding
+    declarations of Python source files. Otherwise checks if the data is
+    valid UTF-8, and if not, assumes one of two common single-byte
+    encodings, see `fallback_encoding()`. Returns the normalized name of
+    the codec, such as `'utf-8'` or `'cp1252'`, as per `codecs.lookup()`.
+    """
+    for (bom, encoding) in boms:
+        if data.startswith(bom):
+            return encoding
+    if declared := declared_encoding(data):
+        return declared
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        decoder.decode(data, final)
+    except UnicodeDecodeError:
+        return fallback_encoding(data)
+    return 'utf-8'
+
+
+def declared_encoding(data: bytes) -> str | None:
+    """Returns the encoding declared in the first two lines, if any."""
+    for line in data.split(b'\n', 2)[:2]:
+        if match := cookie.match(line):
+            try:
+                return codecs.lookup(match[1].decode('ascii')).name
+            except LookupError:
+                return None
+        if line.strip() and not line.lstrip().startswith(b'#'):
+            # The declaration must come before any code.
+            return None
+    return None
+
+
+def fallback_encoding(data: bytes) -> str:
+    """
+    Picks a single-byte encoding for data that is not valid UTF-8.
+
+    Any byte sequence is valid Latin-1, but its characters in the range from
+    0x80 to 0x9F are control codes that hardly ever occur in text. Windows
+    code page 1252 assigns printable characters, such as curly quotes, to
+    most of them. So if those bytes are present, and all are defined in code
+    page 1252, that is the better guess.
+    """
+    c1 = set(data.translate(None, not_c1))
+    if c1 and not (c1 & cp1252_undefined):
+        return 'cp1252'
+    return 'iso8859-1'
+
+
+def is_ascii_compatible(encoding: str) -> bool:
+    """Checks if line breaks can be found in the raw bytes of an `encoding`."""
+    try:
+        # Compare like this to ignore a byte-order mark the codec may prepend.
+        return 'a\n'.encode(encoding) == 'a'.encode(encoding) + b'\n'
+    except LookupError:
+        return False
+
+
+def is_binary(data: bytes, encoding: str) -> bool:
+    """
+    Checks if the `data` sampled from a file looks like binary data.
+
+    Text in the common encodings never contains NUL bytes, whereas most
+    binary formats have plenty of them, usually right at the start. In
+    encodings that are not ASCII-compatible, such as UTF-16, NUL bytes are
+    part of regular characters, so we cannot tell from them.
+    """
+    return b'\0' in data and is_ascii_compatible(encoding)
@@ -0,0 +1,1007 @@
+﻿"""Document backends for the editor widget"""
+
+from .loading import newlines_found
+from .loading import split_at_breaks
+from .loading import line_break
+
+from textual.document._document import DocumentBase
+from textual.document._document import EditResult
+from textual.document._document import Location
+from textual.document._document import VALID_NEWLINES
+from textual.document._document import _detect_newline_style
+from textual.geometry           import Size
+from textual.cache              import LRUCache
+from textual._cells             import cell_len
+from tree_sitter                import Language
+from tree_sitter                import Node
+from tree_sitter                import Parser
+from tree_sitter                import Query
+from tree_sitter                import QueryCursor
+
+import os
+import re
+import mmap
+import codecs
+import tempfile
+from array       import array
+from bisect      import bisect_right
+from itertools   import islice
+from collections import abc
+from random      import random
+from copy        import copy
+from contextlib  import ExitStack
+from pathlib     import Path
+from typing      import BinaryIO
+
+
+block_size = 1 << 20
+"""nominal size of the blocks a memory-mapped file is indexed in, in bytes"""
+
+index_step = 16 << 20
+"""number of bytes indexed per call of `MappedLines.index_more()`"""
+
+byte_break = re.compile(rb'\r\n|\r|\n')
+"""line break in the bytes of an ASCII-compatible file"""
+
+row_size = 16
+"""number of bytes shown per line of a hex dump"""
+
+printable = bytes(
+    byte if 0x20 <= byte < 0x7F else ord('.') for byte in range(256)
+)
+"""translation table that replaces non-printable bytes with dots"""
+
+
+class MappedLines(abc.Sequence):
+    """
+    Lines of a memory-mapped file, decoded on demand
+
+    The file is divided into blocks of about `block_size` bytes, each ending
+    on a line break. Up front, we only count the line breaks in each block,
+    which is fast, as it runs in C. A block is decoded, and split into lines,
+    only when one of its lines is accessed. Decoded blocks are kept in a cache
+    of limited size, so that memory use stays flat regardless of file size.
+    Lines are split at CR, LF, and CRLF, same as when a file is loaded.
+
+    Indexing a multi-gigabyte file still takes a moment. It can therefore be
+    done incrementally, via `index_more()`, in which case the sequence grows
+    until `indexed` is true.
+
+    The `file` may be given as a path, or as a stream already opened for
+    reading in binary mode.
+    """
+
+    def __init__(self, file: Path | BinaryIO, encoding: str):
+        with ExitStack() as stack:
+            if isinstance(file, Path):
+                stream = stack.enter_context(file.open('rb'))
+            else:
+                stream = file
+            self._mapping = [
+                mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            ]
+            """memory map of the file, shared with copies, see `detach()`"""
+            status = os.fstat(stream.fileno())
+        self.inode = (status.st_dev, status.st_ino)
+        """device and inode number that identify the mapped file"""
+        self.encoding = encoding
+        """text encoding used to decode lines"""
+        self.bom = 0
+        """length of the byte-order mark at the start of the file, if any"""
+        utf8_sig = (codecs.lookup(encoding).name == 'utf-8-sig')
+        if utf8_sig and self.mmap[:3] == codecs.BOM_UTF8:
+            self.bom = 3
+        self.width = 0
+        """length of the longest line decoded so far"""
+        self.indexed = False
+        """flag indicating that the entire file has been indexed"""
+        self.newlines = detect_newlines(self.mmap[:block_size])
+        """line endings found in first block, same as `TextIOBase.newlines`"""
+        self._starts = array('q')
+        """byte offsets at which the indexed blocks start"""
+        self._firsts = array('q')
+        """numbers of the first lines in each of the indexed blocks"""
+        self._end = 0
+        """byte offset up to which the file has been indexed"""
+        self._count = 0
+        """number of lines indexed so far"""
+        self._blocks: LRUCache[int, list[str]] = LRUCache(16)
+        """recently decoded blocks, split into lines"""
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def mmap(self) -> mmap.mmap:
+        """Memory map of the file, or of a copy of it once detached."""
+        return self._mapping[0]
+
+    def detach(self):
+        """
+        Maps a temporary copy of the file instead of the file itself.
+
+        On Windows, a file cannot be replaced while it is memory-mapped. Once
+        detached, it can be, as lines are then read from the copy. This also
+        applies to all copies of this object, which share the mapping. The
+        temporary file is deleted as soon as it is no longer mapped.
+        """
+        with tempfile.TemporaryFile() as stream:
+            stream.write(self.mmap)
+            stream.flush()
+            copy = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        (original, self._mapping[0]) = (self._mapping[0], copy)
+        original.close()
+
+    def __copy__(self) -> 'MappedLines':
+        """Returns a view of the same lines, but with its own block cache."""
+        clone = object.__new__(MappedLines)
+        clone.__dict__.update(self.__dict__)
+        clone._starts = array('q', self._starts)
+        clone._firsts = array('q', self._firsts)
+        clone._blocks = LRUCache(16)
+        return clone
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            (start, stop, step) = index.indices(self._count)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            # Slice block by block, rather than look up every line separately.
+            lines = []
+            while start < stop:
+                block = bisect_right(self._firsts, start) - 1
+                first = self._firsts[block]
+                chunk = self.block(block)[start - first:stop - first]
+                lines.extend(chunk)
+                start += len(chunk)
+            return lines
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('Line index out of range.')
+        block = bisect_right(self._firsts, index) - 1
+        return self.block(block)[index - self._firsts[block]]
+
+    def block(self, number: int) -> list[str]:
+        """Returns the lines in the block with the given `number`."""
+        lines = self._blocks.get(number)
+        if lines is not None:
+            return lines
+        start = self._starts[number]
+        if number + 1 < len(self._starts):
+            stop = self._starts[number + 1]
+        else:
+            stop = self._end
+        text  = self.mmap[start:stop].decode(self.encoding, errors='replace')
+        if '\r' in text:
+            lines = line_break.split(text)
+        else:
+            lines = text.split('\n')
+        if stop < len(self.mmap):
+            # The block ends on a line break, so the last item is empty. At
+            # the end of the file, however, that empty item is the last line,
+            # just like in Textual's default document.
+            lines.pop()
+        self.width = max(self.width, max(map(len, lines), default=0))
+        self._blocks[number] = lines
+        return lines
+
+    def offset(self, index: int) -> int:
+        """Returns the byte offset in the file where line `index` starts."""
+        if index == self._count:
+            return self._end
+        block = bisect_right(self._firsts, index) - 1
+        position = self._starts[block] or self.bom
+        if block + 1 < len(self._starts):
+            stop = self._starts[block + 1]
+        else:
+            stop = self._end
+        skip = index - self._firsts[block]
+        mm   = self.mmap
+        if mm.find(b'\r', position, stop) < 0:
+            for _ in range(skip):
+                position = mm.find(b'\n', position) + 1
+            return position
+        breaks = byte_break.finditer(mm, position, stop)
+        for match in islice(breaks, skip):
+            position = match.end()
+        return position
+
+    def index_more(self, step: int = index_step):
+        """Indexes (at least) another `step` bytes of the file."""
+        mm   = self.mmap
+        size = len(mm)
+        goal = min(self._end + step, size)
+        while self._end < goal:
+            start = self._end
+            stop  = min(start + block_size, size)
+            if stop < size:
+                # A CR at the end may be the first half of a CRLF.
+                cut = max(
+                    mm.rfind(b'\n', start, stop),
+                    mm.rfind(b'\r', start, stop - 1),
+                )
+                if cut < 0:
+                    # Line longer than the block size. Extend the block.
+                    cut = next_break(mm, stop)
+                stop = (cut + 1) if cut >= 0 else size
+            chunk  = mm[start:stop]
+            breaks = chunk.count(b'\n')
+            if b'\r' in chunk:
+                breaks += chunk.count(b'\r') - chunk.count(b'\r\n')
+            self._starts.append(start)
+            self._firsts.append(self._count)
+            if stop == size:
+                # Count the last line, which has no line break at its end.
+                breaks += 1
+            self._count += breaks
+            self._end = stop
+        if self._end == size:
+            self.indexed = True
+
+    def index_all(self):
+        """Indexes the remainder of the file."""
+        while not self.indexed:
+            self.index_more()
+
+
+class Piece:
+    """
+    Node in the tree of pieces that make up a document
+
+    A piece is a range of consecutive lines in one of two buffers: the lines
+    of the original text, or the lines added by edits. The tree is ordered by
+    position in the document, and is balanced as a treap, i.e. the nodes are
+    heap-ordered by random priorities. Each node also keeps track of the total
+    number of lines, and of (UTF-8) bytes, in its subtree.
+
+    Nodes are never modified once created. Edits create new nodes along the
+    path from the root to the edited position, and share everything else
+    with the previous tree. Older versions of the document therefore remain
+    valid as long as something holds a reference to their root.
+    """
+
+    __slots__ = (
+        'added', 'bytes', 'count', 'left', 'lines', 'priority', 'right',
+        'size', 'start',
+    )
+
+    def __init__(self,
+        added:    bool,
+        start:    int,
+        count:    int,
+        size:     int,
+        priority: float,
+        left:     'Piece | None',
+        right:    'Piece | None',
+    ):
+        self.added    = added
+        """whether lines are from the add buffer, or the original lines"""
+        self.start    = start
+        """index of the first line in the buffer"""
+        self.count    = count
+        """number of lines in the piece"""
+        self.size     = size
+        """number of bytes in the piece, if tracked, otherwise zero"""
+        self.priority = priority
+        """random priority that keeps the tree balanced"""
+        self.left     = left
+        """subtree of pieces that come before this one"""
+        self.right    = right
+        """subtree of pieces that come after this one"""
+        self.lines    = count
+        """number of lines in this subtree"""
+        self.bytes    = size
+        """number of bytes in this subtree"""
+        if left:
+            self.lines += left.lines
+            self.bytes += left.bytes
+        if right:
+            self.lines += right.lines
+            self.bytes += right.bytes
+
+    def attach(self, left: 'Piece | None', right: 'Piece | None') -> 'Piece':
+        """Returns a copy of this piece with different subtrees."""
+        return Piece(
+            self.added, self.start, self.count, self.size, self.priority,
+            left, right,
+        )
+
+
+class PieceTable(DocumentBase):
+    """
+    Document stored as a piece table
+
+    The original lines are never modified. Lines created by edits are
+    appended to an add buffer, which only ever grows. The document is a
+    sequence of pieces referring to ranges of lines in these two buffers,
+    held in a balanced tree (see `Piece`). Edits, as well as look-ups of
+    lines by index, therefore take logarithmic time in the number of pieces,
+    independent of the size of the document.
+
+    The original lines may be given as a list of strings, or as any other
+    sequence, such as the lines of a memory-mapped file.
+    """
+
+    def __init__(self, original: abc.Sequence[str], newline: str):
+        self.original = original
+        """lines of the original text"""
+        self.added: list[str] = []
+        """lines added by edits, in the order they were created"""
+        self._newline = newline
+        self._root: Piece | None = None
+        """root of the tree of pieces"""
+        self._widths: dict[int, tuple[int, int]] = {}
+        """maximum widths of lines seen so far, per tab width"""
+        self.edited_rows: list[tuple[int, int, int]] = []
+        """first, old last, and new last row of each edit not yet processed"""
+        if original:
+            self._root = self.piece(False, 0, len(original))
+
+    @classmethod
+    def from_text(cls, text: str, *args: object) -> 'PieceTable':
+        """Creates the document from the given `text`."""
+        return cls(split_lines(text), _detect_newline_style(text), *args)
+
+    @property
+    def text(self) -> str:
+        """The entire text of the document."""
+        return self._newline.join(self.lines)
+
+    @property
+    def newline(self) -> str:
+        """The line separator used in the document."""
+        return self._newline
+
+    @property
+    def lines(self) -> list[str]:
+        """All lines of the document, excluding line breaks."""
+        lines = []
+        for piece in self.pieces():
+            buffer = self.added if piece.added else self.original
+            lines.extend(buffer[piece.start:piece.start + piece.count])
+        return lines
+
+    def snapshot(self) -> 'PieceTable':
+        """
+        Returns a copy of the document in its current state.
+
+        This takes constant time, as the copy shares the buffers and the tree
+        of pieces, none of which are ever modified in place: edits only append
+        to the add buffer and create new tree nodes. The copy can thus be read
+        from another thread, for example to save it in the background, while
+        this document is being edited.
+        """
+        return copy(self)
+
+    def iter_lines(self, first: int = 0) -> abc.Iterator[str]:
+        """Yields the document's lines one by one, from line `first` on."""
+        (_, tail) = self.split(self._root, first)
+        for piece in walk(tail):
+            buffer = self.added if piece.added else self.original
+            stop   = piece.start + piece.count
+            for start in range(piece.start, stop, 4096):
+                yield from buffer[start:min(start + 4096, stop)]
+
+    def common_prefix(self, other: 'PieceTable') -> int:
+        """
+        Returns the number of leading lines shared with the `other` document.
+
+        The `other` document must be an earlier snapshot of this one. Lines
+        are then compared by where they are stored, not by content, which
+        means the result may be lower than the actual number of equal lines,
+        e.g. after an edit was undone. But it takes only linear time in the
+        number of pieces, not in the number of lines.
+        """
+        if other.added is not self.added:
+            return 0
+        return count_shared(self.pieces(), other.pieces())
+
+    def common_suffix(self, other: 'PieceTable') -> int:
+        """
+        Returns the number of trailing lines shared with the `other` document.
+
+        Same as `common_prefix()`, but counting from the end of the documents.
+        """
+        if other.added is not self.added:
+            return 0
+        return count_shared(
+            walk(self._root, backward=True),
+            walk(other._root, backward=True),
+            backward=True,
+        )
+
+    def line_offset(self, index: int, encoding: str, newline: str) -> int:
+        """
+        Returns the byte offset of line `index` when the document is saved.
+
+        That is, the number of bytes the preceding lines, including their
+        line breaks, take up when written to a file with the given `encoding`
+        and `newline` separator. This includes the byte-order mark, if the
+        encoding has one.
+        """
+        encoder = codecs.getincrementalencoder(encoding)()
+        offset  = len(encoder.encode(''))
+        newline_size = len(encoder.encode(newline))
+        remaining = index
+        for piece in self.pieces():
+            if not remaining:
+                break
+            count = min(piece.count, remaining)
+            offset += self.encoded_size(
+                piece.added, piece.start, piece.start + count,
+                encoder, newline_size,
+            )
+            remaining -= count
+        return offset
+
+    def encoded_size(
+        self,
+        added:        bool,
+        start:        int,
+        stop:         int,
+        encoder:      codecs.IncrementalEncoder,
+        newline_size: int,
+    ) -> int:
+        """Returns the encoded size of buffer lines, each with a line break."""
+        buffer = self.added if added else self.original
+        size = (stop - start) * newline_size
+        for first in range(start, stop, 4096):
+            chunk = buffer[first:min(first + 4096, stop)]
+            size += len(encoder.encode(''.join(chunk)))
+        return size
+
+    @property
+    def line_count(self) -> int:
+        """The number of lines in the document."""
+        return self._root.lines if self._root else 0
+
+    @property
+    def start(self) -> Location:
+        """The location of the start of the document."""
+        return (0, 0)
+
+    @property
+    def end(self) -> Location:
+        """The location of the end of the document."""
+        last = self.line_count - 1
+        return (last, len(self.get_line(last)))
+
+    def get_line(self, index: int) -> str:
+        """Returns the line with the given `index`."""
+        if index < 0:
+            index += self.line_count
+        node = self._root
+        while node:
+            left = node.left.lines if node.left else 0
+            if index < left:
+                node = node.left
+            elif index < left + node.count:
+                buffer = self.added if node.added else self.original
+                return buffer[node.start + index - left]
+            else:
+                index -= left + node.count
+                node   = node.right
+        raise IndexError('Line index out of range.')
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [
+                self.get_line(i)
+                for i in range(*index.indices(self.line_count))
+            ]
+        return self.get_line(index)
+
+    def get_size(self, tab_width: int) -> Size:
+        """
+        Returns the size of the document.
+
+        The width is that of the longest line the document ever had. It may
+        therefore be larger than necessary after long lines were deleted. But
+        it is determined incrementally, which keeps edits fast.
+        """
+        if tab_width in self._widths:
+            (width, checked) = self._widths[tab_width]
+        else:
+            (width, checked) = (self.original_width(tab_width), 0)
+        for line in self.added[checked:]:
+            width = max(width, cell_len(line.expandtabs(tab_width)))
+        self._widths[tab_width] = (width, len(self.added))
+        return Size(width, self.line_count)
+
+    def original_width(self, tab_width: int) -> int:
+        """Returns the width of the longest original line."""
+        return max(
+            (cell_len(line.expandtabs(tab_width)) for line in self.original),
+            default=0,
+        )
+
+    def get_text_range(self, start: Location, end: Location) -> str:
+        """Returns the text between the `start` and `end` locations."""
+        if start == end:
+            return ''
+        ((top_row, top_column), (bottom_row, bottom_column)) = sorted(
+            (start, end)
+        )
+        if top_row == bottom_row:
+            return self.get_line(top_row)[top_column:bottom_column]
+        parts = [self.get_line(top_row)[top_column:]]
+        for row in range(top_row + 1, bottom_row):
+            parts.append(self.get_line(row))
+        if bottom_row < self.line_count:
+            parts.append(self.get_line(bottom_row)[:bottom_column])
+        return self._newline.join(parts)
+
+    def replace_range(
+        self,
+        start: Location,
+        end:   Location,
+        text:  str,
+    ) -> EditResult:
+        """Replaces the text between `start` and `end` with `text`."""
+        (top, bottom) = sorted((start, end))
+        (top_row, top_column) = top
+        (bottom_row, bottom_column) = bottom
+        count = self.line_count
+
+        replaced = self.get_text_range(top, bottom)
+        before = self.get_line(top_row)[:top_column] if top_row < count else ''
+        if bottom_row < count:
+            after = self.get_line(bottom_row)[bottom_column:]
+        else:
+            after = ''
+
+        lines = split_at_breaks(text)
+        if text.endswith(tuple(VALID_NEWLINES)):
+            lines.append('')
+        if lines:
+            lines[0] = before + lines[0]
+            column   = len(lines[-1])
+            lines[-1] += after
+        else:
+            column = len(before)
+            lines  = [before + after]
+
+        self.splice(top_row, bottom_row + 1, lines)
+        end_row = top_row + len(lines) - 1
+        self.edited_rows.append((top_row, bottom_row, end_row))
+        return EditResult((end_row, column), replaced)
+
+    def splice(self, first: int, stop: int, lines: list[str]):
+        """Replaces the lines from `first` up to `stop` with new `lines`."""
+        (head, rest) = self.split(self._root, first)
+        (_,    tail) = self.split(rest, stop - first)
+        if lines:
+            start = len(self.added)
+            self.added.extend(lines)
+            head = self.merge(head, self.piece(True, start, len(lines)))
+        self._root = self.merge(head, tail)
+
+    def piece(self, added: bool, start: int, count: int) -> Piece:
+        """Creates a new piece, without subtrees."""
+        size = self.piece_size(added, start, count)
+        return Piece(added, start, count, size, random(), None, None)
+
+    def piece_size(self, _added: bool, _start: int, _count: int) -> int:
+        """
+        Returns the number of bytes in a piece.
+
+        Not tracked by default, i.e. returns zero. Override in subclasses
+        that need byte offsets.
+        """
+        return 0
+
+    def split(
+        self,
+        node: Piece | None,
+        index: int,
+    ) -> tuple[Piece | None, Piece | None]:
+        """Splits the tree below `node` into lines before and from `index`."""
+        if node is None:
+            return (None, None)
+        left = node.left.lines if node.left else 0
+        if index <= left:
+            (head, tail) = self.split(node.left, index)
+            return (head, node.attach(tail, node.right))
+        if index >= left + node.count:
+            (head, tail) = self.split(node.right, index - left - node.count)
+            return (node.attach(node.left, head), tail)
+        # The split falls inside this node's piece: cut it in two.
+        offset = index - left
+        first  = self.piece(node.added, node.start, offset)
+        second = self.piece(
+            node.added, node.start + offset, node.count - offset
+        )
+        return (
+            self.merge(node.left, first),
+            self.merge(second, node.right),
+        )
+
+    def merge(self, head: Piece | None, tail: Piece | None) -> Piece | None:
+        """Joins two trees, where all lines of `head` come before `tail`."""
+        if head is None:
+            return tail
+        if tail is None:
+            return head
+        if head.priority > tail.priority:
+            return head.attach(head.left, self.merge(head.right, tail))
+        return tail.attach(self.merge(head, tail.left), tail.right)
+
+    def pieces(self) -> abc.Iterator[Piece]:
+        """Yields all pieces in document order."""
+        return walk(self._root)
+
+
+class MappedDocument(PieceTable):
+    """
+    Document backed by a memory-mapped file
+
+    The original lines are read from the mapped file only when needed, i.e.
+    typically when displayed. Until the file has been indexed entirely, the
+    document must not be edited.
+    """
+
+    original: MappedLines
+
+    def index_more(self):
+        """Indexes more of the original file, see `MappedLines.index_more`."""
+        self.original.index_more()
+        # As the document was not edited yet, it consists of just one piece:
+        # the range of original lines indexed so far.
+        self._root = self.piece(False, 0, len(self.original))
+
+    def index_all(self):
+        """Indexes the remainder of the original file."""
+        while not self.indexed:
+            self.index_more()
+
+    def index_until(self, line: int):
+        """Indexes the original file at least up to the given `line`."""
+        while not self.indexed and self.line_count <= line:
+            self.index_more()
+
+    def encoded_size(
+        self,
+        added:        bool,
+        start:        int,
+        stop:         int,
+        encoder:      codecs.IncrementalEncoder,
+        newline_size: int,
+    ) -> int:
+        """
+        Returns the encoded size of buffer lines, each with a line break.
+
+        Original lines are not encoded, but measured in the mapped file. This
+        is only accurate as long as that file is the one the document is
+        saved to, as decoding may not have been lossless.
+        """
+        if added or start == stop:
+            return super().encoded_size(
+                added, start, stop, encoder, newline_size,
+            )
+        original = self.original
+        if stop < len(original):
+            return original.offset(stop) - original.offset(start)
+        # The last line in the file has no line break, so count it separately.
+        size = original.offset(stop - 1) - original.offset(start)
+        return size + super().encoded_size(
+            added, stop - 1, stop, encoder, newline_size,
+        )
+
+    def snapshot(self) -> 'MappedDocument':
+        """Returns a copy of the document that decodes lines independently."""
+        snapshot = super().snapshot()
+        snapshot.original = copy(self.original)
+        return snapshot
+
+    @property
+    def indexed(self) -> bool:
+        """Indicates whether the original file has been fully indexed."""
+        return self.original.indexed
+
+    def original_width(self, _tab_width: int) -> int:
+        """
+        Returns the width of the longest original line seen so far.
+
+        Does not account for tabs or wide characters. Determining the actual
+        width would require decoding the entire file.
+        """
+        return self.original.width
+
+    def get_size(self, tab_width: int) -> Size:
+        """Returns the size of the document, as far as known so far."""
+        # Original lines are decoded lazily, so their width may have grown.
+        self._widths.pop(tab_width, None)
+        return super().get_size(tab_width)
+
+
+class HexLines(abc.Sequence):
+    """
+    Hex dump of a memory-mapped file, formatted on demand
+
+    Each line shows the offset of a row of `row_size` bytes, those bytes in
+    hexadecimal notation, and the same bytes as ASCII characters, with dots
+    standing in for non-printable ones. Lines are only formatted when they
+    are accessed, so that even huge files open in constant time and memory.
+    """
+
+    def __init__(self, file: Path | BinaryIO):
+        with ExitStack() as stack:
+            if isinstance(file, Path):
+                stream = stack.enter_context(file.open('rb'))
+            else:
+                stream = file
+            size = os.fstat(stream.fileno()).st_size
+            self.mmap: mmap.mmap | bytes = b''
+            """memory-mapped file, or no bytes if the file is empty"""
+            if size:
+                self.mmap = mmap.mmap(
+                    stream.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        self.size = size
+        """size of the file in bytes"""
+        self.digits = max(len(f'{size:x}'), 8)
+        """number of hexadecimal digits the offsets are padded to"""
+        self.width = len(self.format(b'\0' * row_size, 0))
+        """length of every line"""
+
+    def __len__(self) -> int:
+        return max(-(-self.size // row_size), 1)
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Line index out of range.')
+        offset = index * row_size
+        return self.format(self.mmap[offset:offset + row_size], offset)
+
+    def format(self, row: bytes, offset: int) -> str:
+        """Formats a `row` of bytes found at the given `offset`."""
+        half  = row_size // 2
+        left  = row[:half].hex(' ')
+        right = row[half:].hex(' ')
+        text  = row.translate(printable).decode('ascii')
+        return (
+            f'{offset:0{self.digits}x}  {left:{3*half - 1}}  '
+            f'{right:{3*half - 1}}  |{text:{row_size}}|'
+        )
+
+
+class HexDocument(PieceTable):
+    """
+    Read-only document showing a hex dump of a file, see `HexLines`
+    """
+
+    original: HexLines
+
+    def original_width(self, _tab_width: int) -> int:
+        """Returns the width of the lines, which all have the same length."""
+        return self.original.width
+
+
+class SyntaxAwarePieceTable(PieceTable):
+    """
+    Piece table that maintains a tree-sitter syntax tree
+
+    Does the same as Textual's `SyntaxAwareDocument`. Tree-sitter addresses
+    the text by UTF-8 byte offsets, so we track byte counts in the tree of
+    pieces. That way, the byte offset of a location is found in logarithmic
+    time, too.
+    """
+
+    def __init__(self,
+        original: abc.Sequence[str],
+        newline:  str,
+        language: Language,
+    ):
+        self._offsets: dict[bool, array] = {}
+        """cumulative byte counts of lines in the two buffers"""
+        super().__init__(original, newline)
+        self.language = language
+        """tree-sitter language the text is parsed as"""
+        self._parser = Parser(language)
+        self._syntax_tree = self._parser.parse(self._read_callable)
+        self.changed_rows: list[tuple[int, int, int]] = []
+        """first, old last, and new last row of each change to the syntax"""
+
+    def prepare_query(self, query: str) -> Query:
+        """Prepares a tree-sitter query for use with this document."""
+        return Query(self.language, query)
+
+    def query_syntax_tree(
+        self,
+        query:       Query,
+        start_point: tuple[int, int] | None = None,
+        end_point:   tuple[int, int] | None = None,
+    ) -> dict[str, list[Node]]:
+        """Queries the syntax tree, possibly restricted to a range."""
+        cursor = QueryCursor(query)
+        if start_point is not None or end_point is not None:
+            cursor.set_point_range(
+                start_point or (0, 0),
+                end_point or (0xFFFFFFFF, 0xFFFFFFFF),
+            )
+        return cursor.captures(self._syntax_tree.root_node)
+
+    def replace_range(
+        self,
+        start: Location,
+        end:   Location,
+        text:  str,
+    ) -> EditResult:
+        """Replaces text and updates the syntax tree incrementally."""
+        (top, bottom) = sorted((start, end))
+        start_byte    = self.byte_offset(top)
+        start_point   = self.point(top)
+        old_end_byte  = self.byte_offset(bottom)
+        old_end_point = self.point(bottom)
+        result = super().replace_range(start, end, text)
+        self._syntax_tree.edit(
+            start_byte    = start_byte,
+            old_end_byte  = old_end_byte,
+            new_end_byte  = start_byte + len(text.encode('utf-8')),
+            start_point   = start_point,
+            old_end_point = old_end_point,
+            new_end_point = self.point(result.end_location),
+        )
+        old_tree = self._syntax_tree
+        self._syntax_tree = self._parser.parse(self._read_callable, old_tree)
+        changed = self.changed_rows
+        changed.append((top[0], bottom[0], result.end_location[0]))
+        for span in self._syntax_tree.changed_ranges(old_tree):
+            # The syntax may change beyond the edit, e.g. after a quote mark.
+            (start_row, _) = span.start_point
+            (end_row,   _) = span.end_point
+            changed.append((start_row, end_row, end_row))
+        return result
+
+    def piece_size(self, added: bool, start: int, count: int) -> int:
+        """Returns the number of bytes in a piece."""
+        buffer  = self.added if added else self.original
+        offsets = self._offsets.setdefault(added, array('q', [0]))
+        for line in buffer[len(offsets) - 1:]:
+            size = len(line) if line.isascii() else len(line.encode('utf-8'))
+            offsets.append(offsets[-1] + size)
+        return offsets[start + count] - offsets[start]
+
+    def byte_offset(self, location: Location) -> int:
+        """Returns the (UTF-8) byte offset of the given location."""
+        (row, _) = location
+        if row >= self.line_count:
+            return self._root.bytes + len(self._newline) * self.line_count
+        offset = row * len(self._newline)
+        index  = row
+        node   = self._root
+        while node:
+            left = node.left.lines if node.left else 0
+            if index < left:
+                node = node.left
+                continue
+            if node.left:
+                offset += node.left.bytes
+            if index < left + node.count:
+                offsets = self._offsets[node.added]
+                first   = node.start
+                offset += offsets[first + index - left] - offsets[first]
+                break
+            offset += node.size
+            index  -= left + node.count
+            node    = node.right
+        return offset + self.point(location)[1]
+
+    def point(self, location: Location) -> tuple[int, int]:
+        """Converts a location to a tree-sitter point, counting bytes."""
+        (row, column) = location
+        if row >= self.line_count:
+            return (row, 0)
+        return (row, len(self.get_line(row)[:column].encode('utf-8')))
+
+    def _read_callable(self, _offset: int, point: tuple[int, int]) -> bytes:
+        """Feeds tree-sitter the document content from the given point on."""
+        (row, column) = point
+        if row >= self.line_count:
+            return b''
+        line    = self.get_line(row).encode('utf-8')
+        newline = self._newline.encode('utf-8')
+        if column < len(line):
+            return line[column:] + newline
+        return newline[column - len(line):]
+
+
+def walk(node: Piece | None, backward: bool = False) -> abc.Iterator[Piece]:
+    """Yields the pieces in the tree below `node`, in document order."""
+    stack = []
+    while stack or node:
+        while node:
+            stack.append(node)
+            node = node.right if backward else node.left
+        node = stack.pop()
+        yield node
+        node = node.left if backward else node.right
+
+
+def count_shared(
+    ours:     abc.Iterator[Piece],
+    theirs:   abc.Iterator[Piece],
+    backward: bool = False,
+) -> int:
+    """
+    Counts the lines at the start of two sequences of pieces that are shared.
+
+    Lines are shared if they are stored in the same place in the same buffer.
+    If the pieces come in reverse order, pass `backward=True`, so that lines
+    are compared from the end of each piece.
+    """
+    (mine, their) = (next(ours, None), next(theirs, None))
+    (skip_mine, skip_their) = (0, 0)
+    common = 0
+    while mine and their:
+        if mine.added != their.added:
+            break
+        if backward:
+            position_mine  = mine.start + mine.count - skip_mine
+            position_their = their.start + their.count - skip_their
+        else:
+            position_mine  = mine.start + skip_mine
+            position_their = their.start + skip_their
+        if position_mine != position_their:
+            break
+        count = min(mine.count - skip_mine, their.count - skip_their)
+        common     += count
+        skip_mine  += count
+        skip_their += count
+        if skip_mine == mine.count:
+            (mine, skip_mine) = (next(ours, None), 0)
+        if skip_their == their.count:
+            (their, skip_their) = (next(theirs, None), 0)
+    return common
+
+
+def split_lines(text: str) -> list[str]:
+    """
+    Splits `text` into lines the same way Textual's `Document` does.
+
+    Except that lines are only split at actual line breaks, see
+    `split_at_breaks()`.
+    """
+    lines = split_at_breaks(text)
+    if text.endswith(tuple(VALID_NEWLINES)) or not text:
+        lines.append('')
+    return lines
+
+
+def detect_newlines(data: bytes) -> str | tuple[str, ...] | None:
+    """
+    Detects the line endings used in `data`.
+
+    Returns the same as the `newlines` attribute of a text stream would after
+    reading the data: `None` if there are no line breaks, a string if there is
+    only one kind, a tuple of strings if there are several.
+    """
+    crlf = data.count(b'\r\n')
+    counts = {
+        '\r\n': crlf,
+        '\n':   data.count(b'\n') - crlf,
+        '\r':   data.count(b'\r') - crlf,
+    }
+    return newlines_found(counts)
+
+
+def next_break(data: mmap.mmap, start: int) -> int:
+    """
+    Finds the next line break in `data`, from position `start` on.
+
+    Returns the position of the last byte of the line break, i.e. of the LF
+    in case of CRLF, or -1 if there is no further line break.
+    """
+    lf = data.find(b'\n', start)
+    # Look for CR only up to that LF, not through the rest of a huge file.
+    cr = data.find(b'\r', start, lf if lf >= 0 else len(data))
+    if cr < 0:
+        return lf
+    if data[cr + 1:cr + 2] == b'\n':
+        return cr + 1
+    return cr
@@ -1,20 +1,63 @@
 ﻿"""Editor widget central to the application"""
 
-from . import config
-from . import bindings
-from . import dialogs
+from .             import config
+from .             import bindings
+from .             import dialogs
+from .             import profiling
+from .document     import PieceTable
+from .document     import SyntaxAwarePieceTable
+from .document     import MappedLines
+from .document     import MappedDocument
+from .document     import HexLines
+from .document     import HexDocument
+from .document     import split_lines
+from .wrapping     import LazyWrappedDocument
+from .history      import History
+from .archive      import Archive
+from .archive      import Batch
+from .highlighting import Highlighter
+from .search       import Search
+from .journal      import Journal
+from .journal      import Replacement
+from .files        import save_lines
+from .files        import save_tail
+from .files        import same_status
+from .detection    import detect_encoding
+from .detection    import is_ascii_compatible
+from .detection    import is_binary
+from .loading      import load
+from .loading      import Tail
+from .detection    import sample_size
 
-from textual.widgets           import TextArea
-from textual.widgets.text_area import Edit
-from textual.reactive          import reactive
-from textual.message           import Message
-from textual.events            import Key
-from textual.events            import MouseDown
+from textual.widgets                     import TextArea
+from textual.widgets.text_area           import Selection
+from textual.document._document          import DocumentBase
+from textual.document._document          import EditResult
+from textual.document._document          import _detect_newline_style
+from textual.document._document_navigator import DocumentNavigator
+from textual.document._edit              import Edit
+from textual.reactive                    import reactive
+from textual.message                     import Message
+from textual.strip                       import Strip
+from textual.geometry                    import Offset
+from textual.geometry                    import Region
+from textual.worker                      import Worker
+from textual.worker                      import WorkerCancelled
+from textual.worker                      import WorkerFailed
+from textual.worker                      import get_current_worker
+from textual._tree_sitter                import get_language
+from tree_sitter                         import Query
+from rich.text                           import Text
 
 import os
-import tokenize
-from functools import partial
-from pathlib   import Path
+import re
+import asyncio
+from functools       import partial
+from itertools       import islice
+from contextlib      import suppress
+from threading       import Lock
+from pathlib         import Path
+from collections.abc import Iterator
 
 
 class Editor(TextArea, inherit_bindings=False):
@@ -29,8 +72,56 @@ class Editor(TextArea, inherit_bindings=False):
     newline: str = ''
     """character sequence marking line endings in the file"""
 
-    saved_as: list[list[Edit]] = None
-    """undo stack when file was last saved, empty when loaded"""
+    saved_at: int = 0
+    """generation of the edit history when the file was last saved"""
+
+    saving: float | None = None
+    """fraction of background save done so far, or `None` if not saving"""
+
+    saved_document: PieceTable | None = None
+    """snapshot of the document as it was when last saved or loaded"""
+
+    saved_format: tuple[str, str] | None = None
+    """encoding and line endings of the file on disk, if known exactly"""
+
+    saved_status: os.stat_result | None = None
+    """status of the file on disk when last saved or loaded"""
+
+    cursor_moving: bool = False
+    """whether a cursor move has yet to be reported"""
+
+    hex_view: bool = False
+    """whether to show files as hex dump, even if they contain text"""
+
+    view_only: bool = False
+    """whether files are only viewed, i.e. always read-only"""
+
+    follow: bool = False
+    """whether to show text appended to the file as it grows, like `tail -f`"""
+
+    tail: Tail | None = None
+    """reader of the text appended to the file, if following it"""
+
+    search: Search | None = None
+    """search whose matches are highlighted, if any"""
+
+    seeking: str = ''
+    """match to select once found: "first", "next", "previous", or none"""
+
+    search_text: str = ''
+    """regular expression last searched for"""
+
+    replacement: str = ''
+    """text matches were last replaced with"""
+
+    journaling: bool = False
+    """whether unsaved edits are written to a journal, for crash recovery"""
+
+    journal: Journal | None = None
+    """journal of the edits made since the file was last saved, if any"""
+
+    archive: Archive | None = None
+    """archive of the edit history from earlier sessions, if kept"""
 
     class FileLoaded(Message):
         """Message posted when a file was loaded"""
@@ -44,16 +135,39 @@ class Editor(TextArea, inherit_bindings=False):
     class CursorMoved(Message):
         """Message posted when cursor was moved"""
 
+        def __init__(self, cursor: tuple[int, int]):
+            super().__init__()
+            self.cursor = cursor
+            """location the cursor moved to"""
+
+    class SaveProgressed(Message):
+        """Message posted when saving in the background made progress"""
+
+        def __init__(self, saving: float | None):
+            super().__init__()
+            self.saving = saving
+            """fraction of the save done, or `None` once it ended"""
+
     BINDINGS = bindings.editor
 
+    COMPONENT_CLASSES = TextArea.COMPONENT_CLASSES | {'editor--search-match'}
+
     DEFAULT_CSS = """
         Editor {
             border:  round $border;
             padding: 0;
+            & > .editor--search-match {
+                background: $warning 40%;
+            }
         }
     """
 
-    def __init__(self, id: str = 'editor'):
+    def __init__(self,
+        id:        str  = 'editor',
+        hex_view:  bool = False,
+        view_only: bool = False,
+        follow:    bool = False,
+    ):
         super().__init__(
             id                = id,
             soft_wrap         = False,
@@ -62,10 +176,35 @@ class Editor(TextArea, inherit_bindings=False):
             max_checkpoints   = 1000,
             theme             = 'css',
         )
+        self.history = History(
+            max_checkpoints           = self.history.max_checkpoints,
+            checkpoint_timer          = self.history.checkpoint_timer,
+            checkpoint_max_characters = self.history.checkpoint_max_characters,
+        )
+        self.save_worker: Worker[None] | None = None
+        """worker thread that runs the latest save"""
+        self.save_lock = Lock()
+        """lock that keeps saves from overlapping"""
+        self.journal_worker: Worker[None] | None = None
+        """worker thread that writes the latest edits to the journal"""
+        self.highlighter: Highlighter | None = None
+        """syntax highlighter of the lines on screen, if document has syntax"""
+        self.hex_view = hex_view
+        self.view_only = view_only
+        self.follow = follow
 
     def on_mount(self):
         """Called when widget is ready to process messages."""
-        self.theme = config.query(('theme', 'syntax'))
+        with profiling.phase('apply syntax theme'):
+            self.theme = config.query(('theme', 'syntax'))
+        if self.follow:
+            self.set_interval(
+                config.query(('view', 'follow')), self.follow_file,
+            )
+        interval = config.query(('recovery', 'journal'))
+        if interval and not self.view_only:
+            self.journaling = True
+            self.set_interval(interval, self.write_journal)
 
     def watch_file(self, file: Path | None):
         """Loads file whenever the reactive `file` attribute changes."""
@@ -73,19 +212,85 @@ class Editor(TextArea, inherit_bindings=False):
         if file is None:
             return
 
-        language = infer_language(file)
-        if language in self.available_languages:
-            self.language = language
-        else:
-            self.language = None
+        self.discard_journal()
+        threshold = config.query(('limits', 'large_file')) * 2**20
+        highlight = config.query(('limits', 'highlighting')) * 2**20
+        with file.open('rb') as stream, profiling.phase('read file'):
+            with profiling.phase('detect encoding'):
+                sample   = stream.read(sample_size)
+                size     = os.fstat(stream.fileno()).st_size
+                encoding = detect_encoding(sample, final=(len(sample) == size))
+            binary = self.hex_view or is_binary(sample, encoding)
+            # When only viewing, memory-map any file, not just large ones:
+            # Lines are then decoded only when displayed, and jumping to the
+            # end of the file just counts the line breaks on the way.
+            mapped = (size > threshold or (self.view_only and size > 0))
+            large  = (mapped and is_ascii_compatible(encoding))
+            counts = None
+            if binary:
+                # Hex view: Memory-map the file and only format the rows that
+                # are displayed, so that opening it takes constant time.
+                lines = HexLines(stream)
+            elif large:
+                lines = MappedLines(stream, encoding)
+            else:
+                content  = load(stream, sample)
+                binary   = content.binary
+                encoding = content.encoding
+                counts   = content.counts
+                if binary:
+                    # NUL bytes turned up after the sample.
+                    lines = HexLines(stream)
+            self.tail = None
+            if self.follow and not binary:
+                # Continue reading where loading stopped. Mapped files may
+                # have grown since their size was checked.
+                offset = len(lines.mmap) if large else stream.tell()
+                self.tail = Tail(file, stream, offset, encoding)
+
+        if binary:
+            self.load_hex(file, lines)
+            return
 
-        encoding = detect_encoding(file)
         self.encoding = encoding
         self.post_message(self.EncodingDetected())
 
-        with file.open(encoding=self.encoding) as stream:
-            self.load_text(stream.read())
-            newlines = stream.newlines
+        if large:
+            # Large-file mode: Memory-map the file and only decode the lines
+            # that are displayed. Syntax highlighting would require parsing
+            # the entire file, so we don't even try. Matching brackets could
+            # mean scanning to the end of the file, so we skip that too.
+            self.set_reactive(Editor.language, None)
+            self.match_cursor_bracket = False
+            with profiling.phase('create document'):
+                lines.index_more()
+                newlines = lines.newlines
+                document = MappedDocument(
+                    lines, newlines if isinstance(newlines, str) else '\n'
+                )
+                self.load_document(document)
+            self.read_only = self.view_only or not document.indexed
+            if not document.indexed:
+                self.run_worker(
+                    self.index_document(document),
+                    group='indexing', exclusive=True,
+                )
+        else:
+            language = infer_language(file)
+            if language not in self.available_languages:
+                language = None
+            if size > highlight:
+                # Parsing is fast, but highlighting still adds up.
+                language = None
+            # Bypass the watcher, which would create the document once more.
+            self.set_reactive(Editor.language, language)
+            self.match_cursor_bracket = True
+            self.read_only = self.view_only
+            newlines = content.newlines
+            with profiling.phase('create document'):
+                self.load_document(
+                    *self.create_document(content.lines, '\n', language)
+                )
 
         mixed_newlines = False
         if newlines is None:
@@ -102,40 +307,561 @@ class Editor(TextArea, inherit_bindings=False):
 
         self.file = file
         self.post_message(self.FileLoaded())
-        self.saved_as = self.history.undo_stack.copy()
-        self.post_message(self.CursorMoved())
-
+        self.saved_at = self.history.generation
+        self.saved_document = self.document.snapshot()
+        self.saved_status = file.stat()
+        self.archive = None
+        if not self.view_only and config.query(('history', 'archive')):
+            # Not read until undoing reaches back to before this load.
+            self.archive = Archive(file, self.saved_status, threshold)
         if mixed_newlines:
+            self.saved_format = None
+        else:
+            self.saved_format = (self.encoding, self.newline)
+
+        if self.tail:
+            # Start out at the end, where appended text will show up.
+            self.action_cursor_file_end()
+
+        if not self.read_only:
+            self.start_journal()
+
+        if mixed_newlines and not self.view_only:
+            # Only matters when saving, which viewing never does.
+            found = ''
+            if counts:
+                found = ', '.join(
+                    f'{count:,} {name}'
+                    for (newline, name) in (
+                        ('\n', 'LF'), ('\r\n', 'CRLF'), ('\r', 'CR'),
+                    )
+                    if (count := counts[newline])
+                )
+                found = f' ({found})'
             dialog = dialogs.MessageBox(
-                'This file contains mixed line endings. The default line '
-                'endings for this operating system will be used once you '
+                f'This file contains mixed line endings{found}. The default '
+                'line endings for this operating system will be used once you '
                 'change and save the file. Or click on the line endings '
                 'indicator in the status bar below to change them.',
                 title='Warning',
             )
             self.app.push_screen(dialog)
 
-    def on_key(self, _event: Key):
-        """Posts message that cursor moved on every key press."""
-        self.post_message(self.CursorMoved())
+    def load_hex(self, file: Path, lines: HexLines):
+        """Shows a hex dump of the `lines` of a binary `file`, read-only."""
+        self.set_reactive(Editor.language, None)
+        self.match_cursor_bracket = False
+        with profiling.phase('create document'):
+            self.load_document(HexDocument(lines, '\n'))
+        self.read_only = True
+        self.encoding = ''
+        self.post_message(self.EncodingDetected())
+        self.newline = ''
+        self.post_message(self.NewlineDetected())
+        self.file = file
+        self.post_message(self.FileLoaded())
+        self.saved_at = self.history.generation
+        self.saved_document = None
+        self.saved_status = file.stat()
+        self.archive = None
+        self.refresh_bindings()
 
-    def on_mouse_up(self, _event: MouseDown):
-        """Posts message that cursor moved when a mouse button was released."""
-        self.post_message(self.CursorMoved())
+    def _set_document(self, text: str, language: str | None):
+        """
+        Creates the document from `text`, syntax-aware if `language` given.
+
+        Overrides the method of the base class, which Textual calls whenever
+        the text is loaded or the language changes, so that our piece-table
+        documents are used instead of Textual's default.
+        """
+        lines = split_lines(text)
+        self.set_document(
+            *self.create_document(lines, _detect_newline_style(text), language)
+        )
+
+    def create_document(
+        self,
+        lines:    list[str],
+        newline:  str,
+        language: str | None,
+    ) -> tuple[PieceTable, Query | None]:
+        """Creates a document from `lines`, and the highlight query if any."""
+        ts_language = get_language(language) if language else None
+        if ts_language is None:
+            return (PieceTable(lines, newline), None)
+        document = SyntaxAwarePieceTable(lines, newline, ts_language)
+        query    = self._get_builtin_highlight_query(language)
+        return (document, document.prepare_query(query))
+
+    def set_document(self, document: DocumentBase, query: Query = None):
+        """
+        Sets the `document` being edited, along with its highlight `query`.
+
+        Does the same as the base class's `_set_document()`, except that it
+        takes the document, instead of creating one from text.
+        """
+        self._highlight_query = query
+        self.document = document
+        self.wrapped_document = LazyWrappedDocument(
+            document, tab_width=self.indent_width
+        )
+        self.navigator = DocumentNavigator(self.wrapped_document)
+        if query:
+            self.highlighter = Highlighter(document, query, self._highlights)
+        else:
+            self.highlighter = None
+            self._highlights.clear()
+        self.search  = None
+        self.seeking = ''
+        self._build_highlight_map()
+        self.move_cursor((0, 0))
+        self._rewrap_and_refresh_virtual_size()
+
+    def load_document(self, document: DocumentBase, query: Query = None):
+        """Loads a `document`, same as `load_text()` does with text."""
+        self.history.clear()
+        self.set_document(document, query)
+        self.post_message(self.Changed(self).set_sender(self))
+        self.update_suggestion()
+
+    async def index_document(self, document: MappedDocument):
+        """Indexes a large file bit by bit so that the app stays responsive."""
+        while not document.indexed:
+            await asyncio.sleep(0)
+            if document is not self.document:
+                return
+            document.index_more()
+            self._refresh_size()
+        # The document could not be edited while indexing, so it still is as
+        # loaded. But now with all lines.
+        self.saved_document = document.snapshot()
+        self.read_only = self.view_only
+        self.refresh_bindings()
+        if not self.read_only:
+            self.start_journal()
+
+    def follow_file(self):
+        """Shows text appended to the file, or reloads it if replaced."""
+        if self.tail is None or self.file is None:
+            return
+        text = self.tail.read()
+        if text is None:
+            # Truncated or rotated: Start over with what's in the file now.
+            self.watch_file(self.file)
+        elif text:
+            at_end = (self.cursor_location == self.document.end)
+            self.append(text, scroll=at_end)
+
+    def append(self, text: str, scroll: bool = False):
+        """
+        Appends `text` to the end of the document, bypassing the edit history.
+
+        Only the appended lines are wrapped and invalidated, so the cost does
+        not depend on the size of the document. If `scroll` is set, the cursor
+        moves to the new end of the document, and the view along with it.
+        """
+        end = self.document.end
+        result = self.document.replace_range(end, end, text)
+        self.wrapped_document.wrap_range(end, end, result.end_location)
+        self._build_highlight_map()
+        self._refresh_size()
+        # The appended text is not an edit: It's on disk already.
+        self.saved_document = self.document.snapshot()
+        self.saved_status = self.file.stat()
+        if scroll:
+            self.move_cursor(result.end_location)
+
+    def edit(self, edit: Edit) -> EditResult:
+        """Performs an `edit`, recording it in the journal."""
+        result = super().edit(edit)
+        if self.journal:
+            self.journal.record(edit.top, edit.bottom, edit.text)
+        return result
+
+    def _undo_batch(self, edits: list[Edit]):
+        """Undoes a batch of `edits`, recording that in the journal."""
+        super()._undo_batch(edits)
+        if self.journal and edits:
+            for edit in reversed(edits):
+                result = edit._edit_result
+                self.journal.record(
+                    edit.top, result.end_location, result.replaced_text,
+                )
+
+    def _redo_batch(self, edits: list[Edit]):
+        """Redoes a batch of `edits`, recording that in the journal."""
+        super()._redo_batch(edits)
+        if self.journal:
+            for edit in edits:
+                self.journal.record(edit.top, edit.bottom, edit.text)
+
+    def start_journal(self):
+        """
+        Starts journaling edits to the file that was just loaded.
+
+        If the journal holds edits from an earlier session, which must have
+        ended before the file was saved, offers to restore them. Either way,
+        the new journal then replaces the old one on the first edit.
+        """
+        if not self.journaling:
+            return
+        self.journal = Journal(self.file, self.saved_status)
+        if edits := self.journal.read():
+            dialog = dialogs.ClickResponse(
+                'This file has unsaved changes from a session that ended '
+                'unexpectedly. Restore them?',
+                buttons  = ('Restore', 'Discard'),
+                variants = ('primary', 'warning'),
+            )
+            self.app.push_screen(dialog, partial(self.restore_edits, edits))
+
+    def restore_edits(
+        self,
+        edits:  list[Replacement],
+        answer: str | None,
+    ):
+        """Replays journaled `edits` if the user wants them restored."""
+        if answer != 'Restore':
+            return
+        # Restored edits can be undone in one go.
+        with self.history.batch():
+            for (start, end, text) in edits:
+                self.edit(Edit(text, start, end, False))
+
+    def write_journal(self):
+        """
+        Writes the edits recorded since the last call to the journal.
+
+        Called periodically. The file is written in a worker thread, so
+        typing is not held up by it. If the previous write is still running,
+        the edits are left for the next call. After the file was saved, or
+        once the journal has grown large, it is rewritten from scratch as
+        the difference between the saved and the current document.
+        """
+        journal = self.journal
+        if journal is None:
+            return
+        if self.journal_worker and self.journal_worker.is_running:
+            return
+        if journal.rebase or journal.size > journal.limit:
+            journal.rebase = False
+            journal.pending.clear()
+            task = partial(
+                journal.rewrite,
+                self.saved_status, self.saved_document,
+                self.document.snapshot(),
+            )
+        elif journal.pending:
+            task = partial(journal.append, journal.take())
+        else:
+            return
+        self.journal_worker = self.run_worker(
+            task, group='journal', thread=True,
+        )
+
+    def discard_journal(self):
+        """Removes the journal, as the unsaved edits are not wanted."""
+        if self.journal:
+            self.journal.discard()
+            self.journal = None
+
+    def undo(self):
+        """
+        Undoes the latest batch of edits.
+
+        Once all edits made since loading the file are undone, pages in the
+        next batches from the archived edit history, if any.
+        """
+        history = self.history
+        if not history._undo_stack and self.archive and not history.truncated:
+            history.prepend(self.archive.pop())
+        super().undo()
+
+    def _build_highlight_map(self):
+        """
+        Invalidates the highlights affected by edits.
+
+        Overrides the method of the base class, which Textual calls after
+        every edit. Instead of querying the entire syntax tree again, we let
+        the highlighter discard what has changed, and only highlight lines
+        once they are rendered, see `render_lines()`.
+        """
+        self._line_cache.clear()
+        if self.highlighter:
+            self.highlighter.invalidate()
+        if isinstance(self.document, PieceTable):
+            edits = self.document.edited_rows
+            if self.search:
+                self.search.update(edits)
+            edits.clear()
+
+    def render_lines(self, crop: Region) -> list[Strip]:
+        """Renders lines of the widget, laying out the ones on screen."""
+        (_, scroll_y) = self.scroll_offset
+        top     = scroll_y + crop.y
+        bottom  = scroll_y + crop.bottom - 1
+        wrapped = self.wrapped_document
+        if isinstance(wrapped, LazyWrappedDocument):
+            wrapped.lay_out(top, bottom)
+            if wrapped.resized:
+                # Lines turned out to wrap differently than estimated.
+                wrapped.resized = False
+                self._refresh_size()
+        if self.highlighter:
+            (first, _) = wrapped.offset_to_location(Offset(0, top))
+            (last,  _) = wrapped.offset_to_location(Offset(0, bottom))
+            self.highlighter.update(first, last)
+        return super().render_lines(crop)
+
+    def get_line(self, line_index: int) -> Text:
+        """Returns a line for display, with search matches highlighted."""
+        line = super().get_line(line_index)
+        if self.search:
+            style = self.get_component_rich_style('editor--search-match')
+            for (start, end) in self.search.spans(line_index):
+                line.stylize(style, start, end)
+        return line
+
+    def render_line(self, y: int) -> Strip:
+        """
+        Renders a single line of the widget.
+
+        Replaces the method of the base class, minus its code for displaying
+        a placeholder, which we don't use. That code evaluates `self.text`,
+        i.e. it joins all lines of the document into one string, for every
+        line that is rendered. For large files that is prohibitively slow.
+        """
+        (scroll_x, scroll_y) = self.scroll_offset
+        absolute_y = scroll_y + y
+        selection  = self.selection
+        (_, cursor_y) = self._cursor_offset
+        blinking   = self._cursor_visible and self.cursor_blink
+        cache_key = (
+            self.size,
+            scroll_x,
+            absolute_y,
+            (
+                selection
+                if selection.contains_line(absolute_y) or self.soft_wrap
+                else selection.end[0] == absolute_y
+            ),
+            selection.end if blinking and absolute_y == cursor_y else None,
+            self.theme,
+            self._matching_bracket_location,
+            self.match_cursor_bracket,
+            self.soft_wrap,
+            self.show_line_numbers,
+            self.read_only,
+            self.show_cursor,
+            self.suggestion,
+        )
+        if (cached_line := self._line_cache.get(cache_key)) is not None:
+            return cached_line
+        line = self._render_line(y)
+        self._line_cache[cache_key] = line
+        return line
+
+    def watch_selection(self):
+        """
+        Schedules a cursor-moved message whenever the selection is set.
+
+        The selection is set on every cursor move, whether caused by the
+        user or by the program. When keys auto-repeat or text is pasted,
+        that happens many times in quick succession. So the message is only
+        posted once the screen has been refreshed, i.e. at most once per
+        frame, and reports wherever the cursor ended up.
+        """
+        if self.cursor_moving:
+            return
+        self.cursor_moving = True
+        self.call_after_refresh(self.cursor_moved)
+
+    def cursor_moved(self):
+        """Posts the message that the cursor moved."""
+        self.cursor_moving = False
+        self.post_message(self.CursorMoved(self.cursor_location))
 
     def on_text_area_changed(self):
         """Makes sure the "Save" action is correctly grayed out or not."""
         self.refresh_bindings()
 
     def action_save(self):
-        """Saves the file to disk."""
+        """
+        Saves the file to disk.
+
+        The file is written in a worker thread, so that the user interface
+        stays responsive even when saving takes a while. The worker saves a
+        snapshot of the document, so editing may continue in the meantime.
+        A new save supersedes one that is still running.
+
+        If only lines towards the end of the file changed since it was last
+        saved, only those are written, see `save_snapshot()`.
+        """
         if not self.file:
             return
-        self.file.write_text(
-            self.text, encoding=self.encoding, newline=self.newline
+        document = self.document.snapshot()
+        batches  = []
+        if self.archive:
+            batches = [list(batch) for batch in self.history.undo_stack]
+        self.saving = 0
+        self.post_message(self.SaveProgressed(self.saving))
+        self.save_worker = self.run_worker(
+            partial(
+                self.save_snapshot,
+                document, self.file, self.encoding, self.newline,
+                self.history.generation, self.unchanged_lines(document),
+                self.archive, batches, not self.history.truncated,
+            ),
+            group     = 'saving',
+            thread    = True,
+            exclusive = True,
         )
-        self.saved_as = self.history.undo_stack.copy()
+
+    def unchanged_lines(self, document: PieceTable) -> int:
+        """
+        Returns the number of leading lines unchanged since the last save.
+
+        Returns zero if the file has to be written in full, for example
+        because text encoding or line endings were changed.
+        """
+        if self.saved_document is None:
+            return 0
+        if (self.encoding, self.newline) != self.saved_format:
+            return 0
+        unchanged = document.common_prefix(self.saved_document)
+        # The last line has no line break after it, so can't be kept as is.
+        return min(unchanged, document.line_count - 1)
+
+    def save_snapshot(
+        self,
+        document:   PieceTable,
+        file:       Path,
+        encoding:   str,
+        newline:    str,
+        generation: int,
+        unchanged:  int,
+        archive:    Archive | None,
+        batches:    list[Batch],
+        complete:   bool,
+    ):
+        """
+        Saves a snapshot of the document. Runs in a worker thread.
+
+        If some number of lines at the start are `unchanged`, only the lines
+        after them are written, overwriting the end of the file in place.
+        That is, unless the file was modified on disk in the meantime, or
+        memory-mapped and about to be truncated. Otherwise the entire file
+        is replaced atomically.
+
+        If an `archive` is given, the `batches` of edits on the undo stack
+        are archived along with the file, see `Archive.store()`, which also
+        explains what `complete` means. A failure to do so is not reported,
+        as the file itself was saved.
+        """
+        worker = get_current_worker()
+        with self.save_lock:
+            if worker.is_cancelled:
+                return
+            if archive:
+                # Before the file as loaded is overwritten.
+                archive.open()
+            try:
+                status = file.stat()
+                if not same_status(status, self.saved_status):
+                    unchanged = 0
+                if unchanged:
+                    offset = document.line_offset(unchanged, encoding, newline)
+                    if isinstance(document, MappedDocument):
+                        mapped = document.original
+                        if (status.st_dev, status.st_ino) != mapped.inode:
+                            # Lines were measured in the mapped file.
+                            unchanged = 0
+                        elif offset < len(mapped.mmap):
+                            # Truncating the mapped file could crash us.
+                            unchanged = 0
+                lines = self.report_progress(document, worker, unchanged)
+                release = None
+                if isinstance(document, MappedDocument):
+                    # Windows won't replace the file while it is mapped.
+                    release = partial(
+                        self.app.call_from_thread, document.original.detach,
+                    )
+                if unchanged:
+                    save_tail(file, offset, lines, encoding, newline)
+                else:
+                    save_lines(file, lines, encoding, newline, release)
+                status = file.stat()
+            except (OSError, UnicodeError) as error:
+                self.app.call_from_thread(self.save_failed, error)
+                return
+            self.app.call_from_thread(
+                self.save_finished,
+                generation, document, (encoding, newline), status,
+            )
+            if archive:
+                with suppress(OSError):
+                    archive.store(status, batches, complete)
+
+    def report_progress(
+        self,
+        document: PieceTable,
+        worker:   Worker[None],
+        first:    int = 0,
+    ) -> Iterator[str]:
+        """Yields the document's lines from `first` on, reporting progress."""
+        total = document.line_count - first
+        lines = document.iter_lines(first)
+        for (index, line) in enumerate(lines):
+            if index % 10_000 == 0:
+                if worker.is_cancelled:
+                    # Abort the save, so that the newer one takes over. It
+                    # will notice if this one had already touched the file.
+                    raise WorkerCancelled('Superseded by newer save.')
+                progress = round(index / total, 2)
+                if progress != self.saving:
+                    self.saving = progress
+                    self.post_message(self.SaveProgressed(self.saving))
+            yield line
+
+    def save_finished(
+        self,
+        generation: int,
+        document:   PieceTable,
+        saved_as:   tuple[str, str],
+        status:     os.stat_result,
+    ):
+        """Called when the `document` of the given `generation` was saved."""
+        self.saved_at       = generation
+        self.saved_document = document
+        self.saved_format   = saved_as
+        self.saved_status   = status
+        self.saving = None
+        self.post_message(self.SaveProgressed(self.saving))
         self.refresh_bindings()
+        if self.journaling and self.journal is None:
+            # Saved under a new name.
+            self.journal = Journal(self.file, status)
+        if self.journal:
+            # The edits saved no longer need to be recovered.
+            self.journal.rebase = True
+
+    def save_failed(self, error: Exception):
+        """Called when saving the file failed."""
+        self.saving = None
+        self.post_message(self.SaveProgressed(self.saving))
+        self.app.push_screen(
+            dialogs.MessageBox(
+                f'Could not save file.\n{error}',
+                title='Error',
+            )
+        )
+
+    async def wait_for_save(self):
+        """Waits until the save running in the background, if any, is done."""
+        if self.save_worker is None:
+            return
+        with suppress(WorkerCancelled, WorkerFailed):
+            await self.save_worker.wait()
 
     def action_save_as(self):
         """Asks the user for a new name to save the file as."""
@@ -178,49 +904,287 @@ class Editor(TextArea, inherit_bindings=False):
 
     def save_as_execute(self, file: Path):
         """Saves the currently edited file as the new `file`."""
+        self.discard_journal()
+        if self.archive:
+            # Start a new history, which goes back to the file as loaded.
+            limit = config.query(('limits', 'large_file')) * 2**20
+            self.archive = Archive(file, None, limit)
         self.set_reactive(Editor.file, file)
         self.post_message(self.FileLoaded())
         self.action_save()
 
+    def action_find(self):
+        """Asks the user for a regular expression to search for."""
+        dialog = dialogs.TextInput('Find:', self.search_initial())
+        self.app.push_screen(dialog, self.find_entered)
+
+    def search_initial(self) -> str:
+        """Returns the text to search for that dialogs start out with."""
+        (start, end) = self.selection
+        if start != end and start[0] == end[0]:
+            return re.escape(self.selected_text)
+        return self.search_text
+
+    def find_entered(self, answer: str | None):
+        """Called when the user entered the expression to search for."""
+        if answer is None:
+            return
+        self.search_text = answer
+        if not answer:
+            # Searching for nothing ends the search.
+            self.search = None
+            self._line_cache.clear()
+            self.refresh()
+            return
+        if (pattern := self.compile_pattern(answer)) is None:
+            return
+        if isinstance(self.document, MappedDocument):
+            self.document.index_all()
+            self._refresh_size()
+        self.search  = Search(self.document, pattern)
+        self.seeking = 'first'
+        self._line_cache.clear()
+        self.refresh()
+        self.run_worker(
+            self.search_document(self.search), group='search', exclusive=True,
+        )
+
+    def compile_pattern(self, text: str) -> re.Pattern[str] | None:
+        """Compiles a regular expression, reporting it if it is invalid."""
+        try:
+            return re.compile(text)
+        except re.error as error:
+            dialog = dialogs.MessageBox(
+                f'Invalid regular expression: {error}.', title='Error',
+            )
+            self.app.push_screen(dialog)
+            return None
+
+    async def search_document(self, search: Search):
+        """Searches the document in chunks so that the app stays responsive."""
+        while not search.done:
+            await asyncio.sleep(0)
+            if search is not self.search:
+                return
+            if search.scan():
+                self._line_cache.clear()
+                self.refresh()
+            if self.seeking:
+                self.seek_match()
+        if self.seeking:
+            self.seek_match()
+        count = len(search.matches)
+        if count:
+            noun = 'match' if count == 1 else 'matches'
+            self.notify(f'Found {count:,} {noun}.')
+        else:
+            self.notify('No matches found.')
+
+    def action_find_next(self):
+        """Selects the next match of the search."""
+        self.find_again('next')
+
+    def action_find_previous(self):
+        """Selects the previous match of the search."""
+        self.find_again('previous')
+
+    def find_again(self, direction: str):
+        """Selects the match in the given `direction`, once it is found."""
+        if self.search is None:
+            self.action_find()
+            return
+        self.seeking = direction
+        self.seek_match()
+
+    def seek_match(self):
+        """
+        Selects the match sought, if the search got far enough to tell.
+
+        The first match is the one at or after the cursor, the next one is
+        after the selected match. Searches continue from the top once they
+        reach the end of the document, and the other way around.
+        """
+        search = self.search
+        if search is None:
+            self.seeking = ''
+            return
+        cursor  = self.selection.start
+        matches = search.matches
+        match: tuple[int, int, int] | None
+        match self.seeking:
+            case 'previous':
+                if not (search.done or search.scanned > cursor[0]):
+                    return
+                match = search.preceding(cursor)
+                if match is None and search.done and matches:
+                    match = matches[-1]
+            case _:
+                inclusive = (self.seeking == 'first')
+                match = search.following(cursor, inclusive)
+                if match is None and search.done and matches:
+                    match = matches[0]
+        if match is None and not search.done:
+            return
+        self.seeking = ''
+        if match is None:
+            return
+        (row, start, end) = match
+        self.selection = Selection((row, start), (row, end))
+        self.scroll_cursor_visible(center=True)
+
+    def action_replace_all(self):
+        """Asks the user for a regular expression to replace all matches of."""
+        dialog = dialogs.TextInput('Replace:', self.search_initial())
+        self.app.push_screen(dialog, self.replace_entered)
+
+    def replace_entered(self, answer: str | None):
+        """Called when the user entered the expression to replace."""
+        if not answer:
+            return
+        if (pattern := self.compile_pattern(answer)) is None:
+            return
+        self.search_text = answer
+        dialog = dialogs.TextInput('With:', self.replacement)
+        self.app.push_screen(dialog, partial(self.replace_all, pattern))
+
+    def replace_all(self, pattern: re.Pattern[str], replacement: str | None):
+        """
+        Replaces all matches of the `pattern` with the `replacement`.
+
+        The `replacement` may refer to groups of the pattern, as in `re.sub()`.
+        The matches are those of the search for the pattern, which becomes
+        the current search if it isn't already, and is continued in the
+        background, see `replace_matches()`.
+        """
+        if replacement is None:
+            return
+        self.replacement = replacement
+        search = self.search
+        if search is None or search.pattern != pattern:
+            if isinstance(self.document, MappedDocument):
+                self.document.index_all()
+                self._refresh_size()
+            search = Search(self.document, pattern)
+            self.search  = search
+            self.seeking = ''
+            self._line_cache.clear()
+            self.refresh()
+        self.run_worker(
+            self.replace_matches(search, replacement),
+            group='search', exclusive=True,
+        )
+
+    async def replace_matches(self, search: Search, replacement: str):
+        """
+        Searches the rest of the document, then replaces all matches.
+
+        The document is searched in chunks, same as by `search_document()`,
+        so that the app stays responsive. The lines from the first match to
+        the last are then replaced in a single edit, which is undone in one
+        step.
+        """
+        while not search.done:
+            await asyncio.sleep(0)
+            if search is not self.search:
+                return
+            if search.scan():
+                self._line_cache.clear()
+                self.refresh()
+        matches = search.matches
+        count   = len(matches)
+        if not count:
+            self.notify('No matches found.')
+            return
+        first   = matches[0][0]
+        last    = matches[-1][0]
+        rows    = {row for (row, _, _) in matches}
+        pattern = search.pattern
+        literal = ('\\' not in replacement)
+
+        def substitute(match: re.Match[str]) -> str:
+            # Leave empty matches alone, as the search ignores them too.
+            if match.end() == match.start():
+                return ''
+            if literal:
+                # Expanding the template would parse it for every match.
+                return replacement
+            return match.expand(replacement)
+
+        original = self.document.iter_lines(first)
+        lines    = list(islice(original, last - first + 1))
+        try:
+            text = '\n'.join(
+                pattern.sub(substitute, line) if row in rows else line
+                for (row, line) in enumerate(lines, first)
+            )
+        except (re.error, IndexError) as error:
+            dialog = dialogs.MessageBox(
+                f'Invalid replacement: {error}.', title='Error',
+            )
+            self.app.push_screen(dialog)
+            return
+        self.history.checkpoint()
+        self.replace(text, (first, 0), (last, len(lines[-1])))
+        self.history.checkpoint()
+        self.refresh_bindings()
+        noun = 'match' if count == 1 else 'matches'
+        self.notify(f'Replaced {count:,} {noun}.')
+
     def action_trim_whitespace(self):
-        """Trims trailing white-space characters."""
-        changed = False
-
-        trims = 0
-        for n in range(self.document.line_count):
-            line = self.document.get_line(n)
-            trimmed = line.rstrip(' \t')
-            if trimmed != line:
-                self.delete(start=(n, len(trimmed)), end=(n, len(line)))
-                trims += 1
-        if trims > 0:
+        """
+        Trims trailing white-space characters.
+
+        Also makes sure the file ends in exactly one line break, i.e. the
+        document with one empty line. All changes are made in a single edit,
+        which is undone in one step. The selection is kept, as far as it is
+        still within the document.
+        """
+        document  = self.document
+        selection = self.selection
+        original  = list(document.iter_lines())
+        lines     = [line.rstrip(' \t') for line in original]
+        changed   = [
+            n for (n, line) in enumerate(original)
+            if len(line) != len(lines[n])
+        ]
+        trims = len(changed)
+
+        end = len(lines) - 1
+        appended = (lines[end] != '')
+        if appended:
+            lines.append('')
+        keep = len(lines) - 1
+        while keep > 0 and lines[keep - 1] == '':
+            keep -= 1
+        deleted = len(lines) - 1 - keep
+        del lines[keep:-1]
+
+        if appended or deleted:
+            tail  = min(keep, end)
+            first = min(changed[0], tail) if changed else tail
+            last  = end
+            text  = '\n'.join(lines[first:])
+        elif trims:
+            (first, last) = (changed[0], changed[-1])
+            text = '\n'.join(lines[first:last+1])
+        else:
+            self.notify('No trailing white-space to trim.')
+            return
+
+        self.history.checkpoint()
+        self.replace(text, (first, 0), (last, len(original[last])))
+        self.history.checkpoint()
+        self.selection = selection
+        self.refresh_bindings()
+
+        if trims:
             noun = 'line' if trims == 1 else 'lines'
             self.notify(f'Trimmed trailing white-space on {trims} {noun}.')
-            changed = True
-
-        n = self.document.line_count - 1
-        last_line = self.document.get_line(n)
-        if last_line != '':
-            self.insert('\n', location=(n, len(last_line)))
+        if appended:
             self.notify('Appended a blank line.')
-            changed = True
-
-        n = self.document.line_count - 2
-        m = n
-        while self.document.get_line(m) == '' and m >= 0:
-            m -= 1
-        if (m != n):
-            self.delete(start=(m+1, 0), end=(n+1, 0))
-            noun = 'line' if n - m == 1 else 'lines'
-            self.notify(f'Deleted {n - m} trailing blank {noun}.')
-            changed = True
-
-        if not changed:
-            self.notify('No trailing white-space to trim.')
-        else:
-            self.move_cursor(self.cursor_location)
-            self.post_message(self.CursorMoved())
-            self.refresh_bindings()
+        if deleted:
+            noun = 'line' if deleted == 1 else 'lines'
+            self.notify(f'Deleted {deleted} trailing blank {noun}.')
 
     def action_toggle_wrapping(self):
         """Toggles soft-wrapping of lines."""
@@ -228,18 +1192,36 @@ class Editor(TextArea, inherit_bindings=False):
 
     def action_change_encoding(self):
         """Lets the user change the text encoding of the file."""
-        options  = ('UTF-8', 'UTF-8-BOM')
+        options  = (
+            'UTF-8', 'UTF-8-BOM', 'UTF-16', 'UTF-32',
+            'Latin-1', 'Windows-1252',
+        )
         tooltips = (
             'UTF-8 Unicode encoding',
             'UTF-8 encoding with byte-order mark',
+            'UTF-16 Unicode encoding with byte-order mark',
+            'UTF-32 Unicode encoding with byte-order mark',
+            'ISO 8859-1 encoding for Western European languages',
+            'Windows code page 1252 for Western European languages',
         )
         match self.encoding:
             case 'utf-8':
                 initial = options[0]
             case 'utf-8-sig':
                 initial = options[1]
+            case 'utf-16':
+                initial = options[2]
+            case 'utf-32':
+                initial = options[3]
+            case 'iso8859-1':
+                initial = options[4]
+            case 'cp1252':
+                initial = options[5]
             case _:
-                raise ValueError(f'Unexpected encoding: {self.encoding}')
+                # Some other encoding declared in the file. Offer to keep it.
+                initial  = self.encoding
+                options  = (*options, initial)
+                tooltips = (*tooltips, 'Encoding declared in the file')
         dialog = dialogs.SelectOption(
             options, initial, tooltips,
             accept_text    = 'Save',
@@ -255,8 +1237,18 @@ class Editor(TextArea, inherit_bindings=False):
                 new_encoding = 'utf-8'
             case 'UTF-8-BOM':
                 new_encoding = 'utf-8-sig'
+            case 'UTF-16':
+                new_encoding = 'utf-16'
+            case 'UTF-32':
+                new_encoding = 'utf-32'
+            case 'Latin-1':
+                new_encoding = 'iso8859-1'
+            case 'Windows-1252':
+                new_encoding = 'cp1252'
             case None:
                 return
+            case self.encoding:
+                new_encoding = self.encoding
             case _:
                 raise ValueError(f'Unexpected encoding: {encoding}')
         self.encoding = new_encoding
@@ -305,37 +1297,74 @@ class Editor(TextArea, inherit_bindings=False):
     def action_cursor_file_start(self):
         """Moves cursor to start of file."""
         self.move_cursor((0, 0))
-        self.post_message(self.CursorMoved())
 
     def action_cursor_file_end(self):
         """Moves cursor to end of file."""
+        if isinstance(self.document, MappedDocument):
+            self.document.index_all()
+            self._refresh_size()
         y = self.document.line_count - 1
         x = len(self.document.get_line(y))
         self.move_cursor((y, x))
-        self.post_message(self.CursorMoved())
+
+    def action_goto_line(self):
+        """Asks the user for the number of the line to move the cursor to."""
+        (row, _) = self.cursor_location
+        dialog = dialogs.TextInput('Go to line:', str(row + 1))
+        self.app.push_screen(dialog, self.goto_line_entered)
+
+    def goto_line_entered(self, answer: str | None):
+        """Called when the user entered the line number to go to."""
+        if not answer:
+            return
+        try:
+            number = int(answer.strip().replace(',', '').replace('_', ''))
+        except ValueError:
+            dialog = dialogs.MessageBox(
+                f'"{answer}" is not a line number.', title='Error',
+            )
+            self.app.push_screen(dialog)
+            return
+        self.goto_line(number)
+
+    def goto_line(self, number: int):
+        """
+        Moves the cursor to the start of the line with the given `number`.
+
+        Lines are numbered from 1, as in the status bar. Negative numbers
+        count from the end of the document, so -1 is the last line. Both
+        the line and its position on screen are looked up in logarithmic
+        time, also when wrapping, so this is fast no matter how far away
+        the line is.
+        """
+        document = self.document
+        if isinstance(document, MappedDocument):
+            if number < 0:
+                document.index_all()
+            else:
+                document.index_until(number - 1)
+            self._refresh_size()
+        count = document.line_count
+        row = number - 1 if number > 0 else count + number
+        row = min(max(row, 0), count - 1)
+        self.move_cursor((row, 0), center=True)
 
     def check_action(self, action: str, _: tuple[object, ...]) -> bool | None:
         """Marks actions as currently available or not."""
         if action == 'save' and self.file and not self.modified:
             return None
+        editing = (
+            'save_as', 'trim_whitespace', 'change_encoding', 'change_newline',
+            'replace_all',
+        )
+        if self.read_only and action in editing:
+            return None
         return True
 
     @property
     def modified(self):
         """Indicates whether the file has been modified since it was saved."""
-        return (self.history.undo_stack != self.saved_as)
-
-
-def detect_encoding(file: Path) -> str:
-    """
-    Detects the text encoding of the given file.
-
-    Uses the `tokenize` module from the Python standard library under the hood,
-    and is thus limited to the same few encodings.
-    """
-    with file.open('rb') as stream:
-        (encoding, _line) = tokenize.detect_encoding(stream.readline)
-    return encoding
+        return (self.history.generation != self.saved_at)
 
 
 def infer_language(file: Path) -> str:
@@ -0,0 +1,179 @@
+﻿"""Safe writing of files to disk"""
+
+import os
+import codecs
+import secrets
+from pathlib         import Path
+from contextlib      import suppress
+from itertools       import islice
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+
+
+chunk_size = 1 << 12
+"""number of lines to join before encoding and writing them"""
+
+
+def save_lines(
+    file:     Path,
+    lines:    Iterable[str],
+    encoding: str,
+    newline:  str,
+    release:  Callable[[], object] | None = None,
+):
+    """
+    Saves the `lines` of a text document to the given `file`.
+
+    Lines are joined by the `newline` separator and written in encoded
+    chunks, so memory use does not depend on the size of the document.
+    The file is replaced atomically, see `write_atomic()`, which also
+    explains what `release` is for.
+    """
+    write_atomic(file, encode_lines(lines, encoding, newline), release)
+
+
+def save_tail(
+    file:     Path,
+    offset:   int,
+    lines:    Iterable[str],
+    encoding: str,
+    newline:  str,
+):
+    """
+    Overwrites the `file` from byte `offset` on with the given `lines`.
+
+    The bytes before the `offset` are kept as they are, i.e. the first of
+    the `lines` must start there. The file is truncated after the last line.
+    This is much faster than `save_lines()` when only the end of a large
+    file changed, but it is not atomic: if interrupted, the file ends up
+    with part of the new lines written.
+    """
+    with file.open('r+b') as stream:
+        stream.seek(offset)
+        for chunk in encode_lines(lines, encoding, newline, continued=True):
+            stream.write(chunk)
+        stream.truncate()
+        stream.flush()
+        os.fsync(stream.fileno())
+
+
+def encode_lines(
+    lines:     Iterable[str],
+    encoding:  str,
+    newline:   str,
+    continued: bool = False,
+) -> Iterator[bytes]:
+    """
+    Yields the encoded text of the `lines` in chunks of limited size.
+
+    If the text is `continued`, i.e. appended to existing text, a byte-order
+    mark, if the encoding has one, is left out.
+    """
+    encoder = codecs.getincrementalencoder(encoding)()
+    if continued:
+        encoder.encode('')
+    lines   = iter(lines)
+    prefix  = ''
+    while chunk := list(islice(lines, chunk_size)):
+        yield encoder.encode(prefix + newline.join(chunk))
+        prefix = newline
+    # Finalize. Without any lines, this is where the byte-order mark, if the
+    # encoding has one, gets written.
+    yield encoder.encode('', final=True)
+
+
+def write_atomic(
+    file:    Path,
+    chunks:  Iterable[bytes],
+    release: Callable[[], object] | None = None,
+):
+    """
+    Writes the byte `chunks` to the `file`, replacing it atomically.
+
+    The data is written to a temporary file in the same folder and flushed
+    to disk. Only then is the temporary file renamed to the target, which
+    replaces it in one step. So if anything goes wrong along the way, the
+    original file is left untouched. File permissions and, if possible,
+    ownership of an existing file are carried over to the new one.
+
+    If the `file` is a symbolic link, the file it points to is replaced.
+
+    If replacing the file is not permitted, `release` is called, if given,
+    and replacing it tried once more. On Windows, that is the case while
+    the file is memory-mapped, so the caller gets to unmap it first.
+    """
+    file = file.resolve()
+    try:
+        status = file.stat()
+    except FileNotFoundError:
+        status = None
+    (temp, descriptor) = create_temp(file)
+    try:
+        with os.fdopen(descriptor, 'wb') as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+            stream.flush()
+            if status:
+                copy_permissions(stream.fileno(), status)
+            os.fsync(stream.fileno())
+        try:
+            temp.replace(file)
+        except PermissionError:
+            if release is None:
+                raise
+            release()
+            temp.replace(file)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    sync_folder(file.parent)
+
+
+def create_temp(file: Path) -> tuple[Path, int]:
+    """Creates a temporary sibling of the `file` and opens it for writing."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    while True:
+        temp = file.with_name(f'.{file.name}.{secrets.token_hex(4)}.tmp')
+        try:
+            # Like regular new files, the temporary file's permissions are
+            # subject to the user's umask.
+            return (temp, os.open(temp, flags, 0o666))
+        except FileExistsError:
+            continue
+
+
+def copy_permissions(descriptor: int, status: os.stat_result):
+    """Gives the opened file the permissions and owner from `status`."""
+    if hasattr(os, 'fchown'):
+        # Only privileged users may give away files. Retain what we can.
+        with suppress(PermissionError):
+            os.fchown(descriptor, status.st_uid, status.st_gid)
+    if hasattr(os, 'fchmod'):
+        # Not available on Windows, where the only permission is read-only,
+        # which would have prevented us from replacing the file anyway.
+        os.fchmod(descriptor, status.st_mode & 0o7777)
+
+
+def same_status(status: os.stat_result, other: os.stat_result | None) -> bool:
+    """Checks if the file status indicates that the file is unchanged."""
+    if other is None:
+        return False
+    return (
+        (status.st_dev, status.st_ino, status.st_size, status.st_mtime_ns) ==
+        (other.st_dev, other.st_ino, other.st_size, other.st_mtime_ns)
+    )
+
+
+def sync_folder(folder: Path):
+    """Flushes the folder entry to disk, so that a rename is durable."""
+    if os.name != 'posix':
+        return
+    descriptor = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        # Some file systems do not support syncing folders.
+        pass
+    finally:
+        os.close(descriptor)
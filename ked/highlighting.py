@@ -0,0 +1,140 @@
+﻿"""Syntax highlighting of the part of a document that is on screen"""
+
+from .document import SyntaxAwarePieceTable
+
+from tree_sitter import Query
+
+from collections import OrderedDict
+from collections import defaultdict
+
+
+block_size = 256
+"""number of lines highlighted together, and cached as one"""
+
+margin = 64
+"""number of lines above and below the screen to highlight ahead of time"""
+
+max_blocks = 64
+"""maximum number of blocks of lines to keep highlights for"""
+
+Highlight = tuple[int, int | None, str]
+"""start and end column, in bytes, and name of a highlighted range"""
+
+
+class Highlighter:
+    """
+    Highlights a syntax-aware document lazily, block by block
+
+    Textual's text area runs the highlight query over the entire syntax tree
+    whenever the document is loaded or edited, which takes several seconds
+    for files with hundreds of thousands of lines. This class only queries
+    the blocks of lines that are about to be displayed, see `update()`, and
+    fills in the same mapping of line numbers to highlights that the text
+    area renders lines from. Blocks stay cached until an edit affects them,
+    or they are the least recently displayed ones and the cache is full.
+    """
+
+    def __init__(
+        self,
+        document:   SyntaxAwarePieceTable,
+        query:      Query,
+        highlights: defaultdict[int, list[Highlight]],
+    ):
+        self.document = document
+        """document whose syntax tree is queried"""
+        self.query = query
+        """tree-sitter query that captures the highlighted nodes"""
+        self.highlights = highlights
+        """highlights of each line, shared with the text area"""
+        self.names = [
+            query.capture_name(index) for index in range(query.capture_count)
+        ]
+        """names of the captures, in the order they appear in the query"""
+        self.blocks: OrderedDict[int, None] = OrderedDict()
+        """blocks highlighted so far, least recently used first"""
+        highlights.clear()
+        document.changed_rows.clear()
+
+    def update(self, first: int, last: int) -> bool:
+        """
+        Highlights the lines from `first` to `last`, plus a margin.
+
+        Returns whether any highlights were computed, as opposed to all of
+        them having been in the cache already.
+        """
+        self.invalidate()
+        start = max(first - margin, 0) // block_size
+        stop  = min(last + margin, self.document.line_count - 1) // block_size
+        updated = False
+        for block in range(start, stop + 1):
+            if block in self.blocks:
+                self.blocks.move_to_end(block)
+                continue
+            self.highlight(block)
+            updated = True
+        while len(self.blocks) > max_blocks:
+            (block, _) = self.blocks.popitem(last=False)
+            self.discard(block)
+        return updated
+
+    def highlight(self, block: int):
+        """Queries the syntax tree for the highlights in a block of lines."""
+        highlights = self.highlights
+        first = block * block_size
+        stop  = first + block_size
+        self.discard(block)
+        captures = self.document.query_syntax_tree(
+            self.query, (first, 0), (stop, 0),
+        )
+        # Later highlights take precedence over earlier ones in the same
+        # place, so apply them in a fixed order, not whatever the query
+        # happens to capture first in this particular range.
+        for name in self.names:
+            if (nodes := captures.get(name)) is None:
+                continue
+            for node in nodes:
+                (start_row, start_column) = node.start_point
+                (end_row,   end_column)   = node.end_point
+                if start_row == end_row:
+                    if first <= start_row < stop:
+                        highlights[start_row].append(
+                            (start_column, end_column, name)
+                        )
+                    continue
+                if first <= start_row:
+                    highlights[start_row].append((start_column, None, name))
+                middle = range(max(start_row + 1, first), min(end_row, stop))
+                for row in middle:
+                    highlights[row].append((0, None, name))
+                if first <= end_row < stop:
+                    highlights[end_row].append((0, end_column, name))
+        self.blocks[block] = None
+
+    def discard(self, block: int):
+        """Forgets the highlights of the lines in a block."""
+        first = block * block_size
+        for row in range(first, first + block_size):
+            self.highlights.pop(row, None)
+
+    def invalidate(self):
+        """
+        Discards the blocks affected by edits since the last call.
+
+        The document reports the rows each edit replaced, and those the
+        syntax tree changed in as a result. If an edit changed the number of
+        lines, all blocks below it are discarded, as their lines moved.
+        """
+        changes = self.document.changed_rows
+        for (first, old_last, new_last) in changes:
+            start = first // block_size
+            if new_last != old_last:
+                stale = [block for block in self.blocks if block >= start]
+            else:
+                stop  = new_last // block_size
+                stale = [
+                    block for block in self.blocks if start <= block <= stop
+                ]
+            for block in stale:
+                del self.blocks[block]
+                self.discard(block)
+        changes.clear()
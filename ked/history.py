@@ -0,0 +1,155 @@
+﻿"""Edit history of the editor widget"""
+
+from textual.document._history import EditHistory
+from textual.document._edit    import Edit
+
+from collections     import deque
+from contextlib      import contextmanager
+from collections.abc import Generator
+
+
+class History(EditHistory):
+    """
+    Edit history that keeps track of a generation number
+
+    Every edit that is recorded produces a new generation, i.e. a new number
+    that identifies the state of the document. Undoing and redoing edits
+    restores the generation associated with the respective state. Whether the
+    document is still in the same state as at some earlier point, such as
+    when it was last saved, can thus be determined by comparing two numbers,
+    instead of the contents of the undo stack.
+    """
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.generation = 0
+        """generation number of the current state of the document"""
+        self._latest = 0
+        """generation number last handed out"""
+        self._base = 0
+        """generation before the first batch on the undo stack"""
+        self._undo_generations: deque[int] = deque()
+        """generation reached after each batch on the undo stack"""
+        self._redo_generations: deque[int] = deque()
+        """generation reached after each batch on the redo stack"""
+        self._batching = False
+        """whether edits are being recorded as one batch, see `batch()`"""
+        self._batch_started = False
+        """whether the first edit of such a batch has been recorded"""
+        self.truncated = False
+        """whether batches were dropped off the bottom of the undo stack"""
+
+    def record(self, edit: Edit):
+        """Records an edit, creating a new generation."""
+        if self._batch_started:
+            self._extend_batch(edit)
+            return
+        stack  = self._undo_stack
+        top    = stack[-1] if stack else None
+        length = len(top) if top else 0
+        full   = (len(stack) == stack.maxlen)
+        super().record(edit)
+        latest = stack[-1] if stack else None
+        if latest is top and (top is None or len(top) == length):
+            # Edit changed nothing, so the base class did not record it.
+            return
+        self._latest += 1
+        self.generation = self._latest
+        self._redo_generations.clear()
+        if latest is top:
+            self._undo_generations[-1] = self.generation
+            return
+        if full:
+            self._base = self._undo_generations.popleft()
+            self.truncated = True
+        self._undo_generations.append(self.generation)
+        self._batch_started = self._batching
+
+    def _extend_batch(self, edit: Edit):
+        """Adds an edit to the latest batch, regardless of what it does."""
+        result = edit._edit_result
+        if result is None or not (edit.text or result.replaced_text):
+            super().record(edit)
+            return
+        self._undo_stack[-1].append(edit)
+        self._redo_stack.clear()
+        self._latest += 1
+        self.generation = self._latest
+        self._undo_generations[-1] = self.generation
+        self._redo_generations.clear()
+
+    @contextmanager
+    def batch(self) -> Generator[None, None, None]:
+        """
+        Records all edits made within the context as a single batch.
+
+        The batch is then undone, and redone, in one step, no matter how many
+        edits it consists of, or how much text they change.
+        """
+        self.checkpoint()
+        self._batching = True
+        try:
+            yield
+        finally:
+            self._batching = False
+            self._batch_started = False
+            self.checkpoint()
+
+    def _pop_undo(self) -> list[Edit] | None:
+        """Pops the latest batch off the undo stack, restoring generation."""
+        batch = super()._pop_undo()
+        if batch is None:
+            return None
+        self._redo_generations.append(self._undo_generations.pop())
+        if self._undo_generations:
+            self.generation = self._undo_generations[-1]
+        else:
+            self.generation = self._base
+        return batch
+
+    def _pop_redo(self) -> list[Edit] | None:
+        """Pops the latest batch off the redo stack, restoring generation."""
+        full  = (len(self._undo_stack) == self._undo_stack.maxlen)
+        batch = super()._pop_redo()
+        if batch is None:
+            return None
+        if full:
+            self._base = self._undo_generations.popleft()
+            self.truncated = True
+        self.generation = self._redo_generations.pop()
+        self._undo_generations.append(self.generation)
+        return batch
+
+    def prepend(self, batches: list[list[Edit]]):
+        """
+        Adds older `batches` of edits to the bottom of the undo stack.
+
+        The batches, oldest first, must lead up to the state at the bottom of
+        the stack, which keeps its generation. The states before each of them
+        get new generations. Batches that do not fit on the stack are left
+        out, starting with the oldest.
+        """
+        room = self._undo_stack.maxlen - len(self._undo_stack)
+        if len(batches) > room:
+            batches = batches[len(batches) - room:]
+            self.truncated = True
+        if not batches:
+            return
+        count = len(batches)
+        generations = range(self._latest + 1, self._latest + count + 1)
+        self._undo_stack.extendleft(reversed(batches))
+        self._undo_generations.extendleft(
+            reversed([*generations[1:], self._base])
+        )
+        self._base = generations[0]
+        self._latest += count
+        self.checkpoint()
+
+    def clear(self):
+        """Clears the history, starting a new generation."""
+        super().clear()
+        self._undo_generations.clear()
+        self._redo_generations.clear()
+        self.truncated = False
+        self._latest += 1
+        self.generation = self._base = self._latest
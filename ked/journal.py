@@ -0,0 +1,253 @@
+﻿"""Journal of unsaved edits, for recovery after a crash"""
+
+from .         import meta
+from .document import PieceTable
+from .document import split_lines
+from .files    import write_atomic
+
+from textual.document._document import Location
+
+import platformdirs
+
+import os
+import zlib
+import struct
+import hashlib
+from threading       import Lock
+from itertools       import islice
+from pathlib         import Path
+from collections.abc import Iterator
+
+
+folder: Path = platformdirs.user_cache_path() / meta.name / 'journals'
+"""folder with the journals of files being edited"""
+
+compact_size = 1 << 20
+"""size in bytes beyond which a journal is rewritten in compact form"""
+
+magic = b'KEDJ\x01'
+"""bytes a journal file starts with, the last one being the format version"""
+
+frame = struct.Struct('<II')
+"""length and CRC-32 checksum of the record that follows"""
+
+header = struct.Struct('<qq')
+"""size and modification time of the file the edits apply to"""
+
+replacement = struct.Struct('<IIII')
+"""start row, start column, end row, and end column of a replaced range"""
+
+Replacement = tuple[Location, Location, str]
+"""range of text that was replaced, and the text it was replaced with"""
+
+
+class Journal:
+    """
+    Append-only journal of the edits made to a file since it was last saved
+
+    Each edit is recorded as the range of text it replaced and the text it
+    replaced it with, which covers undo and redo just the same. Edits are
+    first collected in memory, see `record()`, where consecutive keystrokes
+    are merged into one edit. They are then written in batches, see
+    `append()`, which is meant to run in a worker thread, so that typing is
+    never held up by the disk.
+
+    The journal file is binary. Each record in it is preceded by its length
+    and checksum, so that a record cut short by a crash is recognized, and
+    ignored, when the journal is read. The first record identifies the file
+    on disk that the edits are to be applied to by its size and modification
+    time. Once the file is saved, or the journal has grown large, it is
+    rewritten in compact form, see `rewrite()`: as a single edit that turns
+    the file on disk into the document being edited.
+    """
+
+    def __init__(self, file: Path, status: os.stat_result):
+        self.file = file
+        """file whose edits are journaled"""
+        self.path = journal_path(file)
+        """location of the journal file"""
+        self.base = (status.st_size, status.st_mtime_ns)
+        """size and modification time of the file the edits apply to"""
+        self.pending: list[Replacement] = []
+        """edits recorded, but not yet written"""
+        self.size = 0
+        """number of bytes written to the journal file"""
+        self.limit = compact_size
+        """size beyond which the journal should be rewritten"""
+        self.rebase = False
+        """whether the file was saved, so the journal should be rewritten"""
+        self.closed = False
+        """whether the journal was discarded, so nothing is written anymore"""
+        self.lock = Lock()
+        """lock that keeps writes from overlapping with discarding"""
+
+    def record(self, start: Location, end: Location, text: str):
+        """Records that the text between `start` and `end` was replaced."""
+        (start, end) = sorted((start, end))
+        if self.pending:
+            (top, bottom, previous) = self.pending[-1]
+            if start == end == end_location(top, previous):
+                # Text typed right after the previous edit.
+                self.pending[-1] = (top, bottom, previous + text)
+                return
+            if not text and not previous and end == top:
+                # Text deleted right before text deleted previously.
+                self.pending[-1] = (start, bottom, '')
+                return
+        self.pending.append((start, end, text))
+
+    def take(self) -> bytes:
+        """Returns the pending edits, encoded as records, and clears them."""
+        data = b''.join(
+            encode_record(replacement.pack(*start, *end) + encode(text))
+            for (start, end, text) in self.pending
+        )
+        self.pending.clear()
+        return data
+
+    def append(self, data: bytes):
+        """Appends encoded records to the journal file, flushed to disk."""
+        with self.lock:
+            if self.closed:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if not self.size:
+                # Start over, replacing a journal left by an earlier session.
+                data = magic + encode_record(self.identity()) + data
+            with self.path.open('ab' if self.size else 'wb') as stream:
+                stream.write(data)
+                stream.flush()
+                os.fsync(stream.fileno())
+            self.size += len(data)
+
+    def rewrite(
+        self,
+        status:   os.stat_result,
+        base:     PieceTable,
+        document: PieceTable,
+    ):
+        """
+        Rewrites the journal as the edit that turns `base` into `document`.
+
+        The `base` is the document as it was last saved, to the file with
+        the given `status`. If there is no difference, the journal file is
+        removed.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.base = (status.st_size, status.st_mtime_ns)
+            change = difference(base, document)
+            if change is None:
+                self.path.unlink(missing_ok=True)
+                self.size = 0
+            else:
+                (start, end, text) = change
+                record = replacement.pack(*start, *end) + encode(text)
+                data = magic + b''.join(
+                    map(encode_record, (self.identity(), record))
+                )
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                write_atomic(self.path, [data])
+                self.size = len(data)
+            self.limit = max(compact_size, 2 * self.size)
+
+    def read(self) -> list[Replacement]:
+        """
+        Reads the edits journaled in an earlier session.
+
+        Returns no edits if there is no journal, or if it does not apply to
+        the file as it is now, i.e. the file was changed since. Reading stops
+        at the first record that is incomplete or corrupted.
+        """
+        try:
+            data = self.path.read_bytes()
+        except OSError:
+            return []
+        if not data.startswith(magic):
+            return []
+        records = decode_records(data, len(magic))
+        first = next(records, None)
+        if first != self.identity():
+            return []
+        edits = []
+        for record in records:
+            fields = replacement.unpack_from(record)
+            text   = decode(record[replacement.size:])
+            edits.append((fields[:2], fields[2:], text))
+        return edits
+
+    def discard(self):
+        """Removes the journal file and stops writing to it."""
+        with self.lock:
+            self.closed = True
+            self.pending.clear()
+            self.path.unlink(missing_ok=True)
+
+    def identity(self) -> bytes:
+        """Returns the first record, identifying the file edits apply to."""
+        path = encode(str(self.file.resolve()))
+        return header.pack(*self.base) + path
+
+
+def journal_path(file: Path) -> Path:
+    """Returns where the journal of edits to the given `file` is kept."""
+    digest = hashlib.sha256(encode(str(file.resolve()))).hexdigest()
+    return folder / f'{digest[:32]}.journal'
+
+
+def end_location(start: Location, text: str) -> Location:
+    """Returns where inserted `text` ends if inserted at `start`."""
+    lines = split_lines(text)
+    if len(lines) == 1:
+        return (start[0], start[1] + len(text))
+    return (start[0] + len(lines) - 1, len(lines[-1]))
+
+
+def difference(base: PieceTable, document: PieceTable) -> Replacement | None:
+    """
+    Returns a single edit that turns the `base` document into `document`.
+
+    The `base` must be an earlier snapshot of the `document`. The edit
+    replaces all lines between the leading and trailing lines the two have
+    in common. Returns `None` if there are no lines in between.
+    """
+    (before, after) = (base.line_count, document.line_count)
+    limit  = min(before, after)
+    prefix = min(document.common_prefix(base), limit - 1)
+    suffix = min(document.common_suffix(base), limit - prefix)
+    if before - suffix == prefix == after - suffix:
+        return None
+    lines = islice(document.iter_lines(prefix), after - suffix - prefix)
+    if suffix:
+        text = ''.join(line + '\n' for line in lines)
+        return ((prefix, 0), (before - suffix, 0), text)
+    end = (before - 1, len(base[before - 1]))
+    return ((prefix, 0), end, '\n'.join(lines))
+
+
+def encode(text: str) -> bytes:
+    """Encodes text as UTF-8, keeping any unpaired surrogates."""
+    return text.encode('utf-8', errors='surrogatepass')
+
+
+def decode(data: bytes) -> str:
+    """Decodes text encoded by `encode()`."""
+    return data.decode('utf-8', errors='surrogatepass')
+
+
+def encode_record(payload: bytes) -> bytes:
+    """Prefixes the `payload` with its length and checksum."""
+    return frame.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_records(data: bytes, offset: int = 0) -> Iterator[bytes]:
+    """Yields the payloads of records in `data` up to the first bad one."""
+    while offset + frame.size <= len(data):
+        (length, checksum) = frame.unpack_from(data, offset)
+        offset += frame.size
+        payload = data[offset:offset + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            return
+        yield payload
+        offset += length
@@ -0,0 +1,223 @@
+﻿"""Loading of text files in a single pass"""
+
+from .detection import detect_encoding
+from .detection import fallback_encoding
+from .detection import is_ascii_compatible
+from .detection import sample_size
+
+import os
+import re
+import codecs
+from pathlib import Path
+from typing  import BinaryIO
+
+
+chunk_size = 1 << 20
+"""number of bytes read from the file at a time"""
+
+other_breaks = re.compile(r'[\x0b\x0c\x1c-\x1e\x85\u2028\u2029]')
+"""characters that `str.splitlines()` splits at, besides CR and LF"""
+
+line_break = re.compile(r'\r\n|\r|\n')
+"""line break as it separates lines in a text file"""
+
+
+class Content:
+    """
+    Text content of a file, as returned by `load()`
+
+    Besides the decoded lines, holds everything else learned about the file
+    while reading it: the text encoding, how many line breaks of each kind
+    were found, and whether the file looks like binary data rather than text.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        """text encoding the content was decoded with"""
+        self.lines: list[str] = []
+        """decoded lines, without line breaks"""
+        self.counts = {'\n': 0, '\r\n': 0, '\r': 0}
+        """number of line breaks of each kind"""
+        self.binary = False
+        """whether NUL bytes were found, in which case reading stopped"""
+
+    @property
+    def newlines(self) -> str | tuple[str, ...] | None:
+        """Line endings found, in the same form as `TextIOBase.newlines`."""
+        return newlines_found(self.counts)
+
+    @property
+    def mixed(self) -> bool:
+        """Indicates whether more than one kind of line ending was found."""
+        return isinstance(self.newlines, tuple)
+
+
+def load(stream: BinaryIO, sample: bytes = b'') -> Content:
+    """
+    Reads and decodes a text file in a single pass.
+
+    The `stream` must be opened in binary mode. If the caller already read
+    the start of the file, for example to detect its encoding, that data is
+    passed in as the `sample`, and reading continues where it left off.
+
+    The text encoding is detected from the first chunk. Each chunk read is
+    then checked for NUL bytes, decoded, split into lines, and its line
+    breaks counted. If the encoding turns out to be wrong further into the
+    file, we start over with a fallback encoding, which is the only case in
+    which the file is read twice.
+    """
+    start = stream.tell() - len(sample)
+    chunk = sample + stream.read(max(chunk_size - len(sample), 0))
+    # The chunk is larger than the sample. So if it's not, it's the whole file.
+    whole = (len(chunk) <= sample_size)
+    encoding = detect_encoding(chunk[:sample_size], final=whole)
+    candidates = [encoding]
+    while True:
+        try:
+            return decode(stream, chunk, candidates[-1])
+        except UnicodeDecodeError as error:
+            candidates.append(fallback_encoding(error.object))
+            if candidates[-1] in candidates[:-1]:
+                # Any byte sequence is valid Latin-1.
+                candidates.append('iso8859-1')
+        stream.seek(start)
+        chunk = stream.read(chunk_size)
+
+
+def decode(stream: BinaryIO, chunk: bytes, encoding: str) -> Content:
+    """Decodes the first `chunk` and the remainder of the `stream`."""
+    content  = Content(encoding)
+    decoder  = codecs.getincrementaldecoder(encoding)()
+    nul_safe = not is_ascii_compatible(encoding)
+    counts   = content.counts
+    carry    = ''
+    ending   = ''
+    while True:
+        following = stream.read(chunk_size) if chunk else b''
+        final = not following
+        if not nul_safe and b'\0' in chunk:
+            content.binary = True
+            return content
+        text = carry + decoder.decode(chunk, final)
+        carry = ''
+        if not final:
+            # Hold back the last line, as it may continue in the next chunk.
+            # That includes a CR at the very end, which may be part of a CRLF.
+            cut = max(text.rfind('\n'), text.rfind('\r', 0, len(text) - 1))
+            carry = text[cut + 1:]
+            text  = text[:cut + 1]
+        if text:
+            content.lines.extend(split_at_breaks(text))
+            if '\r' in text:
+                crlf = text.count('\r\n')
+                counts['\r\n'] += crlf
+                counts['\n']   += text.count('\n') - crlf
+                counts['\r']   += text.count('\r') - crlf
+            else:
+                counts['\n'] += text.count('\n')
+            ending = text[-1]
+        if final:
+            break
+        chunk = following
+    if ending in ('', '\n', '\r'):
+        # Textual's document has an empty last line if the text ends with a
+        # line break, or is empty. We do the same.
+        content.lines.append('')
+    return content
+
+
+class Tail:
+    """
+    Reader of the text appended to a file, as it grows
+
+    Keeps track of how far the file has been read, so that each call of
+    `read()` only reads and decodes the bytes added since the last one. The
+    decoder is incremental, so characters whose bytes are split between
+    two reads come out whole. The file is identified by its device and inode
+    number, so that it is noticed when a log file is rotated, i.e. moved
+    aside and replaced by a new one under the same name.
+    """
+
+    def __init__(self,
+        file:     Path,
+        stream:   BinaryIO,
+        offset:   int,
+        encoding: str,
+    ):
+        status = os.fstat(stream.fileno())
+        self.file = file
+        """path of the file being followed"""
+        self.inode = (status.st_dev, status.st_ino)
+        """device and inode number of the file that was read"""
+        self.offset = offset
+        """number of bytes read so far"""
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        """decoder that carries incomplete characters over to the next read"""
+        self.carry = ''
+        """CR held back at the end of the last read, as it may start a CRLF"""
+
+    def read(self) -> str | None:
+        """
+        Returns the text appended since the last read.
+
+        Returns `None` if the file was truncated or replaced, in which case it
+        has to be loaded again. If the file is missing, as it may be briefly
+        during rotation, returns no text, and the next read tries again.
+        """
+        try:
+            status = self.file.stat()
+        except FileNotFoundError:
+            return ''
+        if (status.st_dev, status.st_ino) != self.inode:
+            return None
+        if status.st_size < self.offset:
+            return None
+        if status.st_size == self.offset:
+            return ''
+        with self.file.open('rb') as stream:
+            stream.seek(self.offset)
+            data = stream.read(status.st_size - self.offset)
+        self.offset += len(data)
+        text = self.carry + self.decoder.decode(data)
+        self.carry = ''
+        if text.endswith('\r'):
+            (text, self.carry) = (text[:-1], '\r')
+        return text
+
+
+def split_at_breaks(text: str) -> list[str]:
+    """
+    Splits `text` into lines at its line breaks, i.e. at CR, LF, and CRLF.
+
+    Same as `str.splitlines()`, except that form feeds, Unicode line
+    separators, and the like stay part of the line. They are not line breaks
+    in files, so if lines were split there, the line breaks written when
+    saving would not match those that were read.
+    """
+    if not other_breaks.search(text):
+        return text.splitlines()
+    lines = line_break.split(text)
+    if not lines[-1]:
+        # Like `splitlines()`, ignore the line break at the very end.
+        lines.pop()
+    return lines
+
+
+def newlines_found(counts: dict[str, int]) -> str | tuple[str, ...] | None:
+    """
+    Summarizes the `counts` of line endings of each kind.
+
+    Returns the same as the `newlines` attribute of a text stream would after
+    reading the text: `None` if there are no line breaks, a string if there is
+    only one kind, a tuple of strings if there are several.
+    """
+    found = tuple(
+        newline for newline in ('\r', '\n', '\r\n') if counts[newline]
+    )
+    match len(found):
+        case 0:
+            return None
+        case 1:
+            return found[0]
+        case _:
+            return found
@@ -0,0 +1,110 @@
+﻿"""Timing of the phases of starting up the application"""
+
+import os
+import json
+import time
+import threading
+from contextlib      import contextmanager
+from pathlib         import Path
+from collections.abc import Generator
+
+
+origin = time.perf_counter_ns()
+"""time when this module was imported, i.e. when the application started"""
+
+recording = False
+"""whether phases are currently being recorded"""
+
+phases: list[tuple[str, int, int | None]] = []
+"""name, start and end time of each phase, with no end if just a moment"""
+
+
+def start():
+    """Starts recording phases, counting time up to now as imports."""
+    global recording
+    recording = True
+    phases.append(('imports', origin, time.perf_counter_ns()))
+
+
+def finish(moment: str = 'first paint'):
+    """Marks the end of start-up with the given `moment`, stops recording."""
+    global recording
+    if recording:
+        phases.append((moment, time.perf_counter_ns(), None))
+    recording = False
+
+
+@contextmanager
+def phase(name: str) -> Generator[None, None, None]:
+    """Records how long the code in the `with` block takes, if recording."""
+    if not recording:
+        yield
+        return
+    begin = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        phases.append((name, begin, time.perf_counter_ns()))
+
+
+def ordered() -> list[tuple[str, int, int | None, int]]:
+    """
+    Returns the recorded phases in the order they started.
+
+    Adds the nesting depth to each phase, i.e. the number of phases it is
+    part of. Phases end up in the list as they finish, so an enclosing phase
+    comes after those nested in it.
+    """
+    items  = sorted(phases, key=lambda item: (item[1], -(item[2] or item[1])))
+    ends   = []
+    result = []
+    for (name, begin, end) in items:
+        while ends and begin >= ends[-1]:
+            ends.pop()
+        result.append((name, begin, end, len(ends)))
+        if end is not None:
+            ends.append(end)
+    return result
+
+
+def report() -> str:
+    """Formats the recorded phases as a table of times in milliseconds."""
+    rows = [
+        (
+            '  '*depth + name,
+            f'{(begin - origin)/1e6:.1f}',
+            f'{(end - begin)/1e6:.1f}' if end is not None else '',
+        )
+        for (name, begin, end, depth) in ordered()
+    ]
+    rows.insert(0, ('phase', 'start (ms)', 'duration (ms)'))
+    widths = [max(len(row[column]) for row in rows) for column in range(3)]
+    lines  = [
+        f'{name:{widths[0]}}  {start:>{widths[1]}}  {duration:>{widths[2]}}'
+        for (name, start, duration) in rows
+    ]
+    return '\n'.join(lines)
+
+
+def save_trace(file: Path):
+    """
+    Saves the recorded phases as a trace `file` in Chrome's JSON format.
+
+    The file can be viewed in the browser, e.g. at `ui.perfetto.dev`.
+    """
+    (pid, tid) = (os.getpid(), threading.get_ident())
+    events = []
+    for (name, begin, end, _) in ordered():
+        event = {
+            'name': name,
+            'ts':   (begin - origin) / 1e3,
+            'pid':  pid,
+            'tid':  tid,
+        }
+        if end is None:
+            event |= {'ph': 'i', 's': 'g'}
+        else:
+            event |= {'ph': 'X', 'dur': (end - begin) / 1e3}
+        events.append(event)
+    trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    file.write_text(json.dumps(trace, indent=1), encoding='utf-8')
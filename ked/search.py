@@ -0,0 +1,149 @@
+﻿"""Incremental search for regular-expression matches in documents"""
+
+from .document import PieceTable
+
+import re
+from bisect          import bisect_left
+from itertools       import islice
+from collections.abc import Iterable
+
+
+chunk_lines = 4096
+"""number of lines searched per call of `Search.scan()`"""
+
+Match = tuple[int, int, int]
+"""row, start column, and end column of a match"""
+
+
+class Search:
+    """
+    Matches of a regular expression in a document, found incrementally
+
+    The document is searched from the top in chunks of lines, see `scan()`,
+    so that the editor can keep responding to input in between, even when
+    searching a document with millions of lines. Matches are kept sorted by
+    their position. After edits, `update()` shifts the matches below them
+    and only searches the edited lines again.
+
+    Matches do not extend across line breaks. Empty matches, which a pattern
+    like `x*` finds everywhere, are ignored.
+    """
+
+    def __init__(self, document: PieceTable, pattern: re.Pattern[str]):
+        self.document = document
+        """document being searched"""
+        self.pattern = pattern
+        """regular expression searched for"""
+        self.matches: list[Match] = []
+        """matches found so far, in order"""
+        self.scanned = 0
+        """number of lines searched so far, from the top"""
+
+    @property
+    def done(self) -> bool:
+        """Indicates whether the entire document has been searched."""
+        return (self.scanned >= self.document.line_count)
+
+    def scan(self, count: int = chunk_lines) -> int:
+        """Searches the next `count` lines, returns the number of matches."""
+        first = self.scanned
+        found = self.search(first, first + count - 1)
+        self.matches.extend(found)
+        self.scanned = min(first + count, self.document.line_count)
+        return len(found)
+
+    def search(self, first: int, last: int) -> list[Match]:
+        """Returns the matches in the lines from `first` to `last`."""
+        lines = islice(self.document.iter_lines(first), last - first + 1)
+        finditer = self.pattern.finditer
+        return [
+            (row, match.start(), match.end())
+            for (row, line) in enumerate(lines, first)
+            for match in finditer(line)
+            if match.end() > match.start()
+        ]
+
+    def update(self, edits: Iterable[tuple[int, int, int]]):
+        """
+        Updates the matches after `edits` to the document.
+
+        Each edit is given by its first row, its last row before the edit,
+        and its last row after. Matches in edited rows are removed and those
+        further down moved, as edits come in. Only then, once the rows refer
+        to the current state of the document, are the edited rows searched
+        again.
+        """
+        matches = self.matches
+        edited: list[tuple[int, int]] = []
+        for (first, old_last, new_last) in edits:
+            if first >= self.scanned:
+                continue
+            if old_last >= self.scanned:
+                # Edit reaches into lines not searched yet. Continue from it.
+                del matches[bisect_left(matches, (first,)):]
+                self.scanned = first
+                edited = [
+                    (start, min(stop, first - 1))
+                    for (start, stop) in edited if start < first
+                ]
+                continue
+            shift = new_last - old_last
+            start = bisect_left(matches, (first,))
+            stop  = bisect_left(matches, (old_last + 1,))
+            if shift:
+                matches[start:] = [
+                    (row + shift, begin, end)
+                    for (row, begin, end) in matches[stop:]
+                ]
+            else:
+                del matches[start:stop]
+            self.scanned += shift
+            (top, bottom) = (first, new_last)
+            kept = []
+            for (start, stop) in edited:
+                if stop < first:
+                    kept.append((start, stop))
+                elif start > old_last:
+                    kept.append((start + shift, stop + shift))
+                else:
+                    top = min(top, start)
+                    if stop > old_last:
+                        bottom = max(bottom, stop + shift)
+            kept.append((top, bottom))
+            edited = kept
+        for (first, last) in edited:
+            last = min(last, self.scanned - 1)
+            index = bisect_left(matches, (first,))
+            matches[index:index] = self.search(first, last)
+
+    def spans(self, row: int) -> list[tuple[int, int]]:
+        """Returns start and end column of the matches in the given `row`."""
+        matches = self.matches
+        index = bisect_left(matches, (row,))
+        spans = []
+        while index < len(matches) and matches[index][0] == row:
+            (_, start, end) = matches[index]
+            spans.append((start, end))
+            index += 1
+        return spans
+
+    def following(
+        self,
+        location:  tuple[int, int],
+        inclusive: bool = False,
+    ) -> Match | None:
+        """Returns the first match after (or at) the given `location`."""
+        (row, column) = location
+        if not inclusive:
+            column += 1
+        index = bisect_left(self.matches, (row, column))
+        if index < len(self.matches):
+            return self.matches[index]
+        return None
+
+    def preceding(self, location: tuple[int, int]) -> Match | None:
+        """Returns the last match found before the given `location`."""
+        index = bisect_left(self.matches, location)
+        if index > 0:
+            return self.matches[index - 1]
+        return None
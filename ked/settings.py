@@ -233,8 +233,10 @@ class Settings(ModalScreen):
 
     def action_save(self):
         """Saves changed settings to disk."""
-        for (setting, (value_new, _)) in self.pending.items():
-            config.store(setting, value_new)
+        config.store_many({
+            setting: value_new
+            for (setting, (value_new, _)) in self.pending.items()
+        })
         self.app.configure_keys()
         self.dismiss()
 
@@ -26,6 +26,9 @@ class Statusbar(Footer):
     cursor: reactive[tuple[int, int]] = reactive((1, 1))
     """current cursor position in the editor"""
 
+    saving: reactive[float | None] = reactive(None)
+    """progress of saving the file in the background"""
+
     DEFAULT_CSS = """
         $footer-key-foreground: $primary;
         #key-bindings {
@@ -78,6 +81,9 @@ class Statusbar(Footer):
                 )
 
         with Horizontal(id='edit-status'):
+            yield SaveProgress(id='save-progress').data_bind(
+                Statusbar.saving
+            )
             yield CursorPosition(id='cursor-position').data_bind(
                 Statusbar.cursor
             )
@@ -128,6 +134,18 @@ class TextEncoding(Label):
             case 'utf-8-sig':
                 display = 'UTF-8-BOM'
                 tooltip = 'Text encoding is UTF-8 with a byte-order mark.'
+            case 'utf-16':
+                display = 'UTF-16'
+                tooltip = 'Text encoding is UTF-16 Unicode.'
+            case 'utf-32':
+                display = 'UTF-32'
+                tooltip = 'Text encoding is UTF-32 Unicode.'
+            case 'iso8859-1':
+                display = 'Latin-1'
+                tooltip = 'Text encoding is ISO 8859-1 (Latin-1).'
+            case 'cp1252':
+                display = 'Windows-1252'
+                tooltip = 'Text encoding is Windows code page 1252.'
             case _:
                 display = self.encoding
                 tooltip = ''
@@ -200,3 +218,21 @@ class CursorPosition(Label):
         column += 1
         self.tooltip = f'The cursor is on line {line} in column {column}.'
         return f'{line},{column}'
+
+
+class SaveProgress(Label):
+    """Displays the progress of saving the file in the background."""
+
+    saving: reactive[float | None] = reactive(None, layout=True)
+    """fraction of the file saved so far, or `None` if not saving"""
+
+    def watch_saving(self, saving: float | None):
+        """Only shows the widget while the file is being saved."""
+        self.display = (saving is not None)
+
+    def render(self) -> str:
+        """Renders the status display of the save progress."""
+        if self.saving is None:
+            return ''
+        self.tooltip = 'The file is being saved in the background.'
+        return f'Saving {self.saving:.0%}'
@@ -1,6 +1,7 @@
 ﻿"""Text-based user interface of the application"""
 
 from .          import meta
+from .          import profiling
 from .          import config
 from .          import bindings
 from .          import dialogs
@@ -18,9 +19,11 @@ from textual.binding  import Binding
 from textual.reactive import reactive
 from textual.screen   import Screen
 from textual.events   import Key
+from yaml             import YAMLError
 
 from pathlib         import Path
 from collections.abc import Iterable
+from collections.abc import Mapping
 
 
 class TUI(App[str], inherit_bindings=False):
@@ -38,6 +41,21 @@ class TUI(App[str], inherit_bindings=False):
     cursor: reactive[tuple[int, int]] = reactive((1, 1))
     """current cursor position in the editor"""
 
+    saving: reactive[float | None] = reactive(None)
+    """progress of saving the file in the background"""
+
+    settings: Mapping[config.Setting, config.Value] = {}
+    """snapshot of the configuration the app was last configured with"""
+
+    hex_view: bool = False
+    """whether the editor shows the file as hex dump, even if it is text"""
+
+    view_only: bool = False
+    """whether the file is only viewed, never edited"""
+
+    follow: bool = False
+    """whether the editor shows text appended to the file as it grows"""
+
     TITLE     = meta.name
     SUB_TITLE = meta.summary
     BINDINGS  = bindings.application
@@ -46,13 +64,21 @@ class TUI(App[str], inherit_bindings=False):
 
     def compose(self) -> ComposeResult:
         """Composes the application's user interface."""
-        yield Editor(id='editor').data_bind(file=TUI.file)
-        yield Statusbar(id='statusbar').data_bind(
-            file     = TUI.file,
-            encoding = TUI.encoding,
-            newline  = TUI.newline,
-            cursor   = TUI.cursor,
-        )
+        with profiling.phase('compose'):
+            editor = Editor(
+                id        = 'editor',
+                hex_view  = self.hex_view,
+                view_only = self.view_only,
+                follow    = self.follow,
+            )
+            yield editor.data_bind(file=TUI.file)
+            yield Statusbar(id='statusbar').data_bind(
+                file     = TUI.file,
+                encoding = TUI.encoding,
+                newline  = TUI.newline,
+                cursor   = TUI.cursor,
+                saving   = TUI.saving,
+            )
 
     @property
     def editor(self) -> Editor:
@@ -61,7 +87,27 @@ class TUI(App[str], inherit_bindings=False):
 
     def on_mount(self):
         """Sets theme and key bindings according to configuration."""
+        with profiling.phase('apply app theme'):
+            self.theme = config.query(('theme', 'app'))
+        with profiling.phase('configure keys'):
+            self.configure_keys()
+        self.call_after_refresh(profiling.finish)
+        self.settings = config.snapshot()
+        if interval := config.query(('config', 'reload')):
+            self.set_interval(interval, self.reload_config)
+
+    def reload_config(self):
+        """Applies theme and key bindings again if configuration changed."""
+        try:
+            settings = config.snapshot()
+        except (OSError, YAMLError):
+            # The file may be in the middle of being written. Try again later.
+            return
+        if settings is self.settings:
+            return
+        self.settings = settings
         self.theme = config.query(('theme', 'app'))
+        self.editor.theme = config.query(('theme', 'syntax'))
         self.configure_keys()
 
     async def on_key(self, event: Key):
@@ -85,9 +131,15 @@ class TUI(App[str], inherit_bindings=False):
         """Propagates new file name to status bar."""
         self.file = self.editor.file
 
-    def on_editor_cursor_moved(self):
+    def on_editor_cursor_moved(self, message: Editor.CursorMoved):
         """Propagates new cursor position to status bar."""
-        self.cursor = self.editor.cursor_location
+        self.cursor = message.cursor
+
+    def on_editor_save_progressed(self, message: Editor.SaveProgressed):
+        """Propagates progress of saving the file to status bar."""
+        # Take the progress from the message, as saving ends in a worker
+        # thread, possibly after the editor was already removed on exit.
+        self.saving = message.saving
 
     def on_file_name_clicked(self):
         """Runs `editor.save_as` action when file name in footer clicked."""
@@ -140,6 +192,24 @@ class TUI(App[str], inherit_bindings=False):
                 'save_as',
                 self.editor.action_save_as,
             ),
+            (
+                'Find',
+                'Search for a regular expression.',
+                'find',
+                self.editor.action_find,
+            ),
+            (
+                'Replace',
+                'Replace all matches of a regular expression.',
+                'replace_all',
+                self.editor.action_replace_all,
+            ),
+            (
+                'Go to line',
+                'Move the cursor to the line with a given number.',
+                'goto_line',
+                self.editor.action_goto_line,
+            ),
             (
                 'Trim',
                 'Trim trailing white-space.',
@@ -213,6 +283,7 @@ class TUI(App[str], inherit_bindings=False):
     def action_quit(self):
         """Makes sure we don't quit when there are unsaved changes."""
         if not self.editor.modified:
+            self.editor.discard_journal()
             self.exit()
         dialog = dialogs.ClickResponse(
             'There are unsaved changes to the file. What to do?',
@@ -226,6 +297,19 @@ class TUI(App[str], inherit_bindings=False):
         match answer:
             case 'Save':
                 self.editor.action_save()
-                self.exit()
+                self.run_worker(self.exit_after_save())
             case 'Quit':
-                self.exit()
+                self.run_worker(self.exit_after_save(discard=True))
+
+    async def exit_after_save(self, discard: bool = False):
+        """
+        Exits the application once saving the file has finished.
+
+        Waits for the save running in the background, if any, so that it's
+        not cut short. Does not exit if changes were to be saved, but saving
+        failed, as the user will want to see the error message.
+        """
+        await self.editor.wait_for_save()
+        if discard or not self.editor.modified:
+            self.editor.discard_journal()
+            self.exit()
@@ -0,0 +1,491 @@
+﻿"""Layout of document lines on screen, possibly soft-wrapped"""
+
+from textual.document._wrapped_document import WrappedDocument
+from textual.document._wrapped_document import compute_wrap_offsets
+from textual.document._document         import DocumentBase
+from textual.document._document         import Location
+from textual.expand_tabs                import get_tab_widths
+from textual.cache                      import LRUCache
+
+from array           import array
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Sequence
+
+
+block_lines = 1024
+"""number of lines per block of `RowCounts`"""
+
+layouts_cached = 1024
+"""maximum number of line layouts to keep, for any width and tab size"""
+
+
+class LazyWrappedDocument(WrappedDocument):
+    """
+    Wrapped view of a document that keeps the layout in compact form
+
+    Textual's `WrappedDocument` computes, and caches, the layout of every
+    line in the document, even when soft-wrapping is off, and updates those
+    caches for all lines below an edit. This class replaces the caches with
+    sequences that compute their items on demand. When not wrapping, every
+    line is exactly one row on screen, so there is nothing to compute up
+    front. When wrapping, only the number of rows of each line is stored,
+    see `RowCounts`, which maps lines to rows, and back, in logarithmic time.
+
+    Where exactly lines wrap is only computed when needed, typically for the
+    lines on screen. Until then, the number of rows of a line is estimated
+    from its length, once its block of lines is first looked up. Before that,
+    every line counts as many rows as the typical line at the document's
+    start, so that wrapping never reads the entire document. Once a line has
+    been laid out, its actual row count replaces the estimate, and the
+    `resized` flag is raised, as it is when a block is estimated. Layouts are
+    cached by line content, width, and tab size, so toggling wrapping, or
+    resizing back and forth, does not lay out the same lines again.
+    """
+
+    def __init__(
+        self,
+        document:  DocumentBase,
+        width:     int = 0,
+        tab_width: int = 4,
+    ):
+        self.document   = document
+        self._width     = width
+        self._tab_width = tab_width
+        self._rows      = RowCounts(0, 1, self.estimate_lines)
+        """number of rows each line takes up when wrapping, maybe estimated"""
+        self._layouts: LRUCache[tuple[str, int, int], list[int]] = (
+            LRUCache(layouts_cached)
+        )
+        """wrap offsets of recently laid-out lines"""
+        self.resized = False
+        """whether row counts changed as lines were laid out"""
+        self.wrap(width, tab_width)
+
+    def wrap(self, width: int, tab_width: int | None = None):
+        """Wraps all lines, or sets up lazy look-ups if `width` is zero."""
+        self._width = width
+        if tab_width:
+            self._tab_width = tab_width
+        document = self.document
+        if width:
+            self._rows = RowCounts(
+                document.line_count, self.typical_rows(), self.estimate_lines,
+            )
+            self._wrap_offsets          = PerLine(document, self.line_offsets)
+            self._offset_to_line_info   = PerRow(self)
+            self._line_index_to_offsets = PerLine(document, self.line_rows)
+        else:
+            self._rows = RowCounts(0, 1, self.estimate_lines)
+            self._wrap_offsets          = PerLine(document, lambda _: [])
+            self._offset_to_line_info   = PerLine(document, lambda y: (y, 0))
+            self._line_index_to_offsets = PerLine(document, lambda y: [y])
+        self._tab_width_cache = PerLine(document, self.tab_widths)
+
+    def wrap_range(
+        self,
+        start:   Location,
+        old_end: Location,
+        new_end: Location,
+    ):
+        """Updates the wrapped lines affected by an edit."""
+        if not self._width:
+            return
+        last = self.document.line_count - 1
+        top        = min(start[0], old_end[0], last)
+        old_bottom = max(start[0], old_end[0])
+        new_bottom = min(max(start[0], new_end[0]), last)
+        # Catch up on lines indexed before the edit, not those it inserted.
+        self.grow(last + 1 - max(start[0], new_end[0]) + old_bottom)
+        counts = [
+            self.estimate(self.document[index])
+            for index in range(top, new_bottom + 1)
+        ]
+        self._rows.replace(top, old_bottom + 1, counts)
+
+    @property
+    def height(self) -> int:
+        """Number of rows the document takes up on screen."""
+        if self._width:
+            return self.rows.total
+        return self.document.line_count
+
+    @property
+    def rows(self) -> 'RowCounts':
+        """
+        Number of rows of each line, for all lines of the document.
+
+        A memory-mapped document grows, without being edited, as the file is
+        indexed. Lines added since are appended here, though not estimated.
+        """
+        self.grow(self.document.line_count)
+        return self._rows
+
+    def grow(self, count: int):
+        """Adds row counts of lines appended up to the line `count`."""
+        self._rows.extend(count - self._rows.line_count)
+
+    def estimate(self, line: str) -> int:
+        """Estimates the number of rows a `line` takes up, without layout."""
+        return max(-(-len(line) // self._width), 1)
+
+    def estimate_lines(self, first: int, stop: int) -> Iterable[int]:
+        """Estimates row counts of the lines from `first` up to `stop`."""
+        self.resized = True
+        return map(self.estimate, self.document[first:stop])
+
+    def typical_rows(self) -> int:
+        """Estimates the rows of a typical line from the first few lines."""
+        lines = self.document[0:block_lines]
+        if not lines:
+            return 1
+        length = sum(len(line) for line in lines) // len(lines)
+        return max(-(-length // self._width), 1)
+
+    def wrap_offsets(self, line: str) -> list[int]:
+        """Returns the offsets at which the given `line` wraps."""
+        (width, tab_width) = (self._width, self._tab_width)
+        key = (line, width, tab_width)
+        offsets = self._layouts.get(key)
+        if offsets is None:
+            offsets = compute_wrap_offsets(
+                line, width, tab_width,
+                precomputed_tab_sections=get_tab_widths(line, tab_width),
+            )
+            self._layouts.set(key, offsets)
+        return offsets
+
+    def line_offsets(self, line_index: int) -> list[int]:
+        """Returns where the line with given index wraps, settling its rows."""
+        offsets = self.wrap_offsets(self.document[line_index])
+        count = len(offsets) + 1
+        if self.rows.count(line_index) != count:
+            self.rows.replace(line_index, line_index + 1, (count,))
+            self.resized = True
+        return offsets
+
+    def line_rows(self, line_index: int) -> list[int]:
+        """Returns the rows on screen that the given line takes up."""
+        self.line_offsets(line_index)
+        first = self.rows.first_row(line_index)
+        return list(range(first, first + self.rows.count(line_index)))
+
+    def row_info(self, row: int) -> tuple[int, int]:
+        """Returns the line shown in the given `row`, and its section there."""
+        while True:
+            (line, section) = self.rows.line_at(row)
+            # A line's first row only depends on the lines before it. So this
+            # is still the right line, unless it has fewer rows than estimated.
+            if section <= len(self.line_offsets(line)):
+                return (line, section)
+
+    def lay_out(self, top: int, bottom: int):
+        """Lays out the lines shown in the rows from `top` to `bottom`."""
+        if not self._width:
+            return
+        row = top
+        while row <= bottom and row < self.height:
+            (line, section) = self.row_info(row)
+            row += self.rows.count(line) - section
+
+    def tab_widths(self, line_index: int) -> list[int]:
+        """Returns the widths of the tab characters in the given line."""
+        line = self.document[line_index]
+        return [width for (_, width) in get_tab_widths(line, self._tab_width)]
+
+
+class RowCounts:
+    """
+    Number of rows on screen that each line of a document takes up
+
+    Lines are grouped in blocks of about `block_lines` lines. At first, the
+    lines of a block are not even read. Each is assumed to take up as many
+    rows as a `typical` line. Only when one of the lines is looked up are the
+    rows of all lines in its block estimated, via the `estimate` callback.
+    Turning on wrapping therefore takes no time even for huge documents,
+    such as memory-mapped files, which would otherwise be decoded in full.
+
+    The numbers of lines and rows per block are summed up in Fenwick trees.
+    Changing the count of a line, finding the row at which a line starts, or
+    the line at a given row, thus takes logarithmic time in the number of
+    blocks, plus linear time in the lines of one block.
+    """
+
+    def __init__(
+        self,
+        count:    int,
+        typical:  int,
+        estimate: Callable[[int, int], Iterable[int]],
+    ):
+        self.typical = typical
+        """number of rows of each line that was not estimated yet"""
+        self.estimate = estimate
+        """returns estimated row counts of lines from the first to the stop"""
+        (full, rest) = divmod(count, block_lines)
+        self.lines = [block_lines] * full + ([rest] if rest else [])
+        """number of lines in each block"""
+        self.counts: list[array | None] = [None] * len(self.lines)
+        """row counts of the lines in each block, `None` if not estimated"""
+        self.line_sums = FenwickTree(self.lines)
+        """sums of the number of lines per block"""
+        self.row_sums = FenwickTree(size * typical for size in self.lines)
+        """sums of the number of rows per block"""
+
+    @property
+    def total(self) -> int:
+        """Total number of rows."""
+        return self.row_sums.total
+
+    @property
+    def line_count(self) -> int:
+        """Total number of lines."""
+        return self.line_sums.total
+
+    def count(self, line: int) -> int:
+        """Returns the number of rows of the given `line`."""
+        (block, index) = self.locate(line)
+        return self.block(block)[index]
+
+    def first_row(self, line: int) -> int:
+        """Returns the row at which the given `line` starts."""
+        (block, index) = self.locate(line)
+        counts = self.block(block)
+        return self.row_sums.prefix(block) + sum(counts[:index])
+
+    def line_at(self, row: int) -> tuple[int, int]:
+        """Returns the line at the given `row`, and the row within the line."""
+        while True:
+            (block, start) = self.row_sums.find(row)
+            if block == len(self.lines):
+                block -= 1
+                start = self.row_sums.prefix(block)
+            if self.counts[block] is not None:
+                break
+            # Rows of the block change as its lines are estimated. The row
+            # may then be in a later block.
+            self.block(block)
+        line = self.line_sums.prefix(block)
+        for count in self.counts[block]:
+            if row < start + count:
+                break
+            start += count
+            line  += 1
+        return (line, row - start)
+
+    def replace(self, first: int, stop: int, counts: Iterable[int]):
+        """Replaces the counts of lines from `first` up to `stop`."""
+        counts = array('q', counts)
+        if not self.lines:
+            self.lines.append(0)
+            self.counts.append(array('q'))
+            self.rebuild()
+        (head_block, head) = self.locate(first)
+        if stop > first:
+            (tail_block, tail) = self.locate(stop - 1)
+            tail += 1
+        else:
+            (tail_block, tail) = (head_block, head)
+        if head_block == tail_block:
+            size = self.lines[head_block] - (tail - head) + len(counts)
+            if 0 < size <= 2 * block_lines:
+                # Edit within one block, which keeps a reasonable size.
+                block = self.counts[head_block]
+                if block is None:
+                    rows = size * self.typical
+                else:
+                    block[head:tail] = counts
+                    rows = sum(block)
+                self.lines[head_block] = size
+                self.line_sums.set(head_block, size)
+                self.row_sums.set(head_block, rows)
+                return
+        # Split the blocks at either end, and put the lines in between into
+        # new blocks. Lines not estimated yet stay that way.
+        head_counts = self.counts[head_block]
+        tail_counts = self.counts[tail_block]
+        parts: list[tuple[int, array | None]] = [
+            (head, None if head_counts is None else head_counts[:head]),
+            (len(counts), counts),
+            (self.lines[tail_block] - tail,
+             None if tail_counts is None else tail_counts[tail:]),
+        ]
+        merged: list[tuple[int, array | None]] = []
+        for (size, part) in parts:
+            if merged and part is not None and merged[-1][1] is not None:
+                (known, previous) = merged.pop()
+                (size, part) = (known + size, previous + part)
+            merged.append((size, part))
+        lines:  list[int] = []
+        blocks: list[array | None] = []
+        for (size, part) in merged:
+            for start in range(0, size, block_lines):
+                length = min(block_lines, size - start)
+                lines.append(length)
+                blocks.append(
+                    None if part is None else part[start:start + length]
+                )
+        self.lines[head_block:tail_block + 1]  = lines
+        self.counts[head_block:tail_block + 1] = blocks
+        self.rebuild()
+
+    def extend(self, count: int):
+        """Appends `count` lines, which are not estimated yet."""
+        lines = self.lines
+        if count > 0 and lines and self.counts[-1] is None:
+            # Fill up the last block first.
+            fill = min(block_lines - lines[-1], count)
+            if fill > 0:
+                lines[-1] += fill
+                self.line_sums.set(len(lines) - 1, lines[-1])
+                self.row_sums.set(len(lines) - 1, lines[-1] * self.typical)
+                count -= fill
+        while count > 0:
+            size = min(block_lines, count)
+            lines.append(size)
+            self.counts.append(None)
+            self.line_sums.append(size)
+            self.row_sums.append(size * self.typical)
+            count -= size
+
+    def locate(self, line: int) -> tuple[int, int]:
+        """Returns the block the given `line` is in, and its index there."""
+        (block, first) = self.line_sums.find(line)
+        if block == len(self.lines) and block:
+            # Right after the last line.
+            block -= 1
+            first -= self.lines[block]
+        return (block, line - first)
+
+    def block(self, block: int) -> array:
+        """Returns the row counts of the lines in a block, estimating them."""
+        counts = self.counts[block]
+        if counts is None:
+            first  = self.line_sums.prefix(block)
+            stop   = first + self.lines[block]
+            counts = array('q', self.estimate(first, stop))
+            self.counts[block] = counts
+            self.row_sums.set(block, sum(counts))
+        return counts
+
+    def rebuild(self):
+        """Sums up lines and rows per block from scratch."""
+        self.line_sums = FenwickTree(self.lines)
+        self.row_sums  = FenwickTree(
+            size * self.typical if counts is None else sum(counts)
+            for (size, counts) in zip(self.lines, self.counts, strict=True)
+        )
+
+
+class FenwickTree:
+    """
+    Sums of a sequence of numbers, kept up to date in logarithmic time
+
+    Also known as a binary indexed tree. Changing or appending a number,
+    summing up the numbers before a given index, and finding where these
+    sums exceed a given value all take logarithmic time. The numbers must
+    not be negative.
+    """
+
+    def __init__(self, values: Iterable[int]):
+        self.values = list(values)
+        """the numbers summed up"""
+        self.total = sum(self.values)
+        """sum of all numbers"""
+        tree = [0, *self.values]
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self.tree = tree
+        """partial sums, each of the `i & -i` numbers up to (1-based) `i`"""
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def set(self, index: int, value: int):
+        """Changes the number at the given `index` to `value`."""
+        delta = value - self.values[index]
+        if not delta:
+            return
+        self.values[index] = value
+        self.total += delta
+        tree  = self.tree
+        index += 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def append(self, value: int):
+        """Appends another number."""
+        self.values.append(value)
+        self.total += value
+        index = len(self.values)
+        lowest = index & -index
+        self.tree.append(
+            value + self.prefix(index - 1) - self.prefix(index - lowest)
+        )
+
+    def prefix(self, index: int) -> int:
+        """Returns the sum of the numbers before the given `index`."""
+        tree  = self.tree
+        total = 0
+        while index:
+            total += tree[index]
+            index &= index - 1
+        return total
+
+    def find(self, value: int) -> tuple[int, int]:
+        """
+        Finds the number at which the sums exceed the given `value`.
+
+        Returns its index, and the sum of the numbers before it. The index is
+        the number of numbers if the `value` is not less than the total.
+        """
+        tree  = self.tree
+        index = 0
+        rest  = value
+        step  = 1 << len(self.values).bit_length()
+        while step:
+            node = index + step
+            if node < len(tree) and tree[node] <= rest:
+                index = node
+                rest -= tree[node]
+            step >>= 1
+        return (index, value - rest)
+
+
+class PerLine(Sequence):
+    """Per-line sequence, with items computed from the line index on demand."""
+
+    def __init__(self, document: DocumentBase, item: Callable[[int], object]):
+        self.document = document
+        self.item     = item
+
+    def __len__(self) -> int:
+        return self.document.line_count
+
+    def __getitem__(self, index: int) -> object:
+        count = self.document.line_count
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('Line index out of range.')
+        return self.item(index)
+
+
+class PerRow(Sequence):
+    """Line index and section of each row of a wrapped document, on demand."""
+
+    def __init__(self, wrapped: LazyWrappedDocument):
+        self.wrapped = wrapped
+
+    def __len__(self) -> int:
+        return self.wrapped.height
+
+    def __getitem__(self, index: int) -> tuple[int, int]:
+        count = self.wrapped.height
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('Row index out of range.')
+        return self.wrapped.row_info(index)
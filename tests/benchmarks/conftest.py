@@ -0,0 +1,123 @@
+﻿"""Fixtures for the benchmarks"""
+
+from ked import config
+from ked import journal
+from ked import archive
+
+from pytest import fixture
+from pytest import fail
+
+import json
+import time
+from contextlib      import contextmanager
+from pathlib         import Path
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterator
+
+
+baselines_file = Path(__file__).parent / 'baselines.json'
+"""file that stores the best time of each benchmark from an earlier run"""
+
+tolerance = 2.0
+"""factor by which a benchmark may be slower than its baseline"""
+
+slack = 0.005
+"""time, in seconds, any benchmark may be slower regardless of `tolerance`"""
+
+
+class Benchmark:
+    """
+    Times a piece of code over several rounds
+
+    The best of all rounds is the result. It is compared to the baseline
+    time, if there is one, and the benchmark fails if it is significantly
+    slower. Times vary from machine to machine, so baselines are only
+    meaningful on the machine they were recorded on, which is why the
+    tolerance is generous.
+    """
+
+    def __init__(self, name: str, baseline: float | None):
+        self.name = name
+        """name of the benchmark, as in the baselines file"""
+        self.baseline = baseline
+        """best time, in seconds, of an earlier run"""
+        self.times: list[float] = []
+        """time, in seconds, that each round took"""
+
+    def __call__(self, function: Callable, *args, rounds: int = 5):
+        """Calls the `function` with `args` each round, then checks result."""
+        for _ in range(rounds):
+            with self.timing():
+                result = function(*args)
+        self.check()
+        return result
+
+    @contextmanager
+    def timing(self) -> Generator[None, None, None]:
+        """Times the code in the `with` block as one round."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times.append(time.perf_counter() - start)
+
+    @property
+    def best(self) -> float:
+        """Returns the time of the fastest round."""
+        return min(self.times)
+
+    def check(self):
+        """Fails if the best time is significantly worse than the baseline."""
+        if self.baseline is None:
+            return
+        limit = self.baseline * tolerance + slack
+        if self.best > limit:
+            fail(
+                f'Benchmark {self.name} took {self.best*1e3:.1f} ms, more '
+                f'than {limit*1e3:.1f} ms, given a baseline of '
+                f'{self.baseline*1e3:.1f} ms.'
+            )
+
+
+@fixture(autouse=True)
+def user_folders(monkeypatch, tmp_path):
+    """Keeps settings, journals, and edit histories out of user folders."""
+    monkeypatch.setattr(config,  'user_dir', tmp_path / 'user')
+    monkeypatch.setattr(config,  'site_dir', tmp_path / 'site')
+    monkeypatch.setattr(journal, 'folder',   tmp_path / 'journals')
+    monkeypatch.setattr(archive, 'folder',   tmp_path / 'history')
+
+
+@fixture(scope='session')
+def baselines() -> dict[str, float]:
+    """Loads the baselines, i.e. best times of earlier runs."""
+    if not baselines_file.exists():
+        return {}
+    return json.loads(baselines_file.read_text(encoding='utf-8'))
+
+
+@fixture(scope='session')
+def results(request, baselines: dict[str, float]) -> Iterator[dict]:
+    """Collects the benchmark results, saves them afterwards if asked to."""
+    results = {}
+    yield results
+    if request.config.getoption('--save-baselines') and results:
+        updated = dict(sorted((baselines | results).items()))
+        baselines_file.write_text(
+            json.dumps(updated, indent=4) + '\n', encoding='utf-8',
+        )
+
+
+@fixture
+def benchmark(
+    request,
+    baselines: dict[str, float],
+    results:   dict[str, float],
+) -> Iterator[Benchmark]:
+    """Provides a benchmark named after the test, records its best time."""
+    name = request.node.name
+    benchmark = Benchmark(name, baselines.get(name))
+    yield benchmark
+    if benchmark.times:
+        results[name] = round(benchmark.best, 6)
@@ -0,0 +1,186 @@
+﻿"""Benchmarks of loading, editing, saving, and rendering files"""
+
+from ked.tui      import TUI
+from ked.settings import Settings
+
+from pytest import fixture
+from pytest import mark
+
+import asyncio
+from pathlib import Path
+
+
+pytestmark = mark.benchmark
+
+sizes = {
+    '1KB':   2**10,
+    '1MB':   2**20,
+    '50MB':  50 * 2**20,
+    '500MB': 500 * 2**20,
+}
+"""sizes of the synthetic files loaded"""
+
+newlines = {'LF': '\n', 'CRLF': '\r\n', 'mixed': None}
+"""line endings of the synthetic files, alternating if mixed"""
+
+
+@fixture(scope='session')
+def folder(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp('benchmarks')
+
+
+def synthetic(
+    folder:   Path,
+    size:     int,
+    newline:  str | None = '\n',
+    encoding: str = 'utf-8',
+    trailing: str = '',
+    suffix:   str = '.txt',
+) -> Path:
+    """Creates a text file of about the given `size`, unless it exists."""
+    name = f'{size}-{newline!r}-{encoding}-{trailing!r}{suffix}'
+    file = folder / name.replace('\\', '')
+    if file.exists():
+        return file
+    block = ''.join(
+        f"line_{n} = 'The quick brown fox jumps over the lazy dög.'"
+        + (trailing if n % 3 else '')
+        + (newline or ('\n' if n % 2 else '\r\n'))
+        for n in range(1000)
+    ).encode(encoding.removesuffix('-sig'))
+    with file.open('wb') as stream:
+        if encoding == 'utf-8-sig':
+            stream.write(b'\xef\xbb\xbf')
+        for _ in range(max(size // len(block), 1)):
+            stream.write(block)
+    return file
+
+
+def close_dialogs(app: TUI):
+    """Closes dialogs, such as the one warning about mixed line endings."""
+    while len(app.screen_stack) > 1:
+        app.pop_screen()
+
+
+def time_load(benchmark, file: Path, rounds: int = 3):
+    """Times loading the `file` into the editor."""
+    async def scenario():
+        async with TUI().run_test(size=(100, 30)) as pilot:
+            editor = pilot.app.editor
+            for _ in range(rounds):
+                editor.file = None
+                with benchmark.timing():
+                    editor.file = file
+                close_dialogs(pilot.app)
+                await pilot.pause()
+    asyncio.run(scenario())
+    benchmark.check()
+
+
+@mark.parametrize('size', sizes)
+def test_load_size(benchmark, folder, size):
+    time_load(benchmark, synthetic(folder, sizes[size]))
+
+
+@mark.parametrize('newline', newlines)
+@mark.parametrize('encoding', ['utf-8', 'utf-8-sig'])
+def test_load_format(benchmark, folder, newline, encoding):
+    file = synthetic(folder, sizes['1MB'], newlines[newline], encoding)
+    time_load(benchmark, file)
+
+
+@mark.parametrize('suffix', ['.txt', '.py'])
+def test_keystroke(benchmark, folder, suffix):
+    file = synthetic(folder, sizes['1MB'], suffix=suffix)
+
+    async def scenario():
+        app = TUI()
+        app.file = file
+        async with app.run_test(size=(100, 30)) as pilot:
+            await pilot.pause()
+            for _ in range(20):
+                with benchmark.timing():
+                    await pilot.press('a')
+    asyncio.run(scenario())
+    benchmark.check()
+
+
+@mark.parametrize('suffix', ['.txt', '.py'])
+def test_page_down(benchmark, folder, suffix):
+    file = synthetic(folder, sizes['1MB'], suffix=suffix)
+
+    async def scenario():
+        app = TUI()
+        app.file = file
+        async with app.run_test(size=(100, 30)) as pilot:
+            await pilot.pause()
+            for _ in range(20):
+                with benchmark.timing():
+                    await pilot.press('pagedown')
+    asyncio.run(scenario())
+    benchmark.check()
+
+
+def test_trim_whitespace(benchmark, folder):
+    file = synthetic(folder, sizes['1MB'], trailing=' \t')
+
+    async def scenario():
+        async with TUI().run_test(size=(100, 30)) as pilot:
+            editor = pilot.app.editor
+            for _ in range(3):
+                editor.file = None
+                editor.file = file
+                with benchmark.timing():
+                    editor.action_trim_whitespace()
+                    await pilot.pause()
+    asyncio.run(scenario())
+    benchmark.check()
+
+
+@mark.parametrize('where', ['start', 'end'])
+def test_save(benchmark, folder, where):
+    file = synthetic(folder, sizes['1MB'])
+    copy = folder / f'save-{where}.txt'
+    copy.write_bytes(file.read_bytes())
+
+    async def scenario():
+        app = TUI()
+        app.file = copy
+        async with app.run_test(size=(100, 30)) as pilot:
+            await pilot.pause()
+            editor = app.editor
+            for _ in range(5):
+                location = (0, 0) if where == 'start' else editor.document.end
+                editor.insert('a', location)
+                with benchmark.timing():
+                    editor.action_save()
+                    await editor.wait_for_save()
+                assert not editor.modified
+    asyncio.run(scenario())
+    benchmark.check()
+
+
+def test_modified(benchmark, folder):
+    file = synthetic(folder, sizes['1MB'])
+
+    async def scenario():
+        app = TUI()
+        app.file = file
+        async with app.run_test(size=(100, 30)) as pilot:
+            await pilot.pause()
+            await pilot.press('a')
+            benchmark(lambda: app.editor.modified, rounds=1000)
+    asyncio.run(scenario())
+
+
+def test_settings_compose(benchmark):
+    async def scenario():
+        async with TUI().run_test(size=(100, 30)) as pilot:
+            for _ in range(5):
+                with benchmark.timing():
+                    await pilot.app.push_screen(Settings(id='settings'))
+                    await pilot.pause()
+                pilot.app.pop_screen()
+                await pilot.pause()
+    asyncio.run(scenario())
+    benchmark.check()
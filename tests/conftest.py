@@ -0,0 +1,33 @@
+﻿"""Configuration of the test suite"""
+
+from pytest import mark
+
+
+def pytest_addoption(parser):
+    """Adds command-line options for running the benchmarks."""
+    parser.addoption(
+        '--benchmarks', action='store_true',
+        help='Run the benchmarks in `tests/benchmarks`, which are skipped '
+             'by default.',
+    )
+    parser.addoption(
+        '--save-baselines', action='store_true',
+        help='Save the benchmark results as the new baselines.',
+    )
+
+
+def pytest_configure(config):
+    """Registers the marker for benchmarks."""
+    config.addinivalue_line(
+        'markers', 'benchmark: performance test, only run with --benchmarks',
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skips the benchmarks unless asked to run them."""
+    if config.getoption('--benchmarks'):
+        return
+    skip = mark.skip(reason='Benchmarks only run with --benchmarks.')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,88 @@
+﻿"""Tests the `archive` module."""
+
+from ked         import archive
+from ked.archive import Archive
+
+from textual.document._edit     import Edit
+from textual.document._document import EditResult
+from textual.widgets.text_area  import Selection
+
+from pytest import fixture
+
+import os
+
+
+@fixture(autouse=True)
+def archive_folder(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive, 'folder', tmp_path / 'history')
+    monkeypatch.setattr(archive, 'page_batches', 2)
+
+
+def typed(text: str, replaced: str = '') -> Edit:
+    edit = Edit(text, (0, 0), (0, len(replaced)), False)
+    edit._edit_result = EditResult((0, len(text)), replaced)
+    edit._original_selection = Selection((0, 0), (0, len(replaced)))
+    return edit
+
+
+def texts(batches: list[archive.Batch]) -> list[list[str]]:
+    return [[edit.text for edit in batch] for batch in batches]
+
+
+def test_archive(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('abc', encoding='utf-8')
+    loaded  = Archive(file, file.stat())
+    batches = [[typed('a'), typed('b')], [typed('ünï\n', 'x')], [typed('c')]]
+    loaded.store(file.stat(), batches, complete=True)
+    assert loaded.lengths == []
+    restored = Archive(file, file.stat())
+    assert restored.lengths is None
+    page = restored.pop()
+    assert texts(page) == [['c']]
+    edit = restored.pop()[1][0]
+    assert (edit.text, edit.from_location, edit.to_location) == (
+        'ünï\n', (0, 0), (0, 1),
+    )
+    assert edit._edit_result.replaced_text == 'x'
+    assert edit._original_selection == Selection((0, 0), (0, 1))
+    assert restored.pop() == []
+    # Pages not yet popped are kept when more edits are archived.
+    restored = Archive(file, file.stat())
+    restored.open()
+    file.write_text('abcd', encoding='utf-8')
+    restored.store(file.stat(), [[typed('d')]], complete=True)
+    restored = Archive(file, file.stat())
+    assert texts(restored.pop()) == [['d']]
+    assert texts(restored.pop()) == [['c']]
+    assert len(restored.pop()) == 2
+    # Unless the history in memory is incomplete.
+    restored = Archive(file, file.stat())
+    restored.store(file.stat(), [[typed('e')]], complete=False)
+    restored = Archive(file, file.stat())
+    assert texts(restored.pop()) == [['e']]
+    assert restored.pop() == []
+
+
+def test_archive_applies(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('abc', encoding='utf-8')
+    Archive(file, file.stat()).store(file.stat(), [[typed('a')]], True)
+    # Content is the same, just the modification time changed.
+    os.utime(file, ns=(0, 0))
+    assert Archive(file, file.stat()).pop()
+    # Content changed, but not the size.
+    file.write_text('xyz', encoding='utf-8')
+    os.utime(file, ns=(0, 0))
+    assert Archive(file, file.stat()).pop() == []
+    # Files above the limit are not digested, so touching them is a change.
+    Archive(file, file.stat(), 2).store(file.stat(), [[typed('a')]], True)
+    head = archive.archive_path(file).read_bytes()[len(archive.magic):]
+    assert archive.header.unpack_from(head)[2] == archive.no_digest
+    assert Archive(file, file.stat(), 2).pop()
+    os.utime(file, ns=(10**9, 10**9))
+    assert Archive(file, file.stat(), 2).pop() == []
+    # No history, or nothing left to archive.
+    assert Archive(file, None).pop() == []
+    Archive(file, None).store(file.stat(), [], True)
+    assert not archive.archive_path(file).exists()
@@ -0,0 +1,47 @@
+﻿"""Tests the `cli` module."""
+
+from ked.cli import view
+from ked.cli import edit
+from ked.cli import check_exists
+
+import sys
+import subprocess
+
+
+budget = 0.5
+"""maximum time, in seconds, that importing the command-line interface takes"""
+
+
+def import_times(module: str) -> dict[str, float]:
+    """Imports `module` in a new interpreter, timing each import."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        (_, cumulative, name) = line.split('|')
+        if cumulative.strip().isdigit():
+            # Cumulative time is given in microseconds.
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_time():
+    times = import_times('ked.cli')
+    assert 'ked.config' in times
+    assert 'ked.tui' not in times
+    assert not [name for name in times if name.startswith('textual')]
+    assert not [name for name in times if name.startswith('tree_sitter')]
+    assert times['ked.cli'] < budget
+
+
+def test_check_exists(tmp_path):
+    file = tmp_path / 'file.txt'
+    assert view(file) == 1
+    assert edit(file) == 1
+    assert view(tmp_path) == 2
+    file.touch()
+    assert check_exists(file) == 0
@@ -35,6 +35,13 @@ def test_query():
     assert config.query(('theme', 'app'),    source='site') == 'site_theme'
     assert config.query(('theme', 'app'),    source='all')  == 'site_theme'
     assert config.query(('theme', 'syntax'), source='all')  == 'css'
+    # Sections are returned as dictionaries, merged from all sources.
+    theme = {'app': 'site_theme', 'syntax': 'css'}
+    assert config.query(('theme',), source='all') == theme
+    assert config.query(('theme',), source='site') == {'app': 'site_theme'}
+    assert 'save' in config.query(('keys',))
+    with raises(KeyError):
+        config.query(('theme', 'app', 'none'))
 
 
 def test_store():
@@ -50,3 +57,46 @@ def test_store():
 
     config.store(('theme', 'app'), 'new_theme', target='site')
     assert config.query(('theme', 'app'), source='site') == 'new_theme'
+
+
+def test_snapshot():
+    config.store(('theme', 'syntax'), 'user_syntax', target='user')
+    settings = config.snapshot()
+    assert settings['theme', 'app'] == 'user_theme'
+    assert settings['theme', 'syntax'] == 'user_syntax'
+    assert settings['limits', 'large_file'] == 50
+    assert ('theme',) not in settings
+    assert config.snapshot() is settings
+    with raises(TypeError):
+        settings['theme', 'app'] = 'other_theme'
+    assert config.snapshot('default')['theme', 'syntax'] == 'css'
+    config.store(('theme', 'app'), 'other_theme', target='user')
+    assert config.snapshot() is not settings
+    assert config.query(('theme', 'app')) == 'other_theme'
+
+
+def test_external_change():
+    settings = config.snapshot()
+    default  = config.load('default')
+    file = config.user_dir / config.file_name
+    file.write_text('theme:\n    app: "changed_theme"\n', encoding='UTF-8-sig')
+    assert config.query(('theme', 'app')) == 'changed_theme'
+    assert config.query(('theme', 'syntax')) == 'css'
+    assert config.snapshot() is not settings
+    assert config.load('default') is default
+    file.unlink()
+    assert config.query(('theme', 'app')) == 'new_theme'
+
+
+def test_store_many():
+    site = config.load('site')
+    config.store_many({
+        ('keys', 'save'): 'ctrl+w',
+        ('keys', 'quit_app'): 'ctrl+x',
+    })
+    assert config.query(('keys', 'save')) == 'ctrl+w'
+    assert config.query(('keys', 'quit_app')) == 'ctrl+x'
+    assert config.load('site') is site
+    file = config.user_dir / config.file_name
+    assert file.read_bytes().startswith(b'\xef\xbb\xbf')
+    assert list(config.user_dir.iterdir()) == [file]
@@ -0,0 +1,54 @@
+﻿"""Tests the `detection` module."""
+
+from ked.detection import detect_encoding
+from ked.detection import fallback_encoding
+from ked.detection import is_ascii_compatible
+from ked.detection import is_binary
+
+
+def test_boms():
+    text = 'text with ünïcödé'
+    assert detect_encoding(text.encode('utf-8-sig')) == 'utf-8-sig'
+    assert detect_encoding(text.encode('utf-16')) == 'utf-16'
+    assert detect_encoding(text.encode('utf-32')) == 'utf-32'
+    assert detect_encoding(b'\xfe\xff\x00a') == 'utf-16'
+
+
+def test_utf8():
+    text = 'text with ünïcödé'.encode()
+    assert detect_encoding(b'') == 'utf-8'
+    assert detect_encoding(b'plain ASCII') == 'utf-8'
+    assert detect_encoding(text) == 'utf-8'
+    assert detect_encoding(text[:-1], final=False) == 'utf-8'
+    assert detect_encoding(text[:-1], final=True) != 'utf-8'
+
+
+def test_declaration():
+    assert detect_encoding(b'# coding: latin-1\n\xe9') == 'iso8859-1'
+    assert detect_encoding(b'#!/bin/python\n# -*- coding: cp1251 -*-') == (
+        'cp1251'
+    )
+    assert detect_encoding(b'code = 1\n# coding: latin-1\n') == 'utf-8'
+    assert detect_encoding(b'# coding: no-such-codec\n') == 'utf-8'
+
+
+def test_fallback():
+    assert detect_encoding('“quoted” text'.encode('cp1252')) == 'cp1252'
+    assert detect_encoding('Ünïcödé'.encode('latin-1')) == 'iso8859-1'
+    assert fallback_encoding(b'\x81\x93') == 'iso8859-1'
+    assert fallback_encoding(b'\x80\x93') == 'cp1252'
+
+
+def test_is_ascii_compatible():
+    assert is_ascii_compatible('utf-8')
+    assert is_ascii_compatible('utf-8-sig')
+    assert is_ascii_compatible('latin-1')
+    assert not is_ascii_compatible('utf-16')
+    assert not is_ascii_compatible('utf-32-be')
+    assert not is_ascii_compatible('no-such-encoding')
+
+
+def test_is_binary():
+    assert is_binary(b'\x7fELF\x02\x01\x01\0', 'utf-8')
+    assert not is_binary(b'plain text\n', 'utf-8')
+    assert not is_binary('text'.encode('utf-16'), 'utf-16')
@@ -0,0 +1,226 @@
+﻿"""Tests the `document` module."""
+
+from ked import document
+
+from textual.document._document              import Document
+from textual.document._syntax_aware_document import SyntaxAwareDocument
+from textual._tree_sitter                    import get_language
+
+from pytest import fixture
+
+from random import Random
+
+
+@fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(document, 'block_size', 16)
+    monkeypatch.setattr(document, 'index_step', 32)
+
+
+def mapped(folder, text: str, encoding: str = 'utf-8') -> document.MappedLines:
+    file = folder / 'mapped.txt'
+    file.write_bytes(text.encode(encoding))
+    return document.MappedLines(file, encoding)
+
+
+def test_mapped_lines(tmp_path):
+    texts = (
+        'one line',
+        'first\nsecond\nthird\n',
+        'first\r\nsecond\r\nthird',
+        'first\rsecond\rthird\r',
+        'mixed\rline\r\nbreaks\n\r\n\rat the end\r',
+        'crlf across the\r\nblock boundary\r\n',
+        'long line with cr at its end\rshort\r',
+        'a line that is much longer than the block size\nshort\n',
+        '\n\n\nempty lines\n\n',
+        'ünïcödé\nlines\n' * 10,
+    )
+    for text in texts:
+        lines = mapped(tmp_path, text)
+        assert len(lines) == 0
+        lines.index_all()
+        assert lines.indexed
+        assert list(lines) == document.split_lines(text)
+        assert lines[-1] == document.split_lines(text)[-1]
+
+
+def test_mapped_lines_bom(tmp_path):
+    lines = mapped(tmp_path, 'first\nsecond\n', encoding='utf-8-sig')
+    lines.index_all()
+    assert list(lines) == ['first', 'second', '']
+
+
+def test_mapped_document(tmp_path):
+    text  = ''.join(f'line {n}\n' for n in range(20))
+    lines = mapped(tmp_path, text)
+    lines.index_all()
+    mapped_document = document.MappedDocument(lines, '\n')
+    default_document = Document(text)
+    edits = (
+        ((0, 0), (0, 0), 'inserted '),
+        ((3, 2), (5, 4), 'replaced'),
+        ((7, 0), (9, 0), ''),
+        ((10, 1), (10, 1), 'new\nlines\n'),
+        ((0, 0), (18, 0), 'all\ngone'),
+    )
+    for (start, end, insert) in edits:
+        result = mapped_document.replace_range(start, end, insert)
+        expected = default_document.replace_range(start, end, insert)
+        assert result == expected
+        assert mapped_document.lines == default_document.lines
+        assert mapped_document.end == default_document.end
+        assert mapped_document.get_text_range((1, 0), (1, 2)) == (
+            default_document.get_text_range((1, 0), (1, 2))
+        )
+
+
+def random_edits(reference: Document, count: int, seed: int = 0):
+    random = Random(seed)
+    texts  = ('', 'x', 'ü', '\n', 'ab\ncd', '"quoted"', '\n\n')
+    for _ in range(count):
+        lines = reference.line_count
+        top_row    = random.randrange(lines)
+        top_column = random.randrange(len(reference[top_row]) + 1)
+        bottom_row = min(lines - 1, top_row + random.randrange(3))
+        if bottom_row == top_row:
+            bottom_column = random.randrange(
+                top_column, len(reference[bottom_row]) + 1
+            )
+        else:
+            bottom_column = random.randrange(len(reference[bottom_row]) + 1)
+        text = random.choice(texts)
+        yield ((top_row, top_column), (bottom_row, bottom_column), text)
+
+
+def test_piece_table():
+    text = ''.join(f'line {n}\n' for n in range(100))
+    piece_table = document.PieceTable.from_text(text)
+    default_document = Document(text)
+    for (start, end, insert) in random_edits(default_document, 500):
+        result = piece_table.replace_range(start, end, insert)
+        expected = default_document.replace_range(start, end, insert)
+        assert result == expected
+    assert piece_table.lines == default_document.lines
+    assert piece_table.text == default_document.text
+    assert piece_table.line_count == default_document.line_count
+    assert piece_table.end == default_document.end
+    assert piece_table.get_size(4).height == default_document.line_count
+    assert piece_table.original[:3] == ['line 0', 'line 1', 'line 2']
+
+
+def test_piece_table_empty():
+    piece_table = document.PieceTable.from_text('')
+    assert piece_table.lines == ['']
+    piece_table.replace_range((0, 0), (0, 0), 'text\n')
+    assert piece_table.lines == ['text', '']
+
+
+def test_syntax_aware_piece_table():
+    language = get_language('python')
+    text = 'def function(argument):\n    return "string"\n' * 20
+    piece_table = document.SyntaxAwarePieceTable.from_text(text, language)
+    syntax_document = SyntaxAwareDocument(text, language)
+    for (start, end, insert) in random_edits(syntax_document, 200):
+        piece_table.replace_range(start, end, insert)
+        syntax_document.replace_range(start, end, insert)
+        assert piece_table.byte_offset(start) == (
+            syntax_document._location_to_byte_offset(start)
+        )
+    assert piece_table.lines == syntax_document.lines
+    query = '(identifier) @name (string) @string'
+    captures = piece_table.query_syntax_tree(piece_table.prepare_query(query))
+    expected = syntax_document.query_syntax_tree(
+        syntax_document.prepare_query(query)
+    )
+    for name in ('name', 'string'):
+        assert sorted(node.byte_range for node in captures[name]) == sorted(
+            node.byte_range for node in expected[name]
+        )
+
+
+def test_mapped_lines_offset(tmp_path):
+    text  = ''.join(f'line {n}\r\n' for n in range(20))
+    lines = mapped(tmp_path, text, encoding='utf-8-sig')
+    lines.index_all()
+    for index in range(len(lines)):
+        prefix = '\r\n'.join(lines[:index]) + ('\r\n' if index else '')
+        assert lines.offset(index) == len(prefix.encode('utf-8-sig'))
+    breaks = ('\r', '\n', '\r\n')
+    text   = ''.join(f'line {n}{breaks[n % 3]}' for n in range(20))
+    lines  = mapped(tmp_path, text)
+    lines.index_all()
+    assert len(lines) == 21
+    for index in range(len(lines)):
+        prefix = ''.join(f'line {n}{breaks[n % 3]}' for n in range(index))
+        assert lines.offset(index) == len(prefix)
+
+
+def test_piece_table_snapshot():
+    text = ''.join(f'line {n}\n' for n in range(100))
+    piece_table = document.PieceTable.from_text(text)
+    snapshot = piece_table.snapshot()
+    piece_table.replace_range((50, 2), (50, 2), 'edit')
+    assert snapshot.text == text
+    assert piece_table.common_prefix(snapshot) == 50
+    assert piece_table.common_suffix(snapshot) == 50
+    assert list(piece_table.iter_lines(98)) == ['line 98', 'line 99', '']
+    piece_table.replace_range((20, 0), (30, 0), '')
+    assert piece_table.common_prefix(snapshot) == 20
+    assert piece_table.common_suffix(snapshot) == 50
+    assert snapshot.common_prefix(snapshot) == 101
+    assert snapshot.common_suffix(snapshot) == 101
+    other = document.PieceTable.from_text(text)
+    assert other.common_prefix(snapshot) == 0
+    assert other.common_suffix(snapshot) == 0
+
+
+def test_line_offset(tmp_path):
+    text = ''.join(f'lïne {n}\n' for n in range(20))
+    for (encoding, newline) in (('utf-8', '\n'), ('utf-16', '\r\n')):
+        piece_table = document.PieceTable.from_text(text)
+        piece_table.replace_range((5, 0), (7, 0), 'new\nlines\n\n')
+        lines = piece_table.lines
+        for index in range(len(lines)):
+            prefix = newline.join(lines[:index]) + (newline if index else '')
+            assert piece_table.line_offset(index, encoding, newline) == (
+                len(prefix.encode(encoding))
+            )
+    lines = mapped(tmp_path, text.replace('ï', 'i'))
+    lines.index_all()
+    mapped_document = document.MappedDocument(lines, '\n')
+    mapped_document.replace_range((5, 0), (7, 0), 'new\n')
+    mapped_document.replace_range((20, 0), (20, 0), 'end')
+    for index in range(mapped_document.line_count):
+        prefix = '\n'.join(mapped_document[:index]) + ('\n' if index else '')
+        assert mapped_document.line_offset(index, 'utf-8', '\n') == len(
+            prefix.encode('utf-8')
+        )
+
+
+def test_detect_newlines():
+    assert document.detect_newlines(b'no line break') is None
+    assert document.detect_newlines(b'a\nb\n') == '\n'
+    assert document.detect_newlines(b'a\r\nb\r\n') == '\r\n'
+    assert document.detect_newlines(b'a\rb\r') == '\r'
+    assert document.detect_newlines(b'a\r\nb\n') == ('\n', '\r\n')
+
+
+def test_hex_lines(tmp_path):
+    file = tmp_path / 'binary'
+    file.write_bytes(bytes(range(40)))
+    lines = document.HexLines(file)
+    assert len(lines) == 3
+    assert lines[0] == (
+        '00000000  00 01 02 03 04 05 06 07  08 09 0a 0b 0c 0d 0e 0f  '
+        '|................|'
+    )
+    assert lines[-1] == (
+        '00000020  20 21 22 23 24 25 26 27                           '
+        '| !"#$%&\'        |'
+    )
+    assert all(len(line) == lines.width for line in lines)
+    hex_document = document.HexDocument(lines, '\n')
+    assert hex_document.get_size(4).width == lines.width
+    file.write_bytes(b'')
+    assert list(document.HexLines(file)) == [lines.format(b'', 0)]
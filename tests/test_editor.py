@@ -0,0 +1,125 @@
+﻿"""Tests the `editor` module."""
+
+from ked          import config
+from ked          import journal
+from ked          import archive
+from ked.tui      import TUI
+from ked.document import MappedDocument
+
+from textual.widgets.text_area import Selection
+
+from pytest import fixture
+
+import asyncio
+from pathlib import Path
+
+
+@fixture(autouse=True)
+def user_folders(monkeypatch, tmp_path):
+    monkeypatch.setattr(config,  'user_dir', tmp_path / 'user')
+    monkeypatch.setattr(config,  'site_dir', tmp_path / 'site')
+    monkeypatch.setattr(journal, 'folder',   tmp_path / 'journals')
+    monkeypatch.setattr(archive, 'folder',   tmp_path / 'history')
+
+
+def trim(file: Path, text: str, selection: Selection) -> dict:
+    """Trims white-space in the `file` with `text`, reports what happened."""
+    file.write_text(text, encoding='utf-8')
+    report = {'notes': []}
+    notes  = report['notes']
+
+    async def scenario():
+        app = TUI()
+        app.file = file
+        async with app.run_test(size=(80, 24)) as pilot:
+            await pilot.pause()
+            editor = app.editor
+            editor.notify = lambda message, **_: notes.append(message)
+            editor.selection = selection
+            editor.action_trim_whitespace()
+            await pilot.pause()
+            report['trimmed']   = editor.text
+            report['selection'] = editor.selection
+            report['modified']  = editor.modified
+            editor.undo()
+            await pilot.pause()
+            report['undone'] = editor.text
+            report['unmodified'] = not editor.modified
+
+    asyncio.run(scenario())
+    return report
+
+
+def test_trim_whitespace(tmp_path):
+    file = tmp_path / 'file.txt'
+    selection = Selection((0, 1), (1, 1))
+    report = trim(file, 'a  \nb\t\nc\n\n\n', selection)
+    assert report['trimmed'] == 'a\nb\nc\n'
+    assert report['notes'] == [
+        'Trimmed trailing white-space on 2 lines.',
+        'Deleted 2 trailing blank lines.',
+    ]
+    assert report['selection'] == selection
+    assert report['modified']
+    # All of it is undone in one step.
+    assert report['undone'] == 'a  \nb\t\nc\n\n\n'
+    assert report['unmodified']
+
+
+def test_trim_whitespace_append(tmp_path):
+    file = tmp_path / 'file.txt'
+    selection = Selection((1, 0), (1, 1))
+    report = trim(file, 'a\nb', selection)
+    assert report['trimmed'] == 'a\nb\n'
+    assert report['notes'] == ['Appended a blank line.']
+    assert report['selection'] == selection
+    assert report['undone'] == 'a\nb'
+
+
+def test_trim_whitespace_nothing(tmp_path):
+    file = tmp_path / 'file.txt'
+    selection = Selection((0, 0), (1, 1))
+    report = trim(file, 'a\nb\n', selection)
+    assert report['trimmed'] == 'a\nb\n'
+    assert report['notes'] == ['No trailing white-space to trim.']
+    assert report['selection'] == selection
+    assert not report['modified']
+
+
+def test_save_mapped(tmp_path, monkeypatch):
+    config.user_dir.mkdir()
+    settings = config.user_dir / config.file_name
+    settings.write_text('limits:\n    large_file: 0\n', encoding='utf-8')
+    file = tmp_path / 'file.txt'
+    file.write_text('first\nsecond\n', encoding='utf-8')
+    report = {}
+
+    async def scenario():
+        app = TUI()
+        app.file = file
+        async with app.run_test(size=(80, 24)) as pilot:
+            await pilot.pause()
+            editor = app.editor
+            report['mapped'] = isinstance(editor.document, MappedDocument)
+            mapped  = editor.document.original.mmap
+            replace = Path.replace
+
+            # Like on Windows, refuse to replace the file while it is mapped.
+            def refuse(self, target):
+                if not mapped.closed:
+                    raise PermissionError('File is mapped.')
+                return replace(self, target)
+
+            monkeypatch.setattr(Path, 'replace', refuse)
+            editor.insert('new\n', (0, 0))
+            editor.action_save()
+            await editor.wait_for_save()
+            await pilot.pause()
+            report['modified'] = editor.modified
+            report['text']     = editor.text
+
+    asyncio.run(scenario())
+    assert report['mapped']
+    assert not report['modified']
+    assert report['text'] == 'new\nfirst\nsecond\n'
+    assert file.read_text(encoding='utf-8') == 'new\nfirst\nsecond\n'
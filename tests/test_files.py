@@ -0,0 +1,122 @@
+﻿"""Tests the `files` module."""
+
+from ked import files
+from ked import loading
+from ked import document
+
+from pytest import fixture
+from pytest import raises
+
+import os
+from copy    import copy
+from pathlib import Path
+
+
+@fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(files, 'chunk_size', 2)
+
+
+def test_save_lines(tmp_path):
+    file  = tmp_path / 'file.txt'
+    lines = ['first line', 'second', '', 'ünïcödé', '']
+    files.save_lines(file, lines, 'utf-8', '\n')
+    assert file.read_bytes() == '\n'.join(lines).encode('utf-8')
+    files.save_lines(file, lines, 'utf-16', '\r\n')
+    assert file.read_bytes() == '\r\n'.join(lines).encode('utf-16')
+    files.save_lines(file, lines, 'utf-8-sig', '\n')
+    assert file.read_bytes().count(b'\xef\xbb\xbf') == 1
+    files.save_lines(file, [''], 'utf-8-sig', '\n')
+    assert file.read_bytes() == b'\xef\xbb\xbf'
+    assert [path.name for path in tmp_path.iterdir()] == ['file.txt']
+
+
+def test_save_tail(tmp_path):
+    file = tmp_path / 'file.txt'
+    for (encoding, newline) in (('utf-8-sig', '\n'), ('utf-16', '\r\n')):
+        files.save_lines(file, ['first', 'second', 'third'], encoding, newline)
+        offset = len(f'first{newline}'.encode(encoding))
+        lines  = ['2nd', 'ünïcödé', '']
+        files.save_tail(file, offset, lines, encoding, newline)
+        text = file.read_bytes().decode(encoding)
+        assert text == newline.join(['first', *lines])
+        files.save_tail(file, offset, ['last'], encoding, newline)
+        assert file.read_bytes().decode(encoding) == f'first{newline}last'
+
+
+def test_save_tail_separators(tmp_path):
+    # Lines are not split at characters such as the Unicode line separator.
+    # Otherwise the offset of the tail would be off, and data overwritten.
+    file = tmp_path / 'file.txt'
+    file.write_bytes('first\u2028second\nthird\nfourth'.encode('utf-8'))
+    with file.open('rb') as stream:
+        content = loading.load(stream)
+    piece_table = document.PieceTable(content.lines, '\n')
+    saved = piece_table.snapshot()
+    piece_table.replace_range((2, 6), (2, 6), 'X')
+    unchanged = min(piece_table.common_prefix(saved), 2)
+    offset = piece_table.line_offset(unchanged, 'utf-8', '\n')
+    lines  = piece_table.iter_lines(unchanged)
+    files.save_tail(file, offset, lines, 'utf-8', '\n')
+    text = file.read_bytes().decode('utf-8')
+    assert text == 'first\u2028second\nthird\nfourthX'
+
+
+def test_save_lines_failure(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('original', encoding='utf-8')
+
+    def lines():
+        yield 'new text that is longer than a chunk'
+        raise KeyboardInterrupt
+
+    with raises(KeyboardInterrupt):
+        files.save_lines(file, lines(), 'utf-8', '\n')
+    with raises(UnicodeEncodeError):
+        files.save_lines(file, ['ünïcödé'], 'ascii', '\n')
+    assert file.read_text(encoding='utf-8') == 'original'
+    assert [path.name for path in tmp_path.iterdir()] == ['file.txt']
+
+
+def test_save_lines_permissions(tmp_path):
+    if os.name != 'posix':
+        return
+    file = tmp_path / 'file.txt'
+    file.write_text('original', encoding='utf-8')
+    file.chmod(0o640)
+    inode = file.stat().st_ino
+    link = tmp_path / 'link.txt'
+    link.symlink_to(file)
+    files.save_lines(link, ['new'], 'utf-8', '\n')
+    assert link.is_symlink()
+    assert file.read_text(encoding='utf-8') == 'new'
+    assert file.stat().st_mode & 0o777 == 0o640
+    assert file.stat().st_ino != inode
+
+
+def test_save_lines_mapped(tmp_path, monkeypatch):
+    file = tmp_path / 'file.txt'
+    file.write_text('first\nsecond\n', encoding='utf-8')
+    lines = document.MappedLines(file, 'utf-8')
+    lines.index_all()
+    clone = copy(lines)
+    mapped = lines.mmap
+
+    # Like on Windows, refuse to replace the file while it is mapped.
+    replace = Path.replace
+
+    def refuse(self, target):
+        if not mapped.closed:
+            raise PermissionError('File is mapped.')
+        return replace(self, target)
+    monkeypatch.setattr(Path, 'replace', refuse)
+
+    with raises(PermissionError):
+        files.save_lines(file, ['new'], 'utf-8', '\n')
+    assert file.read_text(encoding='utf-8') == 'first\nsecond\n'
+    files.save_lines(file, ['new', *lines], 'utf-8', '\n', lines.detach)
+    assert file.read_text(encoding='utf-8') == 'new\nfirst\nsecond\n'
+    # Lines are still read from the copy of the file as it was mapped.
+    assert clone.mmap is lines.mmap
+    assert list(clone) == ['first', 'second', '']
+    assert [path.name for path in tmp_path.iterdir()] == ['file.txt']
@@ -0,0 +1,94 @@
+﻿"""Tests the `highlighting` module."""
+
+from ked import highlighting
+from ked.document import SyntaxAwarePieceTable
+
+from textual.widgets      import TextArea
+from textual._tree_sitter import get_language
+
+from pytest import fixture
+
+from types       import SimpleNamespace
+from collections import defaultdict
+
+
+text = '''\
+def function(argument):
+    """
+    Docstring that spans
+    several lines, across
+    the boundary of a block
+    """
+    return argument + 1
+
+
+class Class:
+    number = 42
+    string = 'text'
+'''
+
+
+@fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(highlighting, 'block_size', 4)
+    monkeypatch.setattr(highlighting, 'margin', 1)
+    monkeypatch.setattr(highlighting, 'max_blocks', 2)
+
+
+def document() -> SyntaxAwarePieceTable:
+    return SyntaxAwarePieceTable.from_text(text, get_language('python'))
+
+
+def query(document: SyntaxAwarePieceTable):
+    return document.prepare_query(
+        TextArea._get_builtin_highlight_query('python')
+    )
+
+
+def expected(document: SyntaxAwarePieceTable) -> dict:
+    """Returns highlights as Textual's text area computes them."""
+    text_area = SimpleNamespace(
+        document         = document,
+        _highlight_query = query(document),
+        _highlights      = defaultdict(list),
+        _line_cache      = {},
+    )
+    TextArea._build_highlight_map(text_area)
+    return text_area._highlights
+
+
+def test_update():
+    doc = document()
+    highlights = defaultdict(list)
+    highlighter = highlighting.Highlighter(doc, query(doc), highlights)
+    reference = expected(doc)
+    assert highlighter.update(5, 6)
+    assert list(highlighter.blocks) == [1]
+    for row in range(4, 8):
+        assert sorted(highlights[row]) == sorted(reference[row])
+    assert not highlights.get(0)
+    assert not highlighter.update(5, 6)
+    assert highlighter.update(0, 12)
+    assert list(highlighter.blocks) == [2, 3]
+    assert not highlights.get(5)
+    for row in range(8, 12):
+        assert sorted(highlights[row]) == sorted(reference[row])
+
+
+def test_invalidate():
+    doc = document()
+    highlights = defaultdict(list)
+    highlighter = highlighting.Highlighter(doc, query(doc), highlights)
+    highlighter.update(9, 11)
+    assert list(highlighter.blocks) == [2, 3]
+    doc.replace_range((10, 13), (10, 15), '43')
+    highlighter.invalidate()
+    assert list(highlighter.blocks) == [3]
+    highlighter.update(9, 11)
+    doc.replace_range((0, 0), (0, 0), '\n')
+    highlighter.invalidate()
+    assert list(highlighter.blocks) == []
+    highlighter.update(0, 13)
+    reference = expected(doc)
+    for row in range(8, 14):
+        assert sorted(highlights[row]) == sorted(reference[row])
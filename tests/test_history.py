@@ -0,0 +1,97 @@
+﻿"""Tests the `history` module."""
+
+from ked.history import History
+
+from textual.document._edit     import Edit
+from textual.document._document import EditResult
+
+
+def typed(text: str, replaced: str = '') -> Edit:
+    edit = Edit(text, (0, 0), (0, len(replaced)), False)
+    edit._edit_result = EditResult((0, len(text)), replaced)
+    return edit
+
+
+def test_generation():
+    history = History(50, 2.0, 100)
+    assert history.generation == 0
+    history.record(typed('a'))
+    history.record(typed('b'))
+    saved = history.generation
+    assert saved != 0
+    history.checkpoint()
+    history.record(typed('c'))
+    assert history.generation != saved
+    history._pop_undo()
+    assert history.generation == saved
+    history._pop_undo()
+    assert history.generation == 0
+    history._pop_redo()
+    assert history.generation == saved
+    history.record(typed('d'))
+    assert history.generation not in (0, saved)
+    history.record(typed('', ''))
+    history._pop_undo()
+    assert history.generation == saved
+    history.clear()
+    assert history.generation not in (0, saved)
+
+
+def test_generation_overflow():
+    history = History(2, 2.0, 100)
+    for text in ('ab', 'cd', 'ef'):
+        history.record(typed(text))
+    saved = history.generation
+    history._pop_undo()
+    history._pop_undo()
+    assert history._pop_undo() is None
+    assert history.generation not in (0, saved)
+    history._pop_redo()
+    history._pop_redo()
+    assert history.generation == saved
+
+
+def test_batch():
+    history = History(50, 2.0, 100)
+    history.record(typed('a'))
+    before = history.generation
+    with history.batch():
+        history.record(typed('long text'))
+        history.record(typed('new\nline'))
+        history.record(typed('b', 'a'))
+    assert len(history.undo_stack) == 2
+    assert len(history.undo_stack[-1]) == 3
+    after = history.generation
+    history._pop_undo()
+    assert history.generation == before
+    history._pop_redo()
+    assert history.generation == after
+    history.record(typed('c'))
+    assert len(history.undo_stack) == 3
+
+
+def test_prepend():
+    history = History(3, 2.0, 100)
+    history.record(typed('ab'))
+    saved = history.generation
+    history._pop_undo()
+    loaded = history.generation
+    history.prepend([[typed('x')], [typed('y')]])
+    assert history.generation == loaded
+    assert not history.truncated
+    history._pop_undo()
+    between = history.generation
+    assert between not in (loaded, saved)
+    history._pop_undo()
+    assert history.generation not in (between, loaded, saved)
+    assert history._pop_undo() is None
+    history._pop_redo()
+    assert history.generation == between
+    history._pop_redo()
+    assert history.generation == loaded
+    history._pop_redo()
+    assert history.generation == saved
+    history.clear()
+    history.prepend([[typed(text)] for text in 'wxyz'])
+    assert len(history.undo_stack) == 3
+    assert history.truncated
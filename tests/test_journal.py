@@ -0,0 +1,92 @@
+﻿"""Tests the `journal` module."""
+
+from ked          import journal
+from ked.journal  import Journal
+from ked.document import PieceTable
+
+from pytest import fixture
+
+from random import Random
+
+
+@fixture(autouse=True)
+def journal_folder(monkeypatch, tmp_path):
+    monkeypatch.setattr(journal, 'folder', tmp_path / 'journals')
+
+
+def replay(text: str, edits: list[journal.Replacement]) -> str:
+    document = PieceTable.from_text(text)
+    for (start, end, replacement) in edits:
+        document.replace_range(start, end, replacement)
+    return document.text
+
+
+def test_journal(tmp_path):
+    file = tmp_path / 'file.txt'
+    text = 'first line\nsecond line\n'
+    file.write_text(text, encoding='utf-8')
+    document = PieceTable.from_text(text)
+    written  = Journal(file, file.stat())
+    edits  = [((1, column), (1, column), char)
+              for (column, char) in enumerate('new ')]
+    edits += [((0, 5), (0, 10), '')]
+    edits += [((0, column), (0, column + 1), '') for column in (4, 3)]
+    edits += [((2, 0), (2, 0), 'third\r\n'), ((3, 0), (3, 0), 'x')]
+    for (start, end, replacement) in edits:
+        document.replace_range(start, end, replacement)
+        written.record(start, end, replacement)
+    # Typing and backspacing are merged into one edit each.
+    assert len(written.pending) == 3
+    written.append(written.take())
+    assert not written.pending
+    written.record((0, 0), (0, 0), 'ünïcödé ')
+    written.append(written.take())
+    document.replace_range((0, 0), (0, 0), 'ünïcödé ')
+    restored = Journal(file, file.stat()).read()
+    assert len(restored) == 4
+    assert replay(text, restored) == document.text
+    # Records cut short are ignored.
+    path = written.path
+    path.write_bytes(path.read_bytes()[:-3])
+    assert len(Journal(file, file.stat()).read()) == 3
+    # Journal does not apply once the file changed.
+    file.write_text('changed', encoding='utf-8')
+    assert Journal(file, file.stat()).read() == []
+    written.discard()
+    assert not path.exists()
+    written.append(b'ignored')
+    assert not path.exists()
+
+
+def test_rewrite(tmp_path):
+    file = tmp_path / 'file.txt'
+    text = ''.join(f'line {n}\n' for n in range(100))
+    file.write_text(text, encoding='utf-8')
+    random   = Random(0)
+    document = PieceTable.from_text(text)
+    saved    = document.snapshot()
+    written  = Journal(file, file.stat())
+    written.rewrite(file.stat(), saved, document)
+    assert not written.path.exists()
+    for _ in range(50):
+        row    = random.randrange(document.line_count)
+        length = len(document[row])
+        start  = (row, random.randint(0, length))
+        end    = (row, random.randint(start[1], length))
+        insert = random.choice(('', 'x', 'new\n', '\n\n'))
+        document.replace_range(start, end, insert)
+        written.record(start, end, insert)
+        written.append(written.take())
+    size = written.size
+    written.rewrite(file.stat(), saved, document)
+    assert written.size < size
+    restored = Journal(file, file.stat()).read()
+    assert len(restored) == 1
+    assert replay(text, restored) == document.text
+    for (start, end) in (((99, 0), (100, 0)), ((0, 0), (1, 0))):
+        document = PieceTable.from_text(text)
+        saved    = document.snapshot()
+        document.replace_range(start, end, '')
+        written.rewrite(file.stat(), saved, document)
+        restored = Journal(file, file.stat()).read()
+        assert replay(text, restored) == document.text
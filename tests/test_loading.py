@@ -0,0 +1,104 @@
+﻿"""Tests the `loading` module."""
+
+from ked import loading
+
+from textual.document._document import Document
+from pytest import fixture
+
+from io import BytesIO
+
+
+@fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(loading, 'chunk_size',  8)
+    monkeypatch.setattr(loading, 'sample_size', 4)
+
+
+def test_load():
+    texts = (
+        '',
+        'one line',
+        'first\nsecond\nthird\n',
+        'first\r\nsecond\r\nthird',
+        'old\rmac\r',
+        'mixed\nline\r\nendings\r',
+        'chunk\r\nboundary\r\n',
+        '\n\n\nempty lines\n\n',
+        'ünïcödé\nlines\n' * 10,
+    )
+    for text in texts:
+        content = loading.load(BytesIO(text.encode()))
+        assert content.encoding == 'utf-8'
+        assert content.lines == Document(text).lines
+        assert content.counts['\r\n'] == text.count('\r\n')
+        assert content.counts['\n'] == text.count('\n') - text.count('\r\n')
+        assert content.counts['\r'] == text.count('\r') - text.count('\r\n')
+        assert not content.binary
+
+
+def test_load_newlines():
+    assert loading.load(BytesIO(b'a')).newlines is None
+    assert loading.load(BytesIO(b'a\r\nb')).newlines == '\r\n'
+    content = loading.load(BytesIO(b'a\nb\r\nc'))
+    assert content.newlines == ('\n', '\r\n')
+    assert content.mixed
+
+
+def test_load_sample():
+    stream = BytesIO('first\nsecond\n'.encode('utf-16'))
+    sample = stream.read(4)
+    content = loading.load(stream, sample)
+    assert content.encoding == 'utf-16'
+    assert content.lines == ['first', 'second', '']
+
+
+def test_load_fallback():
+    text = 'valid ASCII up front, then ünïcödé\n'
+    content = loading.load(BytesIO(text.encode('latin-1')))
+    assert content.encoding == 'iso8859-1'
+    assert content.lines == [text.rstrip(), '']
+    text = 'ASCII, then “quotes”'
+    content = loading.load(BytesIO(text.encode('cp1252')))
+    assert content.encoding == 'cp1252'
+    assert content.lines == [text]
+
+
+def test_load_separators():
+    text = 'first\u2028second\nform\x0cfeed\r\n\x85\x1c\r'
+    content = loading.load(BytesIO(text.encode()))
+    assert content.lines == [
+        'first\u2028second', 'form\x0cfeed', '\x85\x1c', '',
+    ]
+    assert loading.split_at_breaks('a\u2029b\n') == ['a\u2029b']
+    assert loading.split_at_breaks('\x0b') == ['\x0b']
+    assert loading.split_at_breaks('') == []
+
+
+def test_load_binary():
+    content = loading.load(BytesIO(b'some text, then \0 binary data'))
+    assert content.binary
+    content = loading.load(BytesIO('text\n'.encode('utf-16')))
+    assert not content.binary
+
+
+def test_tail(tmp_path):
+    file = tmp_path / 'file.log'
+    file.write_bytes(b'first\n')
+    with file.open('rb') as stream:
+        tail = loading.Tail(file, stream, 6, 'utf-8')
+    assert tail.read() == ''
+    with file.open('ab') as stream:
+        stream.write('ü\r'.encode()[:1])
+    assert tail.read() == ''
+    with file.open('ab') as stream:
+        stream.write('ü\r'.encode()[1:])
+    assert tail.read() == 'ü'
+    with file.open('ab') as stream:
+        stream.write(b'\nlast')
+    assert tail.read() == '\r\nlast'
+    file.write_bytes(b'truncated')
+    assert tail.read() is None
+    file.rename(tmp_path / 'file.log.1')
+    assert tail.read() == ''
+    file.write_bytes(b'first\n' * 10)
+    assert tail.read() is None
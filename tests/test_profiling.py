@@ -0,0 +1,56 @@
+﻿"""Tests the `profiling` module."""
+
+from ked import profiling
+
+from pytest import fixture
+
+import json
+
+
+@fixture(autouse=True)
+def no_phases(monkeypatch):
+    monkeypatch.setattr(profiling, 'phases', [])
+    monkeypatch.setattr(profiling, 'recording', False)
+
+
+def test_phases():
+    with profiling.phase('ignored'):
+        pass
+    assert profiling.phases == []
+    profiling.start()
+    with profiling.phase('outer'):
+        with profiling.phase('inner'):
+            pass
+        with profiling.phase('second inner'):
+            pass
+    with profiling.phase('after'):
+        pass
+    profiling.finish()
+    with profiling.phase('ignored'):
+        pass
+    assert [(name, depth) for (name, *_, depth) in profiling.ordered()] == [
+        ('imports', 0),
+        ('outer', 0),
+        ('inner', 1),
+        ('second inner', 1),
+        ('after', 0),
+        ('first paint', 0),
+    ]
+    lines = profiling.report().splitlines()
+    assert lines[0].split() == ['phase', 'start', '(ms)', 'duration', '(ms)']
+    assert lines[3].startswith('  inner ')
+
+
+def test_trace(tmp_path):
+    profiling.start()
+    with profiling.phase('phase'):
+        pass
+    profiling.finish()
+    file = tmp_path / 'trace.json'
+    profiling.save_trace(file)
+    events = json.loads(file.read_text(encoding='utf-8'))['traceEvents']
+    assert [event['name'] for event in events] == [
+        'imports', 'phase', 'first paint',
+    ]
+    assert [event['ph'] for event in events] == ['X', 'X', 'i']
+    assert events[1]['ts'] >= events[0]['ts'] + events[0]['dur']
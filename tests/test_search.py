@@ -0,0 +1,60 @@
+﻿"""Tests the `search` module."""
+
+from ked.search   import Search
+from ked.document import PieceTable
+
+from textual.document._document import Document
+
+import re
+from random import Random
+
+
+def test_scan():
+    text = 'foo bar\nbaz\nfood, foo\n\nfo\nfoo'
+    document = PieceTable.from_text(text)
+    found = Search(document, re.compile(r'fo+'))
+    assert found.scan(3) == 3
+    assert not found.done
+    found.scan(3)
+    assert found.done
+    assert found.matches == [
+        (0, 0, 3), (2, 0, 3), (2, 6, 9), (4, 0, 2), (5, 0, 3),
+    ]
+    assert found.spans(2) == [(0, 3), (6, 9)]
+    assert found.spans(3) == []
+    assert found.following((2, 0)) == (2, 6, 9)
+    assert found.following((2, 0), inclusive=True) == (2, 0, 3)
+    assert found.following((5, 0)) is None
+    assert found.preceding((2, 6)) == (2, 0, 3)
+    assert found.preceding((0, 0)) is None
+    empty = Search(document, re.compile(r'x*'))
+    empty.scan()
+    assert empty.matches == []
+
+
+def test_update():
+    random = Random(0)
+    texts  = ('', 'x', 'ax', '\n', 'xa\nax', 'a\n\nb', '\n\n')
+    text   = '\n'.join(random.choice(('ax', 'b', 'xx', '')) for _ in range(50))
+    document  = PieceTable.from_text(text)
+    reference = Document(text)
+    pattern   = re.compile(r'a?x')
+    found = Search(document, pattern)
+    for step in range(300):
+        if step % 10 == 0:
+            found.scan(3)
+        edits = 1 + random.randrange(3)
+        for _ in range(edits):
+            lines = reference.line_count
+            top   = random.randrange(lines)
+            bottom = min(lines - 1, top + random.randrange(3))
+            end = (bottom, len(reference[bottom]))
+            insert = random.choice(texts)
+            document.replace_range((top, 0), end, insert)
+            reference.replace_range((top, 0), end, insert)
+        found.update(document.edited_rows)
+        document.edited_rows.clear()
+        expected = Search(document, pattern)
+        while expected.scanned < found.scanned:
+            expected.scan(1)
+        assert found.matches == expected.matches
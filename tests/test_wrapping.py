@@ -0,0 +1,162 @@
+﻿"""Tests the `wrapping` module."""
+
+from ked import wrapping
+from ked import document
+from ked.wrapping import LazyWrappedDocument
+from ked.wrapping import RowCounts
+from ked.wrapping import FenwickTree
+from ked.document import PieceTable
+from ked.document import MappedDocument
+from ked.document import MappedLines
+
+from textual.document._wrapped_document import WrappedDocument
+from textual.document._document         import Document
+from textual.geometry                   import Offset
+from pytest import fixture
+
+from random import Random
+
+
+@fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(wrapping, 'block_lines', 4)
+
+
+def assert_same_layout(lazy: LazyWrappedDocument, eager: WrappedDocument):
+    lazy.lay_out(0, 2 * eager.height)
+    assert lazy.height == eager.height
+    assert list(lazy._offset_to_line_info) == eager._offset_to_line_info
+    assert list(lazy._line_index_to_offsets) == eager._line_index_to_offsets
+    assert list(lazy._wrap_offsets) == eager._wrap_offsets
+    for y in range(eager.height):
+        offset = Offset(3, y)
+        assert lazy.offset_to_location(offset) == (
+            eager.offset_to_location(offset)
+        )
+
+
+def test_wrapping():
+    random = Random(0)
+    words  = ('', 'word', 'longer words', '\t', 'ü', 'x' * 25, ' ')
+    texts  = ('', 'x', 'some more words ', '\n', 'ab\ncd', '\n\n', 'y' * 30)
+    text   = '\n'.join(
+        ''.join(random.choice(words) for _ in range(random.randrange(8)))
+        for _ in range(30)
+    )
+    document  = PieceTable.from_text(text)
+    reference = Document(text)
+    lazy  = LazyWrappedDocument(document, width=12, tab_width=4)
+    eager = WrappedDocument(reference, width=12, tab_width=4)
+    assert_same_layout(lazy, eager)
+    for _ in range(100):
+        lines = reference.line_count
+        top   = random.randrange(lines)
+        bottom = min(lines - 1, top + random.randrange(3))
+        end = (bottom, len(reference[bottom]))
+        insert = random.choice(texts)
+        result = document.replace_range((top, 0), end, insert)
+        reference.replace_range((top, 0), end, insert)
+        lazy.wrap_range((top, 0), end, result.end_location)
+        eager.wrap_range((top, 0), end, result.end_location)
+        assert_same_layout(lazy, eager)
+    for width in (0, 7, 40):
+        lazy.wrap(width)
+        eager.wrap(width)
+        assert_same_layout(lazy, eager)
+
+
+def test_lazy_layout():
+    text = '\n'.join(['short', 'x' * 100, 'words ' * 20] * 10)
+    lazy = LazyWrappedDocument(PieceTable.from_text(text), width=10)
+    assert len(lazy._layouts) == 0
+    lazy.lay_out(0, 15)
+    assert len(lazy._layouts) == 3
+    assert lazy.resized
+    # Lines with the same content share their layout.
+    lazy.location_to_offset((29, 5))
+    assert len(lazy._layouts) == 3
+    lazy.wrap(20)
+    lazy.lay_out(0, 10)
+    assert len(lazy._layouts) == 6
+    lazy.wrap(10)
+    lazy.lay_out(0, 1000)
+    assert len(lazy._layouts) == 6
+    assert lazy.height == WrappedDocument(Document(text), width=10).height
+
+
+def test_row_counts():
+    random = Random(1)
+    counts = [random.randrange(1, 4) for _ in range(50)]
+    rows = RowCounts(50, 2, lambda first, stop: counts[first:stop])
+    assert rows.total == 100
+    for _ in range(300):
+        first = random.randrange(len(counts) + 1)
+        stop  = min(len(counts), first + random.choice((0, 1, 2, 5, 13)))
+        new   = [random.randrange(1, 4) for _ in range(random.randrange(14))]
+        if len(new) == stop - first == 0:
+            continue
+        estimated = rows.counts[rows.locate(first)[0]] is not None
+        rows.replace(first, stop, new)
+        counts[first:stop] = new
+        if not estimated:
+            # Blocks not estimated yet are estimated from the lines later.
+            continue
+        line = random.randrange(len(counts))
+        assert rows.count(line) == counts[line]
+        assert rows.line_count == len(counts)
+    for line in range(len(counts)):
+        assert rows.count(line) == counts[line]
+    assert rows.total == sum(counts)
+    for line in range(len(counts)):
+        first = sum(counts[:line])
+        assert rows.first_row(line) == first
+        for section in range(counts[line]):
+            assert rows.line_at(first + section) == (line, section)
+
+
+def test_fenwick_tree():
+    values = [3, 0, 1, 4, 1, 5, 9, 2, 6]
+    tree   = FenwickTree(values[:4])
+    for value in values[4:]:
+        tree.append(value)
+    tree.set(1, 2)
+    values[1] = 2
+    assert tree.total == sum(values)
+    for index in range(len(values) + 1):
+        assert tree.prefix(index) == sum(values[:index])
+    for value in range(tree.total):
+        (index, before) = tree.find(value)
+        assert before == sum(values[:index]) <= value < before + values[index]
+    assert tree.find(tree.total) == (len(values), tree.total)
+
+
+def test_lazy_estimates():
+    text = '\n'.join(['x' * 25] * 4 + ['x' * 5] * 36)
+    lazy = LazyWrappedDocument(PieceTable.from_text(text), width=10)
+    # Wrapping reads no more than the first block, to find a typical line.
+    assert lazy.rows.counts == [None] * 10
+    assert lazy.height == 3 * 40
+    lazy.lay_out(0, 12)
+    assert lazy.rows.counts[0] is not None
+    assert lazy.rows.counts[4:] == [None] * 6
+    lazy.lay_out(0, 1000)
+    assert lazy.height == 3 * 4 + 36
+
+
+def test_indexing(tmp_path, monkeypatch):
+    monkeypatch.setattr(document, 'block_size', 16)
+    text = '\n'.join(f'line {n} ' + 'x' * (n % 25) for n in range(40))
+    file = tmp_path / 'mapped.txt'
+    file.write_text(text, encoding='utf-8')
+    lines = MappedLines(file, 'utf-8')
+    lines.index_more(16)
+    mapped = MappedDocument(lines, '\n')
+    lazy = LazyWrappedDocument(mapped, width=10)
+    assert mapped.line_count < 40
+    # The document grows as it is indexed, without being edited.
+    mapped.index_all()
+    last = mapped.line_count - 1
+    assert lazy.get_offsets(last) == WrappedDocument(
+        Document(text), width=10
+    ).get_offsets(last)
+    assert_same_layout(lazy, WrappedDocument(Document(text), width=10))